@@ -23,12 +23,30 @@ from app.models.livro import Livro
 from app.models.multa import Multa
 from app.models.reserva import Reserva
 from app.models.usuario import Usuario
+from app.models.emprestimo_arquivo import EmprestimoArquivo
+from app.models.multa_arquivo import MultaArquivo
+from app.models.alteracao import Alteracao
+from app.models.circulacao import CirculacaoLivroDiaria, CirculacaoCategoriaDiaria
+from app.models.marca_processamento import MarcaProcessamento
+from app.models.auditoria import Auditoria
+from app.models.job import Job
+from app.models.lembrete import LembreteEnviado
 
 
 # target_metadata = mymodel.Base.metadata
 from database import Base
 target_metadata = Base.metadata
 
+from app.services.particoes import CHAVES_ESTRANGEIRAS
+
+
+def include_object(objeto, nome, tipo, refletido, comparado):
+    # No MySQL particionado essas FKs existem só no ORM (app.services.particoes);
+    # sem isto o autogenerate tentaria recriá-las
+    if tipo == "foreign_key_constraint" and objeto.table.name in CHAVES_ESTRANGEIRAS:
+        return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -51,6 +69,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -74,7 +93,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,28 @@
+"""Índice em emprestimos.data_devolucao_prevista
+
+Revision ID: 1c6e8b3d5f27
+Revises: 7a4f0c2e9b58
+Create Date: 2026-10-19 17:42:10.306581
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c6e8b3d5f27'
+down_revision: Union[str, None] = '7a4f0c2e9b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('idx_emprestimo_vencimento', 'emprestimos', ['data_devolucao_prevista'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_emprestimo_vencimento', table_name='emprestimos')
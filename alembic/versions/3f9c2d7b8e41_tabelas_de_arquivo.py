@@ -0,0 +1,65 @@
+"""Tabelas de arquivo para empréstimos e multas
+
+Revision ID: 3f9c2d7b8e41
+Revises: a61e30ed703d
+Create Date: 2026-10-19 09:12:44.501233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2d7b8e41'
+down_revision: Union[str, None] = 'a61e30ed703d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('emprestimos_arquivo',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('livro_id', sa.Integer(), nullable=False),
+    sa.Column('funcionario_id', sa.Integer(), nullable=False),
+    sa.Column('data_emprestimo', sa.DateTime(), nullable=False),
+    sa.Column('data_devolucao_prevista', sa.DateTime(), nullable=False),
+    sa.Column('data_devolucao_real', sa.DateTime(), nullable=True),
+    sa.Column('status', sa.Enum('ATIVO', 'DEVOLVIDO', 'ATRASADO', 'PERDIDO', name='statusemprestimo'), nullable=False),
+    sa.Column('observacoes', sa.Text(), nullable=True),
+    sa.Column('dias_emprestimo', sa.Integer(), nullable=False),
+    sa.Column('data_arquivamento', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_emprestimo_arquivo_data', 'emprestimos_arquivo', ['data_arquivamento'], unique=False)
+    op.create_index(op.f('ix_emprestimos_arquivo_livro_id'), 'emprestimos_arquivo', ['livro_id'], unique=False)
+    op.create_index(op.f('ix_emprestimos_arquivo_usuario_id'), 'emprestimos_arquivo', ['usuario_id'], unique=False)
+    op.create_table('multas_arquivo',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('emprestimo_id', sa.Integer(), nullable=False),
+    sa.Column('valor', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('data_geracao', sa.DateTime(), nullable=False),
+    sa.Column('data_pagamento', sa.DateTime(), nullable=True),
+    sa.Column('status', sa.Enum('PENDENTE', 'PAGO', 'CANCELADA', name='statusmulta'), nullable=False),
+    sa.Column('motivo', sa.Text(), nullable=False),
+    sa.Column('dias_atraso', sa.Integer(), nullable=False),
+    sa.Column('valor_por_dia', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('data_arquivamento', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_multa_arquivo_data', 'multas_arquivo', ['data_arquivamento'], unique=False)
+    op.create_index(op.f('ix_multas_arquivo_emprestimo_id'), 'multas_arquivo', ['emprestimo_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_multas_arquivo_emprestimo_id'), table_name='multas_arquivo')
+    op.drop_index('idx_multa_arquivo_data', table_name='multas_arquivo')
+    op.drop_table('multas_arquivo')
+    op.drop_index(op.f('ix_emprestimos_arquivo_usuario_id'), table_name='emprestimos_arquivo')
+    op.drop_index(op.f('ix_emprestimos_arquivo_livro_id'), table_name='emprestimos_arquivo')
+    op.drop_index('idx_emprestimo_arquivo_data', table_name='emprestimos_arquivo')
+    op.drop_table('emprestimos_arquivo')
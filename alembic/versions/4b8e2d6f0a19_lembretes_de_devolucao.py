@@ -0,0 +1,38 @@
+"""Lembretes de devolução enviados
+
+Revision ID: 4b8e2d6f0a19
+Revises: 9d3f5a1b7c64
+Create Date: 2026-10-19 19:12:44.580317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8e2d6f0a19'
+down_revision: Union[str, None] = '9d3f5a1b7c64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('lembretes_enviados',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('emprestimo_id', sa.Integer(), nullable=False),
+    sa.Column('data_devolucao_prevista', sa.DateTime(), nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('data_envio', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('emprestimo_id', 'data_devolucao_prevista', name='uq_lembrete_emprestimo_prazo')
+    )
+    op.create_index(op.f('ix_lembretes_enviados_id'), 'lembretes_enviados', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_lembretes_enviados_id'), table_name='lembretes_enviados')
+    op.drop_table('lembretes_enviados')
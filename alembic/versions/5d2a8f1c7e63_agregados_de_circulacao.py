@@ -0,0 +1,59 @@
+"""Agregados diários de circulação e marcas de processamento
+
+Revision ID: 5d2a8f1c7e63
+Revises: c47d19e5a3b2
+Create Date: 2026-10-19 12:10:24.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a8f1c7e63'
+down_revision: Union[str, None] = 'c47d19e5a3b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('circulacao_livro_diaria',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('livro_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('categoria_id', sa.Integer(), nullable=False),
+    sa.Column('emprestimos', sa.Integer(), nullable=False),
+    sa.Column('devolucoes', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dia', 'livro_id')
+    )
+    op.create_index('idx_circulacao_livro', 'circulacao_livro_diaria', ['livro_id', 'dia'], unique=False)
+    op.create_table('circulacao_categoria_diaria',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('categoria_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('emprestimos', sa.Integer(), nullable=False),
+    sa.Column('devolucoes', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dia', 'categoria_id')
+    )
+    op.create_index('idx_circulacao_categoria', 'circulacao_categoria_diaria', ['categoria_id', 'dia'], unique=False)
+    op.create_table('marcas_processamento',
+    sa.Column('nome', sa.String(length=50), nullable=False),
+    sa.Column('marca', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('nome')
+    )
+    op.create_index('idx_emprestimo_data', 'emprestimos', ['data_emprestimo'], unique=False)
+    op.create_index('idx_emprestimo_devolucao', 'emprestimos', ['data_devolucao_real'], unique=False)
+    op.create_index('idx_emprestimo_atualizacao', 'emprestimos', ['data_atualizacao'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_emprestimo_atualizacao', table_name='emprestimos')
+    op.drop_index('idx_emprestimo_devolucao', table_name='emprestimos')
+    op.drop_index('idx_emprestimo_data', table_name='emprestimos')
+    op.drop_table('marcas_processamento')
+    op.drop_index('idx_circulacao_categoria', table_name='circulacao_categoria_diaria')
+    op.drop_table('circulacao_categoria_diaria')
+    op.drop_index('idx_circulacao_livro', table_name='circulacao_livro_diaria')
+    op.drop_table('circulacao_livro_diaria')
@@ -0,0 +1,41 @@
+"""Particionamento mensal de emprestimos e multas
+
+Revision ID: 6e1a9c4f2b83
+Revises: 4b8e2d6f0a19
+Create Date: 2026-10-19 20:31:07.114902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services import particoes
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e1a9c4f2b83'
+down_revision: Union[str, None] = '4b8e2d6f0a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Só o MySQL tem PARTITION BY RANGE; em outros bancos a migração não faz nada
+    conexao = op.get_bind()
+    if conexao.dialect.name != "mysql":
+        return
+    for tabela in particoes.TABELAS:
+        if not particoes.particionada(conexao, tabela):
+            particoes.particionar(conexao, tabela)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conexao = op.get_bind()
+    if conexao.dialect.name != "mysql":
+        return
+    for tabela in reversed(list(particoes.TABELAS)):
+        if particoes.particionada(conexao, tabela):
+            particoes.desfazer(conexao, tabela)
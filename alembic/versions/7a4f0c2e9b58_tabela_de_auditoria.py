@@ -0,0 +1,41 @@
+"""Tabela de auditoria
+
+Revision ID: 7a4f0c2e9b58
+Revises: e2b7c4a9d130
+Create Date: 2026-10-19 15:21:07.442913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4f0c2e9b58'
+down_revision: Union[str, None] = 'e2b7c4a9d130'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('auditoria',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('tabela', sa.String(length=30), nullable=False),
+    sa.Column('registro_id', sa.Integer(), nullable=False),
+    sa.Column('operacao', sa.Enum('INSERCAO', 'ATUALIZACAO', 'EXCLUSAO', name='tipoalteracao'), nullable=False),
+    sa.Column('autor', sa.String(length=100), nullable=True),
+    sa.Column('alteracoes', sa.JSON(), nullable=True),
+    sa.Column('data_alteracao', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_auditoria_data', 'auditoria', ['data_alteracao'], unique=False)
+    op.create_index('idx_auditoria_registro', 'auditoria', ['tabela', 'registro_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_auditoria_registro', table_name='auditoria')
+    op.drop_index('idx_auditoria_data', table_name='auditoria')
+    op.drop_table('auditoria')
@@ -0,0 +1,28 @@
+"""Índice em livros.data_atualizacao
+
+Revision ID: 8b1e4a6c2f90
+Revises: 3f9c2d7b8e41
+Create Date: 2026-10-19 10:05:31.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1e4a6c2f90'
+down_revision: Union[str, None] = '3f9c2d7b8e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('idx_livro_atualizacao', 'livros', ['data_atualizacao'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_livro_atualizacao', table_name='livros')
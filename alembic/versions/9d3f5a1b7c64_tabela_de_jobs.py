@@ -0,0 +1,49 @@
+"""Tabela de jobs
+
+Revision ID: 9d3f5a1b7c64
+Revises: 1c6e8b3d5f27
+Create Date: 2026-10-19 18:30:52.917240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f5a1b7c64'
+down_revision: Union[str, None] = '1c6e8b3d5f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=50), nullable=False),
+    sa.Column('parametros', sa.JSON(), nullable=False),
+    sa.Column('status', sa.Enum('PENDENTE', 'EXECUTANDO', 'CONCLUIDO', 'FALHOU', 'CANCELADO', name='statusjob'), nullable=False),
+    sa.Column('progresso', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=True),
+    sa.Column('mensagem', sa.String(length=255), nullable=True),
+    sa.Column('resultado', sa.JSON(), nullable=True),
+    sa.Column('erro', sa.Text(), nullable=True),
+    sa.Column('cancelamento_solicitado', sa.Boolean(), nullable=False),
+    sa.Column('autor', sa.String(length=100), nullable=True),
+    sa.Column('data_criacao', sa.DateTime(), nullable=False),
+    sa.Column('data_inicio', sa.DateTime(), nullable=True),
+    sa.Column('data_fim', sa.DateTime(), nullable=True),
+    sa.Column('data_atualizacao', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_jobs_id'), 'jobs', ['id'], unique=False)
+    op.create_index('idx_job_status', 'jobs', ['status', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_job_status', table_name='jobs')
+    op.drop_index(op.f('ix_jobs_id'), table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,30 @@
+"""Dono e batimento dos jobs
+
+Revision ID: a8c2e5f1d367
+Revises: f3a9c1e7d254
+Create Date: 2026-10-21 16:48:03.271954
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c2e5f1d367'
+down_revision: Union[str, None] = 'f3a9c1e7d254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('jobs', sa.Column('executor', sa.String(length=100), nullable=True))
+    op.add_column('jobs', sa.Column('data_batimento', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('jobs', 'data_batimento')
+    op.drop_column('jobs', 'executor')
@@ -0,0 +1,31 @@
+"""Marca que ordena o feed de alterações pelos commits
+
+Revision ID: b3d8f2a6c915
+Revises: 6e1a9c4f2b83
+Create Date: 2026-10-20 09:14:52.207316
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3d8f2a6c915'
+down_revision: Union[str, None] = '6e1a9c4f2b83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A linha presa por cada commit que grava alterações (app.services.alteracoes)
+    marcas = sa.table('marcas_processamento', sa.column('nome', sa.String), sa.column('marca', sa.DateTime))
+    op.bulk_insert(marcas, [{'nome': 'alteracoes', 'marca': datetime.utcnow()}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM marcas_processamento WHERE nome = 'alteracoes'")
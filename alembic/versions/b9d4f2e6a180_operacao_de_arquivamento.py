@@ -0,0 +1,36 @@
+"""Operação de arquivamento no feed de alterações
+
+Revision ID: b9d4f2e6a180
+Revises: a8c2e5f1d367
+Create Date: 2026-10-22 10:12:47.583120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d4f2e6a180'
+down_revision: Union[str, None] = 'a8c2e5f1d367'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ANTIGO = sa.Enum('INSERCAO', 'ATUALIZACAO', 'EXCLUSAO', name='tipoalteracao')
+NOVO = sa.Enum('INSERCAO', 'ATUALIZACAO', 'EXCLUSAO', 'ARQUIVAMENTO', name='tipoalteracao')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A auditoria usa o mesmo Enum; o valor novo no fim da lista não reescreve as tabelas
+    for tabela in ('alteracoes', 'auditoria'):
+        op.alter_column(tabela, 'operacao', existing_type=ANTIGO, type_=NOVO, existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Antes desta revisão o arquivamento era registrado como exclusão
+    op.execute("UPDATE alteracoes SET operacao = 'EXCLUSAO' WHERE operacao = 'ARQUIVAMENTO'")
+    for tabela in ('alteracoes', 'auditoria'):
+        op.alter_column(tabela, 'operacao', existing_type=NOVO, type_=ANTIGO, existing_nullable=False)
@@ -0,0 +1,44 @@
+"""Feed de alterações e data_atualizacao em empréstimos, reservas e multas
+
+Revision ID: c47d19e5a3b2
+Revises: 8b1e4a6c2f90
+Create Date: 2026-10-19 10:41:07.662915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47d19e5a3b2'
+down_revision: Union[str, None] = '8b1e4a6c2f90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('alteracoes',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('tabela', sa.String(length=30), nullable=False),
+    sa.Column('registro_id', sa.Integer(), nullable=False),
+    sa.Column('operacao', sa.Enum('INSERCAO', 'ATUALIZACAO', 'EXCLUSAO', name='tipoalteracao'), nullable=False),
+    sa.Column('data_alteracao', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_alteracao_data', 'alteracoes', ['data_alteracao'], unique=False)
+    op.create_index('idx_alteracao_registro', 'alteracoes', ['tabela', 'registro_id'], unique=False)
+    # Linhas existentes recebem o instante da migração
+    for tabela in ('emprestimos', 'reservas', 'multas'):
+        op.add_column(tabela, sa.Column('data_atualizacao', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for tabela in ('multas', 'reservas', 'emprestimos'):
+        op.drop_column(tabela, 'data_atualizacao')
+    op.drop_index('idx_alteracao_registro', table_name='alteracoes')
+    op.drop_index('idx_alteracao_data', table_name='alteracoes')
+    op.drop_table('alteracoes')
@@ -0,0 +1,34 @@
+"""Dias de circulação a recalcular após exclusões
+
+Revision ID: d5e1a7c3b948
+Revises: b3d8f2a6c915
+Create Date: 2026-10-20 14:02:37.518440
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e1a7c3b948'
+down_revision: Union[str, None] = 'b3d8f2a6c915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('circulacao_dias_pendentes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_circulacao_dias_pendentes_id'), 'circulacao_dias_pendentes', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_circulacao_dias_pendentes_id'), table_name='circulacao_dias_pendentes')
+    op.drop_table('circulacao_dias_pendentes')
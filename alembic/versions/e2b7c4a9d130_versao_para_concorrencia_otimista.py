@@ -0,0 +1,31 @@
+"""Coluna versao para concorrência otimista
+
+Revision ID: e2b7c4a9d130
+Revises: 5d2a8f1c7e63
+Create Date: 2026-10-19 14:02:51.730415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7c4a9d130'
+down_revision: Union[str, None] = '5d2a8f1c7e63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # server_default preenche as linhas existentes sem reescrevê-las uma a uma
+    for tabela in ('categorias', 'usuarios', 'livros', 'reservas'):
+        op.add_column(tabela, sa.Column('versao', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for tabela in ('reservas', 'livros', 'usuarios', 'categorias'):
+        op.drop_column(tabela, 'versao')
@@ -0,0 +1,40 @@
+"""Recibos de quitação por chave de idempotência
+
+Revision ID: f3a9c1e7d254
+Revises: d5e1a7c3b948
+Create Date: 2026-10-21 10:15:42.093871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c1e7d254'
+down_revision: Union[str, None] = 'd5e1a7c3b948'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('quitacoes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('chave', sa.String(length=100), nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('recibo', sa.JSON(), nullable=False),
+    sa.Column('data_criacao', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('chave')
+    )
+    op.create_index(op.f('ix_quitacoes_id'), 'quitacoes', ['id'], unique=False)
+    op.create_index(op.f('ix_quitacoes_usuario_id'), 'quitacoes', ['usuario_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_quitacoes_usuario_id'), table_name='quitacoes')
+    op.drop_index(op.f('ix_quitacoes_id'), table_name='quitacoes')
+    op.drop_table('quitacoes')
@@ -2,23 +2,45 @@ from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Bool
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
-from app.models.enums import TipoUsuario, StatusEmprestimo, StatusReserva, StatusMulta
+from app.models.enums import TipoUsuario, StatusEmprestimo, StatusReserva, StatusMulta, TipoAlteracao, StatusJob
 from app.models.usuario import Usuario
 from app.models.categoria import Categoria
 from app.models.livro import Livro
 from app.models.emprestimo import Emprestimo
 from app.models.reserva import Reserva
 from app.models.multa import Multa
+from app.models.emprestimo_arquivo import EmprestimoArquivo
+from app.models.multa_arquivo import MultaArquivo
+from app.models.alteracao import Alteracao
+from app.models.circulacao import CirculacaoLivroDiaria, CirculacaoCategoriaDiaria, CirculacaoDiaPendente
+from app.models.marca_processamento import MarcaProcessamento
+from app.models.auditoria import Auditoria
+from app.models.job import Job
+from app.models.lembrete import LembreteEnviado
+from app.models.quitacao import Quitacao
 
 __all__ = [
     'TipoUsuario',
     'StatusEmprestimo',
     'StatusReserva',
     'StatusMulta',
+    'TipoAlteracao',
+    'StatusJob',
     'Usuario',
     'Categoria',
     'Livro',
     'Emprestimo',
     'Reserva',
-    'Multa'
+    'Multa',
+    'EmprestimoArquivo',
+    'MultaArquivo',
+    'Alteracao',
+    'CirculacaoLivroDiaria',
+    'CirculacaoCategoriaDiaria',
+    'CirculacaoDiaPendente',
+    'MarcaProcessamento',
+    'Auditoria',
+    'Job',
+    'LembreteEnviado',
+    'Quitacao'
 ]
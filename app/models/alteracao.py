@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Enum, Index
+from datetime import datetime
+from .enums import TipoAlteracao
+from database import Base
+
+class Alteracao(Base):
+    __tablename__ = "alteracoes"
+
+    # O id é o cursor do feed de alterações
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    tabela = Column(String(30), nullable=False)
+    registro_id = Column(Integer, nullable=False)
+    operacao = Column(Enum(TipoAlteracao), nullable=False)
+    data_alteracao = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_alteracao_registro', 'tabela', 'registro_id'),
+        Index('idx_alteracao_data', 'data_alteracao'),
+    )
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Enum, JSON, Index
+from datetime import datetime
+from .enums import TipoAlteracao
+from database import Base
+
+class Auditoria(Base):
+    __tablename__ = "auditoria"
+
+    # Só recebe INSERTs: nenhuma linha é alterada ou apagada pela aplicação
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    tabela = Column(String(30), nullable=False)
+    registro_id = Column(Integer, nullable=False)
+    operacao = Column(Enum(TipoAlteracao), nullable=False)
+    autor = Column(String(100), nullable=True)
+    # {"campo": [antes, depois]}
+    alteracoes = Column(JSON, nullable=True)
+    data_alteracao = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_auditoria_registro', 'tabela', 'registro_id'),
+        Index('idx_auditoria_data', 'data_alteracao'),
+    )
@@ -12,10 +12,13 @@ class Categoria(Base):
     data_cadastro = Column(DateTime, default=datetime.utcnow, nullable=False)
     data_atualizacao = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     ativo = Column(Boolean, default=True, nullable=False)
+    versao = Column(Integer, server_default="1", nullable=False)
     
     # Relacionamentos
     livros = relationship("Livro", back_populates="categoria", cascade="all, delete-orphan")
 
     __table_args__ = (
         Index('idx_categoria_ativo', 'ativo'),
-    ) 
\ No newline at end of file
+    )
+
+    __mapper_args__ = {"version_id_col": versao}
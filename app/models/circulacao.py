@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, Date, Index
+from database import Base
+
+class CirculacaoLivroDiaria(Base):
+    __tablename__ = "circulacao_livro_diaria"
+
+    # Agregado diário de empréstimos e devoluções por livro, mantido por app.services.circulacao
+    dia = Column(Date, primary_key=True)
+    livro_id = Column(Integer, primary_key=True, autoincrement=False)
+    categoria_id = Column(Integer, nullable=False)
+    emprestimos = Column(Integer, default=0, nullable=False)
+    devolucoes = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index('idx_circulacao_livro', 'livro_id', 'dia'),
+    )
+
+class CirculacaoCategoriaDiaria(Base):
+    __tablename__ = "circulacao_categoria_diaria"
+
+    dia = Column(Date, primary_key=True)
+    categoria_id = Column(Integer, primary_key=True, autoincrement=False)
+    emprestimos = Column(Integer, default=0, nullable=False)
+    devolucoes = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index('idx_circulacao_categoria', 'categoria_id', 'dia'),
+    )
+
+class CirculacaoDiaPendente(Base):
+    __tablename__ = "circulacao_dias_pendentes"
+
+    # Dias de empréstimos apagados, que data_atualizacao não tem mais como apontar;
+    # gravados por quem apaga e consumidos por app.services.circulacao.atualizar
+    id = Column(Integer, primary_key=True, index=True)
+    dia = Column(Date, nullable=False)
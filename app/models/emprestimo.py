@@ -17,6 +17,7 @@ class Emprestimo(Base):
     status = Column(Enum(StatusEmprestimo), default=StatusEmprestimo.ATIVO, nullable=False, index=True)
     observacoes = Column(Text, nullable=True)
     dias_emprestimo = Column(Integer, default=15, nullable=False)
+    data_atualizacao = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     # Relacionamentos
     usuario = relationship(
@@ -32,8 +33,18 @@ class Emprestimo(Base):
     )
     multas = relationship("Multa", back_populates="emprestimo", cascade="all, delete-orphan")
 
+    # No MySQL a tabela pode estar particionada por mês em data_emprestimo
+    # (app.services.particoes): a chave primária física passa a ser
+    # (id, data_emprestimo) e as FKs ficam só aqui, no ORM. O mapeamento
+    # continua com id como chave; as CHECK não mudam com o particionamento.
     __table_args__ = (
         CheckConstraint('data_devolucao_prevista > data_emprestimo', name='check_data_devolucao'),
         CheckConstraint('dias_emprestimo > 0', name='check_dias_emprestimo'),
         Index('idx_emprestimo_status', 'status', 'data_devolucao_prevista'),
+        # Filtro por faixa de vencimento sem status (app.routes.emprestimos)
+        Index('idx_emprestimo_vencimento', 'data_devolucao_prevista'),
+        # Usados pelo job de agregação de circulação
+        Index('idx_emprestimo_data', 'data_emprestimo'),
+        Index('idx_emprestimo_devolucao', 'data_devolucao_real'),
+        Index('idx_emprestimo_atualizacao', 'data_atualizacao'),
     ) 
\ No newline at end of file
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, DateTime, Enum, Text, Index
+from datetime import datetime
+from .enums import StatusEmprestimo
+from database import Base
+
+class EmprestimoArquivo(Base):
+    __tablename__ = "emprestimos_arquivo"
+
+    # Mantém o id original para que as rotas de detalhe encontrem o registro
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    usuario_id = Column(Integer, nullable=False, index=True)
+    livro_id = Column(Integer, nullable=False, index=True)
+    funcionario_id = Column(Integer, nullable=False)
+    data_emprestimo = Column(DateTime, nullable=False)
+    data_devolucao_prevista = Column(DateTime, nullable=False)
+    data_devolucao_real = Column(DateTime, nullable=True)
+    status = Column(Enum(StatusEmprestimo), nullable=False)
+    observacoes = Column(Text, nullable=True)
+    dias_emprestimo = Column(Integer, nullable=False)
+    data_arquivamento = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_emprestimo_arquivo_data', 'data_arquivamento'),
+    )
@@ -20,4 +20,17 @@ class StatusReserva(enum.Enum):
 class StatusMulta(enum.Enum):
     PENDENTE = "pendente"
     PAGO = "pago"
-    CANCELADA = "cancelada" 
\ No newline at end of file
+    CANCELADA = "cancelada" 
+
+class TipoAlteracao(enum.Enum):
+    INSERCAO = "insercao"
+    ATUALIZACAO = "atualizacao"
+    EXCLUSAO = "exclusao"
+    ARQUIVAMENTO = "arquivamento"
+
+class StatusJob(enum.Enum):
+    PENDENTE = "pendente"
+    EXECUTANDO = "executando"
+    CONCLUIDO = "concluido"
+    FALHOU = "falhou"
+    CANCELADO = "cancelado"
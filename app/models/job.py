@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, Enum, JSON, Boolean, Text, Index
+from datetime import datetime
+from .enums import StatusJob
+from database import Base
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    # Operações longas executadas fora das requisições (app.services.jobs)
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String(50), nullable=False)
+    parametros = Column(JSON, nullable=False)
+    status = Column(Enum(StatusJob), default=StatusJob.PENDENTE, nullable=False)
+    progresso = Column(Integer, default=0, nullable=False)
+    # Nulo quando o job não sabe de antemão quanto trabalho tem
+    total = Column(Integer, nullable=True)
+    mensagem = Column(String(255), nullable=True)
+    resultado = Column(JSON, nullable=True)
+    erro = Column(Text, nullable=True)
+    cancelamento_solicitado = Column(Boolean, default=False, nullable=False)
+    autor = Column(String(100), nullable=True)
+    # Executor que reivindicou o job (host:pid) e o último sinal de vida dele;
+    # sem sinal recente, o job é de um executor que parou (app.services.jobs)
+    executor = Column(String(100), nullable=True)
+    data_batimento = Column(DateTime, nullable=True)
+    data_criacao = Column(DateTime, default=datetime.utcnow, nullable=False)
+    data_inicio = Column(DateTime, nullable=True)
+    data_fim = Column(DateTime, nullable=True)
+    data_atualizacao = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_job_status', 'status', 'id'),
+    )
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint
+from datetime import datetime
+from database import Base
+
+class LembreteEnviado(Base):
+    __tablename__ = "lembretes_enviados"
+
+    # Sem chave estrangeira: o empréstimo pode ir para o arquivo depois do lembrete
+    id = Column(Integer, primary_key=True, index=True)
+    emprestimo_id = Column(Integer, nullable=False)
+    # Um lembrete por prazo: se a devolução for remarcada, o novo prazo ganha outro
+    data_devolucao_prevista = Column(DateTime, nullable=False)
+    email = Column(String(100), nullable=False)
+    data_envio = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('emprestimo_id', 'data_devolucao_prevista', name='uq_lembrete_emprestimo_prazo'),
+    )
@@ -21,6 +21,9 @@ class Livro(Base):
     data_atualizacao = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     sinopse = Column(Text, nullable=True)
     capa_url = Column(String(255), nullable=True)
+    # Controle de concorrência otimista: todo UPDATE/DELETE do ORM confere e incrementa.
+    # Empréstimos e devoluções mudam quantidade_disponivel com UPDATE atômico, sem passar por aqui
+    versao = Column(Integer, server_default="1", nullable=False)
     
     # Relacionamentos
     categoria = relationship("Categoria", back_populates="livros")
@@ -32,4 +35,7 @@ class Livro(Base):
         CheckConstraint('quantidade_total >= quantidade_disponivel', name='check_quantidade_total'),
         CheckConstraint('ano_publicacao > 0', name='check_ano_publicacao'),
         Index('idx_livro_disponivel', 'quantidade_disponivel', 'categoria_id'),
-    ) 
\ No newline at end of file
+        Index('idx_livro_atualizacao', 'data_atualizacao'),
+    )
+
+    __mapper_args__ = {"version_id_col": versao}
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, DateTime
+from database import Base
+
+class MarcaProcessamento(Base):
+    __tablename__ = "marcas_processamento"
+
+    # Até onde cada job incremental já processou (high-water mark)
+    nome = Column(String(50), primary_key=True)
+    marca = Column(DateTime, nullable=False)
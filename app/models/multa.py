@@ -16,10 +16,12 @@ class Multa(Base):
     motivo = Column(Text, nullable=False)
     dias_atraso = Column(Integer, nullable=False)
     valor_por_dia = Column(Numeric(10, 2), nullable=False)
+    data_atualizacao = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     # Relacionamentos
     emprestimo = relationship("Emprestimo", back_populates="multas")
 
+    # Particionada por mês em data_geracao no MySQL, como Emprestimo
     __table_args__ = (
         CheckConstraint('valor >= 0', name='check_valor_multa'),
         CheckConstraint('dias_atraso >= 0', name='check_dias_atraso'),
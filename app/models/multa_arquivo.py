@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, DateTime, Enum, Numeric, Text, Index
+from datetime import datetime
+from .enums import StatusMulta
+from database import Base
+
+class MultaArquivo(Base):
+    __tablename__ = "multas_arquivo"
+
+    # Mantém o id original para que as rotas de detalhe encontrem o registro
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    emprestimo_id = Column(Integer, nullable=False, index=True)
+    valor = Column(Numeric(10, 2), nullable=False)
+    data_geracao = Column(DateTime, nullable=False)
+    data_pagamento = Column(DateTime, nullable=True)
+    status = Column(Enum(StatusMulta), nullable=False)
+    motivo = Column(Text, nullable=False)
+    dias_atraso = Column(Integer, nullable=False)
+    valor_por_dia = Column(Numeric(10, 2), nullable=False)
+    data_arquivamento = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_multa_arquivo_data', 'data_arquivamento'),
+    )
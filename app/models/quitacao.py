@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from datetime import datetime
+from database import Base
+
+class Quitacao(Base):
+    __tablename__ = "quitacoes"
+
+    # Recibo de cada quitação pedida com Idempotency-Key: repetir a chave devolve o mesmo recibo
+    id = Column(Integer, primary_key=True, index=True)
+    chave = Column(String(100), unique=True, nullable=False)
+    usuario_id = Column(Integer, nullable=False, index=True)
+    recibo = Column(JSON, nullable=False)
+    data_criacao = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -14,6 +14,8 @@ class Reserva(Base):
     data_limite = Column(DateTime, nullable=False)
     status = Column(Enum(StatusReserva), default=StatusReserva.PENDENTE, nullable=False, index=True)
     prioridade = Column(Integer, default=1, nullable=False)
+    data_atualizacao = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    versao = Column(Integer, server_default="1", nullable=False)
     
     # Relacionamentos
     usuario = relationship("Usuario", back_populates="reservas")
@@ -23,4 +25,6 @@ class Reserva(Base):
         CheckConstraint('data_limite > data_reserva', name='check_data_limite'),
         CheckConstraint('prioridade > 0', name='check_prioridade'),
         Index('idx_reserva_status', 'status', 'data_limite'),
-    ) 
\ No newline at end of file
+    )
+
+    __mapper_args__ = {"version_id_col": versao}
@@ -19,6 +19,7 @@ class Usuario(Base):
     data_atualizacao = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     ativo = Column(Boolean, default=True, nullable=False)
     limite_emprestimos = Column(Integer, default=3, nullable=False)
+    versao = Column(Integer, server_default="1", nullable=False)
     
     # Relacionamentos
     emprestimos = relationship(
@@ -45,4 +46,6 @@ class Usuario(Base):
                        name='check_matricula_funcionario'),
         CheckConstraint('limite_emprestimos > 0', name='check_limite_emprestimos'),
         Index('idx_usuario_ativo', 'ativo', 'tipo'),
-    ) 
\ No newline at end of file
+    )
+
+    __mapper_args__ = {"version_id_col": versao}
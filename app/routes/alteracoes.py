@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List
+from datetime import datetime
+from pydantic import BaseModel
+
+from database import get_db
+from app.models import Livro, Usuario, Categoria, Emprestimo, Reserva, Multa, TipoAlteracao
+from app.services.alteracoes import listar_alteracoes
+from app.routes.livros import LivroResponse
+from app.routes.usuarios import UsuarioResponse
+from app.routes.categorias import CategoriaResponse
+from app.routes.emprestimos import EmprestimoResponse
+from app.routes.reservas import ReservaResponse
+from app.routes.multas import MultaResponse
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["alteracoes"]
+)
+
+# tabela -> (modelo, schema usado para serializar o estado atual da linha)
+TABELAS = {
+    "livros": (Livro, LivroResponse),
+    "usuarios": (Usuario, UsuarioResponse),
+    "categorias": (Categoria, CategoriaResponse),
+    "emprestimos": (Emprestimo, EmprestimoResponse),
+    "reservas": (Reserva, ReservaResponse),
+    "multas": (Multa, MultaResponse),
+}
+
+class AlteracaoResponse(BaseModel):
+    cursor: int
+    tabela: str
+    registro_id: int
+    operacao: TipoAlteracao
+    data_alteracao: datetime
+    dados: dict | None = None
+
+class FeedAlteracoesResponse(BaseModel):
+    alteracoes: List[AlteracaoResponse]
+    proximo_cursor: int
+
+@router.get("/", response_model=FeedAlteracoesResponse)
+def feed_alteracoes(
+    since: int = Query(default=0, ge=0, description="Cursor devolvido pela chamada anterior"),
+    limit: int = Query(default=500, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    alteracoes = listar_alteracoes(db, since, limit)
+    
+    # Estado atual das linhas alteradas: um SELECT ... IN por tabela
+    ids_por_tabela: dict[str, set[int]] = {}
+    for alteracao in alteracoes:
+        if alteracao.operacao not in (TipoAlteracao.EXCLUSAO, TipoAlteracao.ARQUIVAMENTO):
+            ids_por_tabela.setdefault(alteracao.tabela, set()).add(alteracao.registro_id)
+    
+    dados: dict[tuple[str, int], dict] = {}
+    for tabela, ids in ids_por_tabela.items():
+        modelo, schema = TABELAS[tabela]
+        for registro in db.query(modelo).filter(modelo.id.in_(ids)):
+            dados[(tabela, registro.id)] = schema.model_validate(registro).model_dump(mode="json")
+    
+    return FeedAlteracoesResponse(
+        alteracoes=[
+            AlteracaoResponse(
+                cursor=alteracao.id,
+                tabela=alteracao.tabela,
+                registro_id=alteracao.registro_id,
+                operacao=alteracao.operacao,
+                data_alteracao=alteracao.data_alteracao,
+                dados=dados.get((alteracao.tabela, alteracao.registro_id))
+            )
+            for alteracao in alteracoes
+        ],
+        proximo_cursor=alteracoes[-1].id if alteracoes else since
+    )
@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
 
 from database import get_db
 from app.models import Categoria
+from app.services.exclusao import contar_categoria, excluir_categoria
+from app.services.repositorio import obter, existe
+from app.routes.utils import (
+    campos_alterados, aplicar_alteracoes, campos_solicitados, campos_sem_texto,
+    projetar, resposta_projetada, anexar_total, etag, verificar_if_match
+)
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -19,6 +26,11 @@ class CategoriaBase(BaseModel):
 class CategoriaCreate(CategoriaBase):
     pass
 
+class CategoriaUpdate(BaseModel):
+    nome: str | None = None
+    descricao: str | None = None
+    ativo: bool | None = None
+
 class CategoriaResponse(CategoriaBase):
     id: int
     data_cadastro: datetime
@@ -28,45 +40,120 @@ class CategoriaResponse(CategoriaBase):
     class Config:
         from_attributes = True
 
+class ExclusaoCategoriaResponse(BaseModel):
+    # Linhas que seriam apagadas em cada tabela
+    categorias: int
+    livros: int
+    emprestimos: int
+    reservas: int
+    multas: int
+
+# Colunas Text ficam fora das listagens, a menos que pedidas em fields
+CAMPOS_LISTA = campos_sem_texto(CategoriaResponse, ("descricao",))
+
 @router.post("/", response_model=CategoriaResponse, status_code=status.HTTP_201_CREATED)
-def create_categoria(categoria: CategoriaCreate, db: Session = Depends(get_db)):
+def create_categoria(categoria: CategoriaCreate, response: Response, db: Session = Depends(get_db)):
     db_categoria = Categoria(**categoria.model_dump())
     db.add(db_categoria)
     db.commit()
     db.refresh(db_categoria)
+    response.headers["ETag"] = etag(db_categoria)
     return db_categoria
 
 @router.get("/", response_model=List[CategoriaResponse])
-def read_categorias(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    categorias = db.query(Categoria).offset(skip).limit(limit).all()
-    return categorias
+def read_categorias(
+    skip: int = 0,
+    limit: int = 100,
+    fields: str | None = None,
+    count: bool = False,
+    approximate: bool = False,
+    db: Session = Depends(get_db)
+):
+    campos = campos_solicitados(CategoriaResponse, fields, CAMPOS_LISTA)
+    categorias = projetar(db.query(Categoria), Categoria, campos).offset(skip).limit(limit).all()
+    resposta = resposta_projetada(categorias, CategoriaResponse, campos)
+    if count or approximate:
+        anexar_total(db, resposta, Categoria, {}, approximate)
+    return resposta
 
 @router.get("/{categoria_id}", response_model=CategoriaResponse)
-def read_categoria(categoria_id: int, db: Session = Depends(get_db)):
-    db_categoria = db.query(Categoria).filter(Categoria.id == categoria_id).first()
+def read_categoria(categoria_id: int, response: Response, fields: str | None = None, db: Session = Depends(get_db)):
+    campos = campos_solicitados(CategoriaResponse, fields)
+    db_categoria = obter(db, Categoria, categoria_id, campos)
     if db_categoria is None:
         raise HTTPException(status_code=404, detail="Categoria não encontrada")
-    return db_categoria
+    if campos is not None:
+        response = resposta_projetada(db_categoria, CategoriaResponse, campos)
+    response.headers["ETag"] = etag(db_categoria)
+    return response if campos is not None else db_categoria
 
 @router.put("/{categoria_id}", response_model=CategoriaResponse)
-def update_categoria(categoria_id: int, categoria: CategoriaCreate, db: Session = Depends(get_db)):
-    db_categoria = db.query(Categoria).filter(Categoria.id == categoria_id).first()
+def update_categoria(
+    categoria_id: int,
+    categoria: CategoriaCreate,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    db_categoria = obter(db, Categoria, categoria_id)
     if db_categoria is None:
         raise HTTPException(status_code=404, detail="Categoria não encontrada")
+    verificar_if_match(if_match, db_categoria)
     
     for key, value in categoria.model_dump().items():
         setattr(db_categoria, key, value)
     
     db.commit()
     db.refresh(db_categoria)
+    response.headers["ETag"] = etag(db_categoria)
     return db_categoria
 
-@router.delete("/{categoria_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_categoria(categoria_id: int, db: Session = Depends(get_db)):
-    db_categoria = db.query(Categoria).filter(Categoria.id == categoria_id).first()
+@router.patch("/{categoria_id}", response_model=CategoriaResponse)
+def patch_categoria(
+    categoria_id: int,
+    categoria: CategoriaUpdate,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    db_categoria = obter(db, Categoria, categoria_id)
     if db_categoria is None:
         raise HTTPException(status_code=404, detail="Categoria não encontrada")
+    verificar_if_match(if_match, db_categoria)
+    
+    alteracoes = campos_alterados(Categoria, db_categoria, categoria.model_dump(exclude_unset=True))
+    if not alteracoes:
+        response.headers["ETag"] = etag(db_categoria)
+        return db_categoria
     
-    db.delete(db_categoria)
+    if "nome" in alteracoes and existe(db, Categoria.nome, alteracoes["nome"]):
+        raise HTTPException(status_code=400, detail="Categoria já cadastrada")
+    
+    aplicar_alteracoes(db, Categoria, db_categoria, alteracoes)
+    resposta = CategoriaResponse.model_validate(db_categoria)
+    response.headers["ETag"] = etag(db_categoria)
     db.commit()
+    return resposta
+
+@router.delete(
+    "/{categoria_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={200: {"model": ExclusaoCategoriaResponse, "description": "Simulação (simular=true)"}}
+)
+def delete_categoria(
+    categoria_id: int,
+    simular: bool = False,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    db_categoria = obter(db, Categoria, categoria_id, ["id"])
+    if db_categoria is None:
+        raise HTTPException(status_code=404, detail="Categoria não encontrada")
+    verificar_if_match(if_match, db_categoria)
+    
+    # simular=true só conta o que seria apagado, sem apagar nada
+    if simular:
+        return JSONResponse(contar_categoria(db, categoria_id))
+    
+    excluir_categoria(db, categoria_id)
     return None 
\ No newline at end of file
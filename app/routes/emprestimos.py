@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime, timedelta
 
 from database import get_db
-from app.models import Emprestimo, StatusEmprestimo, Livro, Usuario
+from app.routes.utils import campos_solicitados, campos_sem_texto, projetar, resposta_projetada, anexar_total
+from app.routes.listagem import Listagem, Filtro
+from app.models import Emprestimo, StatusEmprestimo, Livro, Usuario, TipoUsuario, EmprestimoArquivo, TipoAlteracao
+from app.services.alteracoes import registrar_alteracoes
+from app.services.repositorio import obter, obter_varios
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -32,49 +37,119 @@ class EmprestimoResponse(EmprestimoBase):
     class Config:
         from_attributes = True
 
+# Colunas Text ficam fora das listagens, a menos que pedidas em fields
+CAMPOS_LISTA = campos_sem_texto(EmprestimoResponse, ("observacoes",))
+
+LISTAGEM = Listagem(
+    Emprestimo,
+    filtros={
+        "status": Filtro(Emprestimo.status),
+        "usuario_id": Filtro(Emprestimo.usuario_id),
+        "livro_id": Filtro(Emprestimo.livro_id),
+        "vence_de": Filtro(Emprestimo.data_devolucao_prevista, "minimo"),
+        "vence_ate": Filtro(Emprestimo.data_devolucao_prevista, "maximo"),
+    },
+    ordenacoes=("data_emprestimo", "data_devolucao_prevista", "data_devolucao_real"),
+)
+
+def _movimentar_estoque(db: Session, livro_id: int, delta: int) -> bool:
+    """Soma delta a quantidade_disponivel do livro num UPDATE atômico.
+
+    Passa por fora do version_id_col do Livro: empréstimos e devoluções
+    simultâneos do mesmo título não conflitam entre si, e o ETag/If-Match
+    protege só as edições do catálogo. Na retirada, o UPDATE só acontece com
+    exemplar disponível; devolve False quando não havia.
+    """
+    condicoes = [Livro.id == livro_id]
+    if delta < 0:
+        condicoes.append(Livro.quantidade_disponivel >= -delta)
+    resultado = db.execute(
+        update(Livro)
+        .where(*condicoes)
+        .values(quantidade_disponivel=Livro.quantidade_disponivel + delta)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount == 0:
+        return False
+    # O UPDATE em massa não passa pelo flush: a alteração é registrada aqui, e o
+    # evento de disponibilidade sai dela (app.services.eventos)
+    registrar_alteracoes(db, Livro.__tablename__, [livro_id], TipoAlteracao.ATUALIZACAO)
+    return True
+
 @router.post("/", response_model=EmprestimoResponse, status_code=status.HTTP_201_CREATED)
 def create_emprestimo(emprestimo: EmprestimoCreate, db: Session = Depends(get_db)):
     # Verificar se o livro está disponível
-    livro = db.query(Livro).filter(Livro.id == emprestimo.livro_id).first()
+    livro = obter(db, Livro, emprestimo.livro_id)
     if not livro or livro.quantidade_disponivel <= 0:
         raise HTTPException(status_code=400, detail="Livro não disponível para empréstimo")
     
+    # Leitor e funcionário numa única consulta
+    usuarios = obter_varios(db, Usuario, [emprestimo.usuario_id, emprestimo.funcionario_id])
+    
     # Verificar se o usuário existe e está ativo
-    usuario = db.query(Usuario).filter(Usuario.id == emprestimo.usuario_id).first()
+    usuario = usuarios.get(emprestimo.usuario_id)
     if not usuario or not usuario.ativo:
         raise HTTPException(status_code=400, detail="Usuário não encontrado ou inativo")
     
     # Verificar se o funcionário existe e é do tipo funcionário
-    funcionario = db.query(Usuario).filter(Usuario.id == emprestimo.funcionario_id).first()
-    if not funcionario or funcionario.tipo != "funcionario":
+    funcionario = usuarios.get(emprestimo.funcionario_id)
+    if not funcionario or funcionario.tipo != TipoUsuario.FUNCIONARIO:
         raise HTTPException(status_code=400, detail="Funcionário não encontrado ou inválido")
     
+    # Atualizar quantidade disponível do livro; outro empréstimo pode ter levado o último exemplar
+    if not _movimentar_estoque(db, emprestimo.livro_id, -1):
+        raise HTTPException(status_code=400, detail="Livro não disponível para empréstimo")
+    
     # Criar o empréstimo
     db_emprestimo = Emprestimo(**emprestimo.model_dump())
     db.add(db_emprestimo)
     
-    # Atualizar quantidade disponível do livro
-    livro.quantidade_disponivel -= 1
-    
     db.commit()
     db.refresh(db_emprestimo)
     return db_emprestimo
 
 @router.get("/", response_model=List[EmprestimoResponse])
-def read_emprestimos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    emprestimos = db.query(Emprestimo).offset(skip).limit(limit).all()
-    return emprestimos
+def read_emprestimos(
+    skip: int = 0,
+    limit: int = 100,
+    fields: str | None = None,
+    status_filtro: StatusEmprestimo | None = Query(default=None, alias="status"),
+    usuario_id: int | None = None,
+    livro_id: int | None = None,
+    vence_de: datetime | None = None,
+    vence_ate: datetime | None = None,
+    sort: str | None = None,
+    count: bool = False,
+    approximate: bool = False,
+    db: Session = Depends(get_db)
+):
+    campos = campos_solicitados(EmprestimoResponse, fields, CAMPOS_LISTA)
+    filtros = {
+        "status": status_filtro, "usuario_id": usuario_id, "livro_id": livro_id,
+        "vence_de": vence_de, "vence_ate": vence_ate,
+    }
+    query = LISTAGEM.aplicar(db, projetar(db.query(Emprestimo), Emprestimo, campos), filtros, sort)
+    resposta = resposta_projetada(query.offset(skip).limit(limit).all(), EmprestimoResponse, campos)
+    if count or approximate:
+        anexar_total(db, resposta, Emprestimo, filtros, approximate, LISTAGEM.condicoes(filtros))
+    return resposta
 
 @router.get("/{emprestimo_id}", response_model=EmprestimoResponse)
-def read_emprestimo(emprestimo_id: int, db: Session = Depends(get_db)):
-    db_emprestimo = db.query(Emprestimo).filter(Emprestimo.id == emprestimo_id).first()
+def read_emprestimo(emprestimo_id: int, fields: str | None = None, db: Session = Depends(get_db)):
+    campos = campos_solicitados(EmprestimoResponse, fields)
+    db_emprestimo = obter(db, Emprestimo, emprestimo_id, campos)
+    if db_emprestimo is None:
+        # Empréstimos antigos podem ter sido movidos para o arquivo
+        db_emprestimo = obter(db, EmprestimoArquivo, emprestimo_id, campos)
     if db_emprestimo is None:
         raise HTTPException(status_code=404, detail="Empréstimo não encontrado")
+    if campos is not None:
+        return resposta_projetada(db_emprestimo, EmprestimoResponse, campos)
     return db_emprestimo
 
 @router.put("/{emprestimo_id}/devolver", response_model=EmprestimoResponse)
 def devolver_livro(emprestimo_id: int, db: Session = Depends(get_db)):
-    db_emprestimo = db.query(Emprestimo).filter(Emprestimo.id == emprestimo_id).first()
+    db_emprestimo = obter(db, Emprestimo, emprestimo_id)
     if db_emprestimo is None:
         raise HTTPException(status_code=404, detail="Empréstimo não encontrado")
     
@@ -86,8 +161,8 @@ def devolver_livro(emprestimo_id: int, db: Session = Depends(get_db)):
     db_emprestimo.data_devolucao_real = datetime.utcnow()
     
     # Atualizar quantidade disponível do livro
-    livro = db.query(Livro).filter(Livro.id == db_emprestimo.livro_id).first()
-    livro.quantidade_disponivel += 1
+    livro_id = db_emprestimo.livro_id
+    _movimentar_estoque(db, livro_id, 1)
     
     db.commit()
     db.refresh(db_emprestimo)
@@ -95,14 +170,13 @@ def devolver_livro(emprestimo_id: int, db: Session = Depends(get_db)):
 
 @router.delete("/{emprestimo_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_emprestimo(emprestimo_id: int, db: Session = Depends(get_db)):
-    db_emprestimo = db.query(Emprestimo).filter(Emprestimo.id == emprestimo_id).first()
+    db_emprestimo = obter(db, Emprestimo, emprestimo_id)
     if db_emprestimo is None:
         raise HTTPException(status_code=404, detail="Empréstimo não encontrado")
     
     # Se o empréstimo estiver ativo, devolver o livro
     if db_emprestimo.status == StatusEmprestimo.ATIVO:
-        livro = db.query(Livro).filter(Livro.id == db_emprestimo.livro_id).first()
-        livro.quantidade_disponivel += 1
+        _movimentar_estoque(db, db_emprestimo.livro_id, 1)
     
     db.delete(db_emprestimo)
     db.commit()
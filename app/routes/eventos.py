@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+
+from app.services.eventos import hub_eventos
+import settings
+
+router = APIRouter(
+    prefix="/eventos",
+    tags=["eventos"]
+)
+
+@router.get("/")
+async def stream_eventos(
+    request: Request,
+    livro_id: int | None = None,
+    usuario_id: int | None = None
+):
+    # Server-sent events: cada conexão ociosa é só uma corrotina esperando na própria fila
+    assinante = hub_eventos.assinar(livro_id, usuario_id)
+
+    async def gerar():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(
+                        assinante.fila.get(), timeout=settings.EVENTOS_KEEPALIVE_SEGUNDOS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+        finally:
+            hub_eventos.cancelar(assinante)
+
+    return StreamingResponse(
+        gerar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
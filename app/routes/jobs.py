@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.orm import Session
+from typing import Any
+from datetime import datetime
+
+from database import get_db
+from app.models import Job, StatusJob
+from app.services.auditoria import autor_atual
+from app.services.jobs import TIPOS_JOB, executor_jobs, solicitar_cancelamento
+from app.services.repositorio import obter
+from pydantic import BaseModel, ValidationError
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+class JobCreate(BaseModel):
+    tipo: str
+    parametros: dict[str, Any] = {}
+
+class JobResponse(BaseModel):
+    id: int
+    tipo: str
+    parametros: dict[str, Any]
+    status: StatusJob
+    progresso: int
+    total: int | None
+    mensagem: str | None
+    resultado: Any | None
+    erro: str | None
+    cancelamento_solicitado: bool
+    autor: str | None
+    data_criacao: datetime
+    data_inicio: datetime | None
+    data_fim: datetime | None
+
+    class Config:
+        from_attributes = True
+
+@router.post("/", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_job(job: JobCreate, response: Response, db: Session = Depends(get_db)):
+    tipo = TIPOS_JOB.get(job.tipo)
+    if tipo is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tipo de job desconhecido: {job.tipo}. Disponíveis: {', '.join(sorted(TIPOS_JOB))}"
+        )
+    try:
+        parametros = tipo.parametros(**job.parametros)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(include_url=False, include_context=False)
+        )
+
+    db_job = Job(tipo=job.tipo, parametros=parametros.model_dump(mode="json"), autor=autor_atual.get())
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    executor_jobs.notificar()
+    response.headers["Location"] = f"/jobs/{db_job.id}"
+    return db_job
+
+@router.get("/{job_id}", response_model=JobResponse)
+def read_job(job_id: int, db: Session = Depends(get_db)):
+    db_job = obter(db, Job, job_id)
+    if db_job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return db_job
+
+@router.put("/{job_id}/cancelar", response_model=JobResponse)
+def cancelar_job(job_id: int, db: Session = Depends(get_db)):
+    db_job = obter(db, Job, job_id)
+    if db_job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    if not solicitar_cancelamento(db, db_job):
+        raise HTTPException(status_code=400, detail="Este job já terminou")
+    return db_job
@@ -0,0 +1,110 @@
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.services.contagens import cache_contagens
+import settings
+
+class Filtro:
+    """Um parâmetro de filtro: a coluna e como o valor é comparado.
+
+    igual: coluna = valor; minimo/maximo: faixas (>=, <=); prefixo: LIKE
+    'valor%'; positivo: coluna > 0 para True e coluna = 0 para False.
+    """
+
+    OPERADORES = ("igual", "minimo", "maximo", "prefixo", "positivo")
+
+    def __init__(self, coluna, operador: str = "igual"):
+        if operador not in self.OPERADORES:
+            raise ValueError(f"Operador inválido: {operador}")
+        self.coluna = coluna
+        self.operador = operador
+
+    def condicao(self, valor):
+        if self.operador == "igual":
+            return self.coluna == valor
+        if self.operador == "minimo":
+            return self.coluna >= valor
+        if self.operador == "maximo":
+            return self.coluna <= valor
+        if self.operador == "prefixo":
+            # Padrão montado aqui, e não com concat() no SQL, para o banco usar o índice
+            padrao = valor.replace("/", "//").replace("%", "/%").replace("_", "/_")
+            return self.coluna.like(f"{padrao}%", escape="/")
+        return self.coluna > 0 if valor else self.coluna == 0
+
+def _indices(tabela) -> list[tuple[str, ...]]:
+    # Colunas de cada índice, na ordem; no InnoDB todo índice secundário
+    # termina na chave primária, que desempata a ordenação
+    indices = [tuple(coluna.name for coluna in tabela.primary_key.columns)]
+    indices += [tuple(coluna.name for coluna in indice.columns) for indice in tabela.indexes]
+    return indices
+
+class Listagem:
+    """Filtros e ordenações aceitos pela rota de listagem de um modelo.
+
+    Todo filtro precisa de um índice que comece pela sua coluna, conferido na
+    importação: qualquer combinação de filtros tem por onde começar sem varrer
+    a tabela. Uma ordenação é atendida por índice quando a coluna está num
+    índice e as demais colunas dele estão fixadas por filtros de igualdade;
+    fora disso, a ordenação só é aceita enquanto a tabela tiver até
+    LISTAGEM_ORDENACAO_SEM_INDICE_MAXIMO linhas.
+    """
+
+    def __init__(self, modelo, filtros: dict[str, Filtro], ordenacoes: tuple[str, ...]):
+        self.modelo = modelo
+        self.filtros = filtros
+        self.ordenacoes = ordenacoes
+        self.indices = _indices(modelo.__table__)
+        for nome, filtro in filtros.items():
+            if not any(indice[0] == filtro.coluna.key for indice in self.indices):
+                raise ValueError(f"{modelo.__name__}: o filtro {nome} não tem índice começando por {filtro.coluna.key}")
+
+    def condicoes(self, valores: dict) -> list:
+        return [self.filtros[nome].condicao(valor) for nome, valor in valores.items() if valor is not None]
+
+    def _fixadas(self, valores: dict) -> set[str]:
+        return {
+            self.filtros[nome].coluna.key
+            for nome, valor in valores.items()
+            if valor is not None and self.filtros[nome].operador == "igual"
+        }
+
+    def colunas_necessarias(self, campo: str, fixadas: set[str] = frozenset()) -> tuple[str, ...] | None:
+        """Colunas que faltam fixar para ordenar por (campo, id) pelo índice.
+
+        São as do índice antes de campo e, como o desempate é pelo id que
+        fecha o índice, também as depois dele. () quando a ordenação já é
+        atendida; None quando nenhum índice tem campo.
+        """
+        melhor = None
+        for indice in self.indices:
+            if campo not in indice:
+                continue
+            faltam = tuple(coluna for coluna in indice if coluna not in fixadas and coluna not in (campo, "id"))
+            if melhor is None or len(faltam) < len(melhor):
+                melhor = faltam
+        return melhor
+
+    def aplicar(self, db: Session, query, valores: dict, sort: str | None):
+        """Filtra e ordena query; sort é campo ou -campo (decrescente)."""
+        query = query.filter(*self.condicoes(valores))
+        if not sort:
+            return query
+        campo = sort.removeprefix("-")
+        if campo not in self.ordenacoes:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Ordenação inválida: {campo}. Aceitas: {', '.join(self.ordenacoes)}"
+            )
+        faltam = self.colunas_necessarias(campo, self._fixadas(valores))
+        if faltam != ():
+            total, _ = cache_contagens.contar(db, self.modelo, {})
+            if total > settings.LISTAGEM_ORDENACAO_SEM_INDICE_MAXIMO:
+                detalhe = f"Ordenação por {campo} sem índice nesta tabela"
+                if faltam:
+                    detalhe = f"Ordenação por {campo} exige filtrar por {', '.join(faltam)}"
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detalhe)
+        colunas = (getattr(self.modelo, campo), self.modelo.id)
+        if sort.startswith("-"):
+            return query.order_by(*(coluna.desc() for coluna in colunas))
+        return query.order_by(*colunas)
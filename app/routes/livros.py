@@ -1,11 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal
 from datetime import datetime
 
 from database import get_db
 from app.models import Livro
+from app.routes.listagem import Listagem, Filtro
+from app.routes.utils import (
+    campos_alterados, aplicar_alteracoes, campos_solicitados, campos_sem_texto,
+    projetar, resposta_projetada, anexar_total, etag, verificar_if_match
+)
+from app.services.disponibilidade import indice_disponibilidade, consultar_no_banco
+from app.services.sugestoes import indice_sugestoes, sugerir_no_banco
+from app.services.recomendacoes import indice_recomendacoes
+from app.services.capas import servico_capas, CapaIndisponivel, TAMANHOS
+from app.services.repositorio import obter, existe
 from pydantic import BaseModel
+import settings
 
 router = APIRouter(
     prefix="/livros",
@@ -29,6 +41,19 @@ class LivroBase(BaseModel):
 class LivroCreate(LivroBase):
     pass
 
+class LivroUpdate(BaseModel):
+    titulo: str | None = None
+    autor: str | None = None
+    isbn: str | None = None
+    editora: str | None = None
+    ano_publicacao: int | None = None
+    edicao: str | None = None
+    quantidade_total: int | None = None
+    categoria_id: int | None = None
+    localizacao: str | None = None
+    sinopse: str | None = None
+    capa_url: str | None = None
+
 class LivroResponse(LivroBase):
     id: int
     data_cadastro: datetime
@@ -37,44 +62,256 @@ class LivroResponse(LivroBase):
     class Config:
         from_attributes = True
 
+# Colunas Text ficam fora das listagens, a menos que pedidas em fields
+CAMPOS_LISTA = campos_sem_texto(LivroResponse, ("sinopse",))
+
+LISTAGEM = Listagem(
+    Livro,
+    filtros={
+        "categoria_id": Filtro(Livro.categoria_id),
+        "autor": Filtro(Livro.autor, "prefixo"),
+        "disponivel": Filtro(Livro.quantidade_disponivel, "positivo"),
+    },
+    ordenacoes=("titulo", "autor", "ano_publicacao", "data_atualizacao"),
+)
+
+class DisponibilidadeRequest(BaseModel):
+    ids: List[int] = []
+    isbns: List[str] = []
+
+class DisponibilidadeItem(BaseModel):
+    id: int | None = None
+    isbn: str | None = None
+    quantidade_disponivel: int | None = None
+    disponivel: bool
+
+class DisponibilidadeResponse(BaseModel):
+    itens: List[DisponibilidadeItem]
+
+class SugestaoResponse(BaseModel):
+    id: int
+    titulo: str
+    autor: str
+    emprestimos: int
+
+class RecomendacaoResponse(BaseModel):
+    livro_id: int
+    emprestimos_em_comum: int
+
+ERRO_TOTAL_EMPRESTADOS = "quantidade_total menor que o número de exemplares emprestados"
+
+def _ajuste_disponivel(db_livro: Livro, quantidade_total: int):
+    """Expressão SQL que leva a mudança de quantidade_total para quantidade_disponivel.
+
+    Empréstimos e devoluções mudam quantidade_disponivel num UPDATE atômico
+    que não incrementa a versão (app.routes.emprestimos), então o If-Match de
+    uma edição não protege esse campo: gravar o valor lido pelo cliente
+    desfaria os empréstimos feitos depois da leitura. Por isso PUT e PATCH
+    ignoram quantidade_disponivel, e exemplares acrescentados ou retirados
+    entram como delta sobre o valor que estiver no banco. None quando o total
+    não muda.
+    """
+    delta = quantidade_total - db_livro.quantidade_total
+    if delta == 0:
+        return None
+    if db_livro.quantidade_disponivel + delta < 0:
+        raise HTTPException(status_code=400, detail=ERRO_TOTAL_EMPRESTADOS)
+    # Se um empréstimo chegar entre a leitura e o UPDATE, o CHECK do banco recusa o negativo
+    return Livro.quantidade_disponivel + delta
+
 @router.post("/", response_model=LivroResponse, status_code=status.HTTP_201_CREATED)
-def create_livro(livro: LivroCreate, db: Session = Depends(get_db)):
+def create_livro(livro: LivroCreate, response: Response, db: Session = Depends(get_db)):
     db_livro = Livro(**livro.model_dump())
     db.add(db_livro)
     db.commit()
     db.refresh(db_livro)
+    response.headers["ETag"] = etag(db_livro)
     return db_livro
 
 @router.get("/", response_model=List[LivroResponse])
-def read_livros(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    livros = db.query(Livro).offset(skip).limit(limit).all()
-    return livros
+def read_livros(
+    skip: int = 0,
+    limit: int = 100,
+    fields: str | None = None,
+    categoria_id: int | None = None,
+    autor: str | None = None,
+    disponivel: bool | None = None,
+    sort: str | None = None,
+    count: bool = False,
+    approximate: bool = False,
+    db: Session = Depends(get_db)
+):
+    campos = campos_solicitados(LivroResponse, fields, CAMPOS_LISTA)
+    filtros = {"categoria_id": categoria_id, "autor": autor, "disponivel": disponivel}
+    query = LISTAGEM.aplicar(db, projetar(db.query(Livro), Livro, campos), filtros, sort)
+    resposta = resposta_projetada(query.offset(skip).limit(limit).all(), LivroResponse, campos)
+    if count or approximate:
+        anexar_total(db, resposta, Livro, filtros, approximate, LISTAGEM.condicoes(filtros))
+    return resposta
+
+@router.post("/disponibilidade", response_model=DisponibilidadeResponse)
+def consultar_disponibilidade(consulta: DisponibilidadeRequest, db: Session = Depends(get_db)):
+    # Respondido pelo índice em memória, sem consultar o banco; enquanto a carga
+    # em segundo plano não termina, uma consulta só
+    if indice_disponibilidade.carregado:
+        por_id = indice_disponibilidade.por_id
+        id_por_isbn = indice_disponibilidade.id_por_isbn
+    else:
+        quantidades, ids_por_isbn = consultar_no_banco(db, consulta.ids, consulta.isbns)
+        por_id = quantidades.get
+        id_por_isbn = ids_por_isbn.get
+    
+    itens = []
+    for livro_id in consulta.ids:
+        quantidade = por_id(livro_id)
+        itens.append(DisponibilidadeItem(
+            id=livro_id,
+            quantidade_disponivel=quantidade,
+            disponivel=bool(quantidade)
+        ))
+    for isbn in consulta.isbns:
+        livro_id = id_por_isbn(isbn)
+        quantidade = por_id(livro_id) if livro_id is not None else None
+        itens.append(DisponibilidadeItem(
+            id=livro_id,
+            isbn=isbn,
+            quantidade_disponivel=quantidade,
+            disponivel=bool(quantidade)
+        ))
+    return DisponibilidadeResponse(itens=itens)
+
+@router.get("/sugestoes", response_model=List[SugestaoResponse])
+def sugerir_livros(
+    prefixo: str = Query(min_length=1, max_length=100),
+    limite: int = Query(default=10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    # Respondido pelo índice de prefixos em memória; no banco enquanto ele carrega
+    if not indice_sugestoes.carregado:
+        return sugerir_no_banco(db, prefixo, limite)
+    return indice_sugestoes.sugerir(prefixo, limite)
+
+@router.get("/{livro_id}/recomendacoes", response_model=List[RecomendacaoResponse])
+def recomendar_livros(
+    livro_id: int,
+    limite: int = Query(default=10, ge=1, le=50)
+):
+    # Respondido pelo índice de coocorrência em memória, montado pelo job "recomendacoes"
+    if not indice_recomendacoes.carregado:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Índice de recomendações ainda não carregado",
+            headers={"Retry-After": str(int(settings.RECOMENDACOES_ATUALIZACAO_SEGUNDOS))}
+        )
+    return indice_recomendacoes.recomendar(livro_id, limite)
+
+@router.get("/{livro_id}/capa", response_class=Response, responses={200: {"content": {"image/jpeg": {}}}})
+def read_capa(
+    livro_id: int,
+    tamanho: Literal[tuple(TAMANHOS)] = "media",
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    # Servida do cache em disco; só o primeiro pedido de cada capa vai à origem
+    db_livro = obter(db, Livro, livro_id, ["capa_url"])
+    if db_livro is None:
+        raise HTTPException(status_code=404, detail="Livro não encontrado")
+    if not db_livro.capa_url:
+        raise HTTPException(status_code=404, detail="Livro sem capa")
+    try:
+        conteudo, etag_capa = servico_capas.obter(db_livro.capa_url, tamanho)
+    except CapaIndisponivel as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Capa indisponível: {e}")
+
+    cabecalhos = {"ETag": etag_capa, "Cache-Control": f"public, max-age={settings.CAPAS_MAX_AGE_SEGUNDOS}"}
+    tags = [tag.strip().removeprefix("W/") for tag in (if_none_match or "").split(",")]
+    if etag_capa in tags or "*" in tags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos)
+    return Response(content=conteudo, media_type="image/jpeg", headers=cabecalhos)
 
 @router.get("/{livro_id}", response_model=LivroResponse)
-def read_livro(livro_id: int, db: Session = Depends(get_db)):
-    db_livro = db.query(Livro).filter(Livro.id == livro_id).first()
+def read_livro(livro_id: int, response: Response, fields: str | None = None, db: Session = Depends(get_db)):
+    campos = campos_solicitados(LivroResponse, fields)
+    db_livro = obter(db, Livro, livro_id, campos)
     if db_livro is None:
         raise HTTPException(status_code=404, detail="Livro não encontrado")
-    return db_livro
+    if campos is not None:
+        response = resposta_projetada(db_livro, LivroResponse, campos)
+    response.headers["ETag"] = etag(db_livro)
+    return response if campos is not None else db_livro
 
 @router.put("/{livro_id}", response_model=LivroResponse)
-def update_livro(livro_id: int, livro: LivroCreate, db: Session = Depends(get_db)):
-    db_livro = db.query(Livro).filter(Livro.id == livro_id).first()
+def update_livro(
+    livro_id: int,
+    livro: LivroCreate,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    db_livro = obter(db, Livro, livro_id)
     if db_livro is None:
         raise HTTPException(status_code=404, detail="Livro não encontrado")
+    verificar_if_match(if_match, db_livro)
     
-    for key, value in livro.model_dump().items():
+    # quantidade_disponivel é só de leitura aqui (ver _ajuste_disponivel)
+    dados = livro.model_dump(exclude={"quantidade_disponivel"})
+    ajuste = _ajuste_disponivel(db_livro, dados["quantidade_total"])
+    if ajuste is not None:
+        db_livro.quantidade_disponivel = ajuste
+    for key, value in dados.items():
         setattr(db_livro, key, value)
     
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=ERRO_TOTAL_EMPRESTADOS)
     db.refresh(db_livro)
+    response.headers["ETag"] = etag(db_livro)
     return db_livro
 
+@router.patch("/{livro_id}", response_model=LivroResponse)
+def patch_livro(
+    livro_id: int,
+    livro: LivroUpdate,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    db_livro = obter(db, Livro, livro_id)
+    if db_livro is None:
+        raise HTTPException(status_code=404, detail="Livro não encontrado")
+    verificar_if_match(if_match, db_livro)
+    
+    alteracoes = campos_alterados(Livro, db_livro, livro.model_dump(exclude_unset=True))
+    if not alteracoes:
+        response.headers["ETag"] = etag(db_livro)
+        return db_livro
+    
+    if "isbn" in alteracoes and existe(db, Livro.isbn, alteracoes["isbn"]):
+        raise HTTPException(status_code=400, detail="ISBN já cadastrado")
+    
+    expressoes = {}
+    if "quantidade_total" in alteracoes:
+        ajuste = _ajuste_disponivel(db_livro, alteracoes["quantidade_total"])
+        if ajuste is not None:
+            expressoes["quantidade_disponivel"] = ajuste
+    try:
+        aplicar_alteracoes(db, Livro, db_livro, alteracoes, expressoes)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=ERRO_TOTAL_EMPRESTADOS)
+    resposta = LivroResponse.model_validate(db_livro)
+    response.headers["ETag"] = etag(db_livro)
+    db.commit()
+    return resposta
+
 @router.delete("/{livro_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_livro(livro_id: int, db: Session = Depends(get_db)):
-    db_livro = db.query(Livro).filter(Livro.id == livro_id).first()
+def delete_livro(livro_id: int, if_match: str | None = Header(default=None), db: Session = Depends(get_db)):
+    db_livro = obter(db, Livro, livro_id)
     if db_livro is None:
         raise HTTPException(status_code=404, detail="Livro não encontrado")
+    verificar_if_match(if_match, db_livro)
     
     db.delete(db_livro)
     db.commit()
@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
 from decimal import Decimal
 
 from database import get_db
-from app.models import Multa, StatusMulta, Emprestimo
-from pydantic import BaseModel
+from app.routes.utils import campos_solicitados, campos_sem_texto, projetar, resposta_projetada, anexar_total
+from app.routes.listagem import Listagem, Filtro
+from app.models import Multa, StatusMulta, Emprestimo, StatusEmprestimo, MultaArquivo, TipoUsuario, Usuario
+from app.services.cotacao import (
+    Tarifa, carregar_atrasos, simular, tarifa_vigente, dias_de_atraso, calcular_multa
+)
+from app.services.repositorio import obter
+from pydantic import BaseModel, Field
 
 router = APIRouter(
     prefix="/multas",
@@ -15,15 +22,19 @@ router = APIRouter(
 
 class MultaBase(BaseModel):
     emprestimo_id: int
-    valor: Decimal
     motivo: str
-    dias_atraso: int
-    valor_por_dia: Decimal
 
 class MultaCreate(MultaBase):
-    pass
+    # Calculados pelo servidor a partir do empréstimo e da tarifa vigente;
+    # quando enviados, precisam conferir com o cálculo
+    valor: Decimal | None = None
+    dias_atraso: int | None = None
+    valor_por_dia: Decimal | None = None
 
 class MultaResponse(MultaBase):
+    valor: Decimal
+    dias_atraso: int
+    valor_por_dia: Decimal
     id: int
     data_geracao: datetime
     data_pagamento: datetime | None
@@ -32,14 +43,55 @@ class MultaResponse(MultaBase):
     class Config:
         from_attributes = True
 
+class TarifaTipo(BaseModel):
+    valor_por_dia: Decimal = Field(ge=0)
+    teto: Decimal | None = Field(default=None, ge=0)
+    dias_carencia: int = Field(default=0, ge=0)
+
+class SimulacaoRequest(BaseModel):
+    # Tipos de usuário sem tarifa ficam isentos na simulação
+    tarifas: dict[TipoUsuario, TarifaTipo]
+    data_referencia: datetime | None = None
+    limite_usuarios: int = Field(default=100, ge=0, le=10000)
+
+class ResumoTipo(BaseModel):
+    total: Decimal
+    quantidade_emprestimos: int
+
+class ProjecaoUsuario(BaseModel):
+    usuario_id: int
+    tipo: TipoUsuario
+    quantidade_emprestimos: int
+    valor: Decimal
+
+class SimulacaoResponse(BaseModel):
+    data_referencia: datetime
+    total: Decimal
+    quantidade_emprestimos: int
+    quantidade_usuarios: int
+    por_tipo: dict[TipoUsuario, ResumoTipo]
+    usuarios: List[ProjecaoUsuario]
+
+# Colunas Text ficam fora das listagens, a menos que pedidas em fields
+CAMPOS_LISTA = campos_sem_texto(MultaResponse, ("motivo",))
+
+LISTAGEM = Listagem(
+    Multa,
+    filtros={
+        "status": Filtro(Multa.status),
+        "emprestimo_id": Filtro(Multa.emprestimo_id),
+    },
+    ordenacoes=("data_geracao", "valor"),
+)
+
 @router.post("/", response_model=MultaResponse, status_code=status.HTTP_201_CREATED)
 def create_multa(multa: MultaCreate, db: Session = Depends(get_db)):
     # Verificar se o empréstimo existe e está atrasado
-    emprestimo = db.query(Emprestimo).filter(Emprestimo.id == multa.emprestimo_id).first()
+    emprestimo = obter(db, Emprestimo, multa.emprestimo_id)
     if not emprestimo:
         raise HTTPException(status_code=400, detail="Empréstimo não encontrado")
     
-    if emprestimo.status != "atrasado":
+    if emprestimo.status != StatusEmprestimo.ATRASADO:
         raise HTTPException(status_code=400, detail="Multa só pode ser gerada para empréstimos atrasados")
     
     # Verificar se já existe uma multa pendente para este empréstimo
@@ -51,28 +103,78 @@ def create_multa(multa: MultaCreate, db: Session = Depends(get_db)):
     if multa_existente:
         raise HTTPException(status_code=400, detail="Já existe uma multa pendente para este empréstimo")
     
+    # Valor, dias e valor por dia saem do empréstimo e da tarifa vigente, nunca do cliente
+    tipo = db.scalar(select(Usuario.tipo).where(Usuario.id == emprestimo.usuario_id))
+    tarifa = tarifa_vigente(tipo)
+    dias = dias_de_atraso(emprestimo.data_devolucao_prevista, emprestimo.data_devolucao_real or datetime.utcnow())
+    if tarifa is None or calcular_multa(tarifa, dias) <= 0:
+        raise HTTPException(status_code=400, detail="Não há multa a gerar: usuário isento ou atraso dentro da carência")
+    calculado = {"valor": calcular_multa(tarifa, dias), "dias_atraso": dias, "valor_por_dia": tarifa.valor_por_dia}
+    divergentes = [
+        f"{campo} (esperado {esperado})" for campo, esperado in calculado.items()
+        if getattr(multa, campo) is not None and getattr(multa, campo) != esperado
+    ]
+    if divergentes:
+        raise HTTPException(
+            status_code=400,
+            detail="Valores não conferem com a tarifa vigente: " + ", ".join(divergentes)
+        )
+    
     # Criar a multa
-    db_multa = Multa(**multa.model_dump())
+    db_multa = Multa(emprestimo_id=multa.emprestimo_id, motivo=multa.motivo, **calculado)
     db.add(db_multa)
     db.commit()
     db.refresh(db_multa)
     return db_multa
 
+@router.post("/simulacao", response_model=SimulacaoResponse)
+def simular_tarifa(simulacao: SimulacaoRequest, db: Session = Depends(get_db)):
+    # Projeta a tarifa candidata sobre todos os empréstimos em aberto já vencidos
+    referencia = simulacao.data_referencia or datetime.utcnow()
+    colunas = carregar_atrasos(db, referencia)
+    tarifas = {
+        tipo: Tarifa(tarifa.valor_por_dia, tarifa.teto, tarifa.dias_carencia)
+        for tipo, tarifa in simulacao.tarifas.items()
+    }
+    return {"data_referencia": referencia, **simular(colunas, tarifas, simulacao.limite_usuarios)}
+
 @router.get("/", response_model=List[MultaResponse])
-def read_multas(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    multas = db.query(Multa).offset(skip).limit(limit).all()
-    return multas
+def read_multas(
+    skip: int = 0,
+    limit: int = 100,
+    fields: str | None = None,
+    status_filtro: StatusMulta | None = Query(default=None, alias="status"),
+    emprestimo_id: int | None = None,
+    sort: str | None = None,
+    count: bool = False,
+    approximate: bool = False,
+    db: Session = Depends(get_db)
+):
+    campos = campos_solicitados(MultaResponse, fields, CAMPOS_LISTA)
+    filtros = {"status": status_filtro, "emprestimo_id": emprestimo_id}
+    query = LISTAGEM.aplicar(db, projetar(db.query(Multa), Multa, campos), filtros, sort)
+    resposta = resposta_projetada(query.offset(skip).limit(limit).all(), MultaResponse, campos)
+    if count or approximate:
+        anexar_total(db, resposta, Multa, filtros, approximate, LISTAGEM.condicoes(filtros))
+    return resposta
 
 @router.get("/{multa_id}", response_model=MultaResponse)
-def read_multa(multa_id: int, db: Session = Depends(get_db)):
-    db_multa = db.query(Multa).filter(Multa.id == multa_id).first()
+def read_multa(multa_id: int, fields: str | None = None, db: Session = Depends(get_db)):
+    campos = campos_solicitados(MultaResponse, fields)
+    db_multa = obter(db, Multa, multa_id, campos)
+    if db_multa is None:
+        # Multas antigas podem ter sido movidas para o arquivo
+        db_multa = obter(db, MultaArquivo, multa_id, campos)
     if db_multa is None:
         raise HTTPException(status_code=404, detail="Multa não encontrada")
+    if campos is not None:
+        return resposta_projetada(db_multa, MultaResponse, campos)
     return db_multa
 
 @router.put("/{multa_id}/pagar", response_model=MultaResponse)
 def pagar_multa(multa_id: int, db: Session = Depends(get_db)):
-    db_multa = db.query(Multa).filter(Multa.id == multa_id).first()
+    # FOR UPDATE: uma quitação simultânea (POST /usuarios/{id}/multas/quitar) espera ou é esperada
+    db_multa = obter(db, Multa, multa_id, bloquear=True)
     if db_multa is None:
         raise HTTPException(status_code=404, detail="Multa não encontrada")
     
@@ -88,7 +190,7 @@ def pagar_multa(multa_id: int, db: Session = Depends(get_db)):
 
 @router.put("/{multa_id}/cancelar", response_model=MultaResponse)
 def cancelar_multa(multa_id: int, db: Session = Depends(get_db)):
-    db_multa = db.query(Multa).filter(Multa.id == multa_id).first()
+    db_multa = obter(db, Multa, multa_id, bloquear=True)
     if db_multa is None:
         raise HTTPException(status_code=404, detail="Multa não encontrada")
     
@@ -102,7 +204,7 @@ def cancelar_multa(multa_id: int, db: Session = Depends(get_db)):
 
 @router.delete("/{multa_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_multa(multa_id: int, db: Session = Depends(get_db)):
-    db_multa = db.query(Multa).filter(Multa.id == multa_id).first()
+    db_multa = obter(db, Multa, multa_id)
     if db_multa is None:
         raise HTTPException(status_code=404, detail="Multa não encontrada")
     
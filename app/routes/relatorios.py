@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from typing import List, Literal
+from datetime import date, datetime, timedelta
+from pydantic import BaseModel
+
+from database import get_db
+from app.models import CirculacaoLivroDiaria, CirculacaoCategoriaDiaria
+from app.services.circulacao import ler_marca
+
+router = APIRouter(
+    prefix="/relatorios",
+    tags=["relatorios"]
+)
+
+# Os relatórios leem só os agregados diários, nunca emprestimos/livros
+AGREGADOS = {
+    "livro": (CirculacaoLivroDiaria, CirculacaoLivroDiaria.livro_id),
+    "categoria": (CirculacaoCategoriaDiaria, CirculacaoCategoriaDiaria.categoria_id),
+}
+
+class PontoCirculacao(BaseModel):
+    periodo: str
+    id: int
+    emprestimos: int
+    devolucoes: int
+
+class SerieCirculacaoResponse(BaseModel):
+    inicio: date
+    fim: date
+    atualizado_ate: datetime | None
+    pontos: List[PontoCirculacao]
+
+class ItemRanking(BaseModel):
+    id: int
+    emprestimos: int
+    devolucoes: int
+
+class RankingCirculacaoResponse(BaseModel):
+    inicio: date
+    fim: date
+    atualizado_ate: datetime | None
+    itens: List[ItemRanking]
+
+def _intervalo(inicio: date | None, fim: date | None) -> tuple[date, date]:
+    fim = fim or datetime.utcnow().date()
+    return inicio or fim - timedelta(days=30), fim
+
+@router.get("/circulacao", response_model=SerieCirculacaoResponse)
+def serie_circulacao(
+    inicio: date | None = None,
+    fim: date | None = None,
+    por: Literal["livro", "categoria"] = "categoria",
+    id: int | None = None,
+    periodo: Literal["dia", "mes"] = "dia",
+    db: Session = Depends(get_db)
+):
+    inicio, fim = _intervalo(inicio, fim)
+    modelo, chave = AGREGADOS[por]
+    consulta = (
+        select(modelo.dia, chave, modelo.emprestimos, modelo.devolucoes)
+        .where(modelo.dia >= inicio, modelo.dia <= fim)
+        .order_by(modelo.dia, chave)
+    )
+    if id is not None:
+        consulta = consulta.where(chave == id)
+
+    # Agrupamento por mês feito aqui: linhas diárias já são poucas
+    pontos: dict[tuple[str, int], list] = {}
+    for dia, chave_id, emprestimos, devolucoes in db.execute(consulta):
+        rotulo = dia.strftime("%Y-%m") if periodo == "mes" else dia.isoformat()
+        ponto = pontos.setdefault((rotulo, chave_id), [0, 0])
+        ponto[0] += emprestimos
+        ponto[1] += devolucoes
+
+    return {
+        "inicio": inicio,
+        "fim": fim,
+        "atualizado_ate": ler_marca(db),
+        "pontos": [
+            {"periodo": rotulo, "id": chave_id, "emprestimos": emprestimos, "devolucoes": devolucoes}
+            for (rotulo, chave_id), (emprestimos, devolucoes) in pontos.items()
+        ],
+    }
+
+@router.get("/circulacao/top", response_model=RankingCirculacaoResponse)
+def ranking_circulacao(
+    inicio: date | None = None,
+    fim: date | None = None,
+    por: Literal["livro", "categoria"] = "livro",
+    metrica: Literal["emprestimos", "devolucoes"] = "emprestimos",
+    limite: int = Query(50, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    inicio, fim = _intervalo(inicio, fim)
+    modelo, chave = AGREGADOS[por]
+    emprestimos = func.sum(modelo.emprestimos).label("emprestimos")
+    devolucoes = func.sum(modelo.devolucoes).label("devolucoes")
+    ordem = emprestimos if metrica == "emprestimos" else devolucoes
+    linhas = db.execute(
+        select(chave, emprestimos, devolucoes)
+        .where(modelo.dia >= inicio, modelo.dia <= fim)
+        .group_by(chave)
+        .order_by(ordem.desc(), chave)
+        .limit(limite)
+    ).all()
+    return {
+        "inicio": inicio,
+        "fim": fim,
+        "atualizado_ate": ler_marca(db),
+        "itens": [
+            {"id": chave_id, "emprestimos": total_emprestimos, "devolucoes": total_devolucoes}
+            for chave_id, total_emprestimos, total_devolucoes in linhas
+        ],
+    }
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime, timedelta
 
 from database import get_db
+from app.routes.utils import (
+    campos_solicitados, campos_sem_texto, projetar, resposta_projetada, anexar_total, etag, verificar_if_match
+)
+from app.routes.listagem import Listagem, Filtro
 from app.models import Reserva, StatusReserva, Livro, Usuario
+from app.services.repositorio import obter
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -29,15 +34,27 @@ class ReservaResponse(ReservaBase):
     class Config:
         from_attributes = True
 
+CAMPOS_LISTA = campos_sem_texto(ReservaResponse, ())
+
+LISTAGEM = Listagem(
+    Reserva,
+    filtros={
+        "status": Filtro(Reserva.status),
+        "usuario_id": Filtro(Reserva.usuario_id),
+        "livro_id": Filtro(Reserva.livro_id),
+    },
+    ordenacoes=("data_reserva", "data_limite", "prioridade"),
+)
+
 @router.post("/", response_model=ReservaResponse, status_code=status.HTTP_201_CREATED)
-def create_reserva(reserva: ReservaCreate, db: Session = Depends(get_db)):
+def create_reserva(reserva: ReservaCreate, response: Response, db: Session = Depends(get_db)):
     # Verificar se o livro existe
-    livro = db.query(Livro).filter(Livro.id == reserva.livro_id).first()
+    livro = obter(db, Livro, reserva.livro_id)
     if not livro:
         raise HTTPException(status_code=400, detail="Livro não encontrado")
     
     # Verificar se o usuário existe e está ativo
-    usuario = db.query(Usuario).filter(Usuario.id == reserva.usuario_id).first()
+    usuario = obter(db, Usuario, reserva.usuario_id)
     if not usuario or not usuario.ativo:
         raise HTTPException(status_code=400, detail="Usuário não encontrado ou inativo")
     
@@ -56,25 +73,52 @@ def create_reserva(reserva: ReservaCreate, db: Session = Depends(get_db)):
     db.add(db_reserva)
     db.commit()
     db.refresh(db_reserva)
+    response.headers["ETag"] = etag(db_reserva)
     return db_reserva
 
 @router.get("/", response_model=List[ReservaResponse])
-def read_reservas(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    reservas = db.query(Reserva).offset(skip).limit(limit).all()
-    return reservas
+def read_reservas(
+    skip: int = 0,
+    limit: int = 100,
+    fields: str | None = None,
+    status_filtro: StatusReserva | None = Query(default=None, alias="status"),
+    usuario_id: int | None = None,
+    livro_id: int | None = None,
+    sort: str | None = None,
+    count: bool = False,
+    approximate: bool = False,
+    db: Session = Depends(get_db)
+):
+    campos = campos_solicitados(ReservaResponse, fields, CAMPOS_LISTA)
+    filtros = {"status": status_filtro, "usuario_id": usuario_id, "livro_id": livro_id}
+    query = LISTAGEM.aplicar(db, projetar(db.query(Reserva), Reserva, campos), filtros, sort)
+    resposta = resposta_projetada(query.offset(skip).limit(limit).all(), ReservaResponse, campos)
+    if count or approximate:
+        anexar_total(db, resposta, Reserva, filtros, approximate, LISTAGEM.condicoes(filtros))
+    return resposta
 
 @router.get("/{reserva_id}", response_model=ReservaResponse)
-def read_reserva(reserva_id: int, db: Session = Depends(get_db)):
-    db_reserva = db.query(Reserva).filter(Reserva.id == reserva_id).first()
+def read_reserva(reserva_id: int, response: Response, fields: str | None = None, db: Session = Depends(get_db)):
+    campos = campos_solicitados(ReservaResponse, fields)
+    db_reserva = obter(db, Reserva, reserva_id, campos)
     if db_reserva is None:
         raise HTTPException(status_code=404, detail="Reserva não encontrada")
-    return db_reserva
+    if campos is not None:
+        response = resposta_projetada(db_reserva, ReservaResponse, campos)
+    response.headers["ETag"] = etag(db_reserva)
+    return response if campos is not None else db_reserva
 
 @router.put("/{reserva_id}/cancelar", response_model=ReservaResponse)
-def cancelar_reserva(reserva_id: int, db: Session = Depends(get_db)):
-    db_reserva = db.query(Reserva).filter(Reserva.id == reserva_id).first()
+def cancelar_reserva(
+    reserva_id: int,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    db_reserva = obter(db, Reserva, reserva_id)
     if db_reserva is None:
         raise HTTPException(status_code=404, detail="Reserva não encontrada")
+    verificar_if_match(if_match, db_reserva)
     
     if db_reserva.status != StatusReserva.PENDENTE:
         raise HTTPException(status_code=400, detail="Esta reserva não pode ser cancelada")
@@ -82,13 +126,15 @@ def cancelar_reserva(reserva_id: int, db: Session = Depends(get_db)):
     db_reserva.status = StatusReserva.CANCELADA
     db.commit()
     db.refresh(db_reserva)
+    response.headers["ETag"] = etag(db_reserva)
     return db_reserva
 
 @router.delete("/{reserva_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_reserva(reserva_id: int, db: Session = Depends(get_db)):
-    db_reserva = db.query(Reserva).filter(Reserva.id == reserva_id).first()
+def delete_reserva(reserva_id: int, if_match: str | None = Header(default=None), db: Session = Depends(get_db)):
+    db_reserva = obter(db, Reserva, reserva_id)
     if db_reserva is None:
         raise HTTPException(status_code=404, detail="Reserva não encontrada")
+    verificar_if_match(if_match, db_reserva)
     
     db.delete(db_reserva)
     db.commit()
@@ -1,11 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from typing import List
 from datetime import datetime
+from decimal import Decimal
 from pydantic import BaseModel, EmailStr, Field
 
 from database import get_db
-from app.models import Usuario, TipoUsuario
+from app.models import Usuario, TipoUsuario, Multa, StatusMulta, Emprestimo, TipoAlteracao, Quitacao
+from app.services.resumos import cache_resumos, montar_resumo, invalidar_resumo
+from app.services.alteracoes import registrar_alteracoes
+from app.services.auditoria import registrar_auditoria
+from app.services.repositorio import obter, existe
+from app.routes.utils import (
+    campos_alterados, aplicar_alteracoes, campos_solicitados, campos_sem_texto,
+    projetar, resposta_projetada, anexar_total, etag, verificar_if_match
+)
 
 router = APIRouter(
     prefix="/usuarios",
@@ -37,6 +50,17 @@ class UsuarioCreate(BaseModel):
             }
         }
 
+# Schema para atualização parcial de usuário
+class UsuarioUpdate(BaseModel):
+    nome_completo: str | None = Field(default=None, min_length=3, max_length=100)
+    cpf: str | None = Field(default=None, pattern=r'^\d{3}\.\d{3}\.\d{3}-\d{2}$')
+    telefone: str | None = Field(default=None, pattern=r'^\(\d{2}\) \d{5}-\d{4}$')
+    endereco: str | None = Field(default=None, min_length=5, max_length=200)
+    email: EmailStr | None = None
+    tipo: TipoUsuario | None = None
+    matricula: str | None = None
+    limite_emprestimos: int | None = None
+
 # Schema para resposta de usuário
 class UsuarioResponse(BaseModel):
     id: int
@@ -55,18 +79,61 @@ class UsuarioResponse(BaseModel):
     class Config:
         from_attributes = True
 
+CAMPOS_LISTA = campos_sem_texto(UsuarioResponse, ())
+
+# Schemas do resumo da conta
+class EmprestimoResumo(BaseModel):
+    id: int
+    livro_id: int
+    titulo: str
+    data_devolucao_prevista: datetime
+    atrasado: bool
+
+class ReservaResumo(BaseModel):
+    id: int
+    livro_id: int
+    titulo: str
+    data_limite: datetime
+    posicao_fila: int
+
+class ResumoUsuarioResponse(BaseModel):
+    usuario_id: int
+    emprestimos_ativos: List[EmprestimoResumo]
+    emprestimos_atrasados: int
+    reservas_pendentes: List[ReservaResumo]
+    multas_pendentes: int
+    total_multas_pendentes: Decimal
+    limite_emprestimos: int
+    emprestimos_restantes: int
+
+# Recibo da quitação das multas
+class MultaQuitada(BaseModel):
+    id: int
+    emprestimo_id: int
+    motivo: str
+    dias_atraso: int
+    valor_por_dia: Decimal
+    valor: Decimal
+
+class QuitacaoResponse(BaseModel):
+    usuario_id: int
+    data_pagamento: datetime | None
+    quantidade: int
+    total: Decimal
+    multas: List[MultaQuitada]
+
 @router.post("/", response_model=UsuarioResponse, status_code=status.HTTP_201_CREATED)
-def criar_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db)):
+def criar_usuario(usuario: UsuarioCreate, response: Response, db: Session = Depends(get_db)):
     try:
         # Verificar se CPF já existe
-        if db.query(Usuario).filter(Usuario.cpf == usuario.cpf).first():
+        if existe(db, Usuario.cpf, usuario.cpf):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="CPF já cadastrado"
             )
         
         # Verificar se email já existe
-        if db.query(Usuario).filter(Usuario.email == usuario.email).first():
+        if existe(db, Usuario.email, usuario.email):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email já cadastrado"
@@ -79,7 +146,7 @@ def criar_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db)):
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Matrícula é obrigatória para funcionários"
                 )
-            if db.query(Usuario).filter(Usuario.matricula == usuario.matricula).first():
+            if existe(db, Usuario.matricula, usuario.matricula):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Matrícula já cadastrada"
@@ -90,6 +157,7 @@ def criar_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db)):
         db.add(db_usuario)
         db.commit()
         db.refresh(db_usuario)
+        response.headers["ETag"] = etag(db_usuario)
         return db_usuario
     
     except Exception as e:
@@ -105,56 +173,178 @@ def listar_usuarios(
     limit: int = 100,
     tipo: TipoUsuario | None = None,
     ativo: bool | None = None,
+    fields: str | None = None,
+    count: bool = False,
+    approximate: bool = False,
     db: Session = Depends(get_db)
 ):
-    query = db.query(Usuario)
+    campos = campos_solicitados(UsuarioResponse, fields, CAMPOS_LISTA)
+    query = projetar(db.query(Usuario), Usuario, campos)
     
     if tipo:
         query = query.filter(Usuario.tipo == tipo)
     if ativo is not None:
         query = query.filter(Usuario.ativo == ativo)
     
-    return query.offset(skip).limit(limit).all()
+    resposta = resposta_projetada(query.offset(skip).limit(limit).all(), UsuarioResponse, campos)
+    if count or approximate:
+        anexar_total(db, resposta, Usuario, {"tipo": tipo, "ativo": ativo}, approximate)
+    return resposta
 
 @router.get("/{usuario_id}", response_model=UsuarioResponse)
-def buscar_usuario(usuario_id: int, db: Session = Depends(get_db)):
-    usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
+def buscar_usuario(usuario_id: int, response: Response, fields: str | None = None, db: Session = Depends(get_db)):
+    campos = campos_solicitados(UsuarioResponse, fields)
+    usuario = obter(db, Usuario, usuario_id, campos)
     if not usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuário não encontrado"
         )
-    return usuario
+    if campos is not None:
+        response = resposta_projetada(usuario, UsuarioResponse, campos)
+    response.headers["ETag"] = etag(usuario)
+    return response if campos is not None else usuario
+
+@router.get("/{usuario_id}/resumo", response_model=ResumoUsuarioResponse)
+def resumo_usuario(usuario_id: int, db: Session = Depends(get_db)):
+    resumo = cache_resumos.obter(usuario_id)
+    if resumo is None:
+        geracao = cache_resumos.geracao()
+        resumo = montar_resumo(db, usuario_id)
+        if resumo is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Usuário não encontrado"
+            )
+        cache_resumos.guardar(usuario_id, resumo, geracao)
+    return resumo
+
+def _recibo_gravado(db: Session, chave: str, usuario_id: int) -> dict | None:
+    quitacao = db.scalar(select(Quitacao).where(Quitacao.chave == chave))
+    if quitacao is None:
+        return None
+    if quitacao.usuario_id != usuario_id:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key já usada na quitação de outro usuário"
+        )
+    return quitacao.recibo
+
+@router.post("/{usuario_id}/multas/quitar", response_model=QuitacaoResponse)
+def quitar_multas(
+    usuario_id: int,
+    idempotency_key: str | None = Header(default=None, max_length=100),
+    db: Session = Depends(get_db)
+):
+    """Paga de uma vez todas as multas pendentes do usuário.
+
+    As multas são lidas com um join e presas com FOR UPDATE, então um
+    pagamento avulso simultâneo (PUT /multas/{id}/pagar) espera esta
+    transação e depois encontra a multa paga. O UPDATE único ainda exige
+    status pendente; se alguma linha escapou, nada é gravado (409).
+
+    Com o cabeçalho Idempotency-Key, o recibo é gravado junto com o
+    pagamento, e repetir a chamada com a mesma chave devolve o recibo
+    original. Sem ele, a repetição não cobra de novo, mas o recibo volta
+    vazio.
+    """
+    if not existe(db, Usuario.id, usuario_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuário não encontrado"
+        )
+    if idempotency_key is not None:
+        recibo = _recibo_gravado(db, idempotency_key, usuario_id)
+        if recibo is not None:
+            return recibo
+
+    multas = db.execute(
+        select(
+            Multa.id, Multa.emprestimo_id, Multa.motivo, Multa.dias_atraso, Multa.valor_por_dia, Multa.valor
+        )
+        .join(Emprestimo, Emprestimo.id == Multa.emprestimo_id)
+        .where(Emprestimo.usuario_id == usuario_id, Multa.status == StatusMulta.PENDENTE)
+        .order_by(Multa.id)
+        .with_for_update(of=Multa)
+    ).all()
+    agora = datetime.utcnow() if multas else None
+    recibo = {
+        "usuario_id": usuario_id,
+        "data_pagamento": agora,
+        "quantidade": len(multas),
+        "total": sum((multa.valor for multa in multas), Decimal("0.00")),
+        "multas": [multa._asdict() for multa in multas],
+    }
+    if not multas and idempotency_key is None:
+        db.rollback()
+        return recibo
+
+    ids = [multa.id for multa in multas]
+    try:
+        if multas:
+            resultado = db.execute(
+                update(Multa)
+                .where(Multa.id.in_(ids), Multa.status == StatusMulta.PENDENTE)
+                .values(status=StatusMulta.PAGO, data_pagamento=agora)
+            )
+            if resultado.rowcount != len(ids):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Multas alteradas por outra operação durante a quitação; tente novamente"
+                )
+            registrar_alteracoes(db, Multa.__tablename__, ids, TipoAlteracao.ATUALIZACAO)
+            for multa_id in ids:
+                registrar_auditoria(db, Multa.__tablename__, multa_id, TipoAlteracao.ATUALIZACAO, {
+                    "status": (StatusMulta.PENDENTE, StatusMulta.PAGO),
+                    "data_pagamento": (None, agora),
+                })
+            invalidar_resumo(db, [usuario_id])
+        if idempotency_key is not None:
+            # Mesmo um recibo vazio fica gravado: a chave responde sempre igual
+            db.add(Quitacao(
+                chave=idempotency_key, usuario_id=usuario_id,
+                recibo=jsonable_encoder(recibo, custom_encoder={Decimal: str})
+            ))
+        db.commit()
+    except HTTPException:
+        db.rollback()
+        raise
+    except IntegrityError:
+        # Outra requisição com a mesma chave confirmou primeiro: nada daqui é
+        # gravado e o recibo devolvido é o dela
+        db.rollback()
+        recibo = _recibo_gravado(db, idempotency_key, usuario_id)
+        if recibo is None:
+            raise
+
+    return recibo
 
 @router.put("/{usuario_id}", response_model=UsuarioResponse)
 def atualizar_usuario(
     usuario_id: int,
     usuario: UsuarioCreate,
+    response: Response,
+    if_match: str | None = Header(default=None),
     db: Session = Depends(get_db)
 ):
-    db_usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
+    db_usuario = obter(db, Usuario, usuario_id)
     if not db_usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuário não encontrado"
         )
+    verificar_if_match(if_match, db_usuario)
     
     try:
         # Verificar se CPF já existe (exceto para o próprio usuário)
-        if db.query(Usuario).filter(
-            Usuario.cpf == usuario.cpf,
-            Usuario.id != usuario_id
-        ).first():
+        if existe(db, Usuario.cpf, usuario.cpf, exceto_id=usuario_id):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="CPF já cadastrado"
             )
         
         # Verificar se email já existe (exceto para o próprio usuário)
-        if db.query(Usuario).filter(
-            Usuario.email == usuario.email,
-            Usuario.id != usuario_id
-        ).first():
+        if existe(db, Usuario.email, usuario.email, exceto_id=usuario_id):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email já cadastrado"
@@ -167,10 +357,7 @@ def atualizar_usuario(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Matrícula é obrigatória para funcionários"
                 )
-            if db.query(Usuario).filter(
-                Usuario.matricula == usuario.matricula,
-                Usuario.id != usuario_id
-            ).first():
+            if existe(db, Usuario.matricula, usuario.matricula, exceto_id=usuario_id):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Matrícula já cadastrada"
@@ -182,8 +369,12 @@ def atualizar_usuario(
         
         db.commit()
         db.refresh(db_usuario)
+        response.headers["ETag"] = etag(db_usuario)
         return db_usuario
     
+    except (HTTPException, StaleDataError):
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -191,14 +382,81 @@ def atualizar_usuario(
             detail=f"Erro ao atualizar usuário: {str(e)}"
         )
 
+@router.patch("/{usuario_id}", response_model=UsuarioResponse)
+def atualizar_usuario_parcial(
+    usuario_id: int,
+    usuario: UsuarioUpdate,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    db_usuario = obter(db, Usuario, usuario_id)
+    if not db_usuario:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuário não encontrado"
+        )
+    verificar_if_match(if_match, db_usuario)
+    
+    alteracoes = campos_alterados(Usuario, db_usuario, usuario.model_dump(exclude_unset=True))
+    if not alteracoes:
+        response.headers["ETag"] = etag(db_usuario)
+        return db_usuario
+    
+    # Unicidade verificada apenas para as chaves que mudaram
+    if "cpf" in alteracoes and existe(db, Usuario.cpf, alteracoes["cpf"]):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="CPF já cadastrado"
+        )
+    
+    if "email" in alteracoes and existe(db, Usuario.email, alteracoes["email"]):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email já cadastrado"
+        )
+    
+    tipo = alteracoes.get("tipo", db_usuario.tipo)
+    matricula = alteracoes.get("matricula", db_usuario.matricula)
+    if tipo == TipoUsuario.FUNCIONARIO and not matricula:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Matrícula é obrigatória para funcionários"
+        )
+    
+    if alteracoes.get("matricula") and existe(db, Usuario.matricula, alteracoes["matricula"]):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Matrícula já cadastrada"
+        )
+    
+    try:
+        aplicar_alteracoes(db, Usuario, db_usuario, alteracoes)
+        invalidar_resumo(db, [usuario_id])
+        resposta = UsuarioResponse.model_validate(db_usuario)
+        response.headers["ETag"] = etag(db_usuario)
+        db.commit()
+        return resposta
+    
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao atualizar usuário: {str(e)}"
+        )
+
 @router.delete("/{usuario_id}", status_code=status.HTTP_204_NO_CONTENT)
-def deletar_usuario(usuario_id: int, db: Session = Depends(get_db)):
-    db_usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
+def deletar_usuario(usuario_id: int, if_match: str | None = Header(default=None), db: Session = Depends(get_db)):
+    db_usuario = obter(db, Usuario, usuario_id)
     if not db_usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuário não encontrado"
         )
+    verificar_if_match(if_match, db_usuario)
     
     try:
         # Verificar se usuário tem empréstimos ativos
@@ -218,6 +476,9 @@ def deletar_usuario(usuario_id: int, db: Session = Depends(get_db)):
         db.delete(db_usuario)
         db.commit()
     
+    except StaleDataError:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -229,14 +490,17 @@ def deletar_usuario(usuario_id: int, db: Session = Depends(get_db)):
 def alterar_status_usuario(
     usuario_id: int,
     ativo: bool,
+    response: Response,
+    if_match: str | None = Header(default=None),
     db: Session = Depends(get_db)
 ):
-    db_usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
+    db_usuario = obter(db, Usuario, usuario_id)
     if not db_usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuário não encontrado"
         )
+    verificar_if_match(if_match, db_usuario)
     
     try:
         # Verificar se usuário tem empréstimos ativos ao desativar
@@ -249,8 +513,12 @@ def alterar_status_usuario(
         db_usuario.ativo = ativo
         db.commit()
         db.refresh(db_usuario)
+        response.headers["ETag"] = etag(db_usuario)
         return db_usuario
     
+    except StaleDataError:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
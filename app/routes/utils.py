@@ -0,0 +1,115 @@
+from fastapi import HTTPException, Response, status
+from sqlalchemy import update
+from sqlalchemy.orm import Session, load_only
+from datetime import datetime
+from functools import lru_cache
+from typing import List
+from pydantic import ConfigDict, TypeAdapter, create_model
+
+from app.models import TipoAlteracao
+from app.services.alteracoes import registrar_alteracoes
+from app.services.auditoria import registrar_auditoria
+from app.services.repositorio import colunas_projetadas
+from app.services.contagens import cache_contagens
+
+def campos_alterados(model, db_obj, dados: dict) -> dict:
+    # Mantém apenas os campos enviados cujo valor realmente mudou
+    alteracoes = {}
+    for campo, valor in dados.items():
+        if valor is None and not model.__table__.c[campo].nullable:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"O campo {campo} não pode ser nulo"
+            )
+        if getattr(db_obj, campo) != valor:
+            alteracoes[campo] = valor
+    return alteracoes
+
+def aplicar_alteracoes(db: Session, model, db_obj, alteracoes: dict, expressoes: dict | None = None) -> None:
+    # Um único UPDATE só com as colunas alteradas; a sessão sincroniza o objeto
+    # carregado, então a resposta pode ser montada sem um novo SELECT.
+    # expressoes são colunas calculadas pelo banco (coluna + delta), fora da auditoria
+    registrar_auditoria(db, model.__tablename__, db_obj.id, TipoAlteracao.ATUALIZACAO, {
+        campo: (getattr(db_obj, campo), valor) for campo, valor in alteracoes.items()
+    })
+    alteracoes = {**alteracoes, **(expressoes or {})}
+    alteracoes["data_atualizacao"] = datetime.utcnow()
+    filtros = [model.id == db_obj.id]
+    if hasattr(model, "versao"):
+        # O UPDATE em massa não passa pelo version_id_col: a conferência é feita aqui
+        filtros.append(model.versao == db_obj.versao)
+        alteracoes["versao"] = db_obj.versao + 1
+    resultado = db.execute(update(model).where(*filtros).values(**alteracoes))
+    if resultado.rowcount == 0:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="O registro foi alterado por outra requisição"
+        )
+    registrar_alteracoes(db, model.__tablename__, [db_obj.id], TipoAlteracao.ATUALIZACAO)
+
+def etag(db_obj) -> str:
+    return f'"{db_obj.versao}"'
+
+def verificar_if_match(if_match: str | None, db_obj) -> None:
+    # Sem If-Match a escrita segue; o version_id_col ainda barra a corrida entre leitura e escrita
+    if if_match is None:
+        return
+    tags = [tag.strip().removeprefix("W/") for tag in if_match.split(",")]
+    if "*" not in tags and etag(db_obj) not in tags:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="O registro foi alterado por outra requisição"
+        )
+
+def campos_solicitados(schema, fields: str | None, padrao: list[str] | None = None) -> list[str] | None:
+    # Interpreta fields=titulo,autor validando contra o schema de resposta
+    if not fields:
+        return padrao
+    campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in schema.model_fields]
+    if invalidos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos inválidos: {', '.join(invalidos)}"
+        )
+    if "id" not in campos:
+        campos.insert(0, "id")
+    return campos
+
+def campos_sem_texto(schema, colunas_texto: tuple[str, ...]) -> list[str]:
+    # Padrão das listagens: todas as colunas menos as Text, que ficam adiadas
+    return [campo for campo in schema.model_fields if campo not in colunas_texto]
+
+def projetar(query, model, campos: list[str] | None):
+    # Só as colunas pedidas entram no SELECT
+    if campos is None:
+        return query
+    return query.options(load_only(*colunas_projetadas(model, campos)))
+
+@lru_cache(maxsize=256)
+def _adaptador_parcial(schema, campos: tuple[str, ...]) -> TypeAdapter:
+    parcial = create_model(
+        f"{schema.__name__}Parcial",
+        __config__=ConfigDict(from_attributes=True),
+        **{campo: (schema.model_fields[campo].annotation, ...) for campo in campos}
+    )
+    return TypeAdapter(List[parcial])
+
+def anexar_total(
+    db: Session, resposta: Response, model, filtros: dict, aproximado: bool, condicoes: list | None = None
+) -> Response:
+    # X-Total-Count para paginadores; X-Total-Count-Exact diz se o total pode estar defasado
+    total, exato = cache_contagens.contar(db, model, filtros, aproximado, condicoes)
+    resposta.headers["X-Total-Count"] = str(total)
+    resposta.headers["X-Total-Count-Exact"] = "true" if exato else "false"
+    return resposta
+
+def resposta_projetada(dados, schema, campos: list[str]) -> Response:
+    # Serializa com um schema reduzido derivado do original, mantendo os mesmos tipos
+    adaptador = _adaptador_parcial(schema, tuple(campos))
+    unico = not isinstance(dados, list)
+    itens = adaptador.validate_python([dados] if unico else dados, from_attributes=True)
+    corpo = adaptador.dump_json(itens)
+    if unico:
+        corpo = corpo[1:-1]
+    return Response(content=corpo, media_type="application/json")
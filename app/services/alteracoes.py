@@ -0,0 +1,102 @@
+from datetime import datetime
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from app.models import (
+    Livro, Usuario, Categoria, Emprestimo, Reserva, Multa, Alteracao, TipoAlteracao, MarcaProcessamento
+)
+from app.services.contagens import registrar_contagem, delta_da_operacao
+
+MODELOS_RASTREADOS = (Livro, Usuario, Categoria, Emprestimo, Reserva, Multa)
+
+# Linha de marcas_processamento que serializa a gravação do log no commit
+NOME_MARCA = "alteracoes"
+
+def _pendentes(session: Session) -> list[dict]:
+    return session.info.setdefault("alteracoes_pendentes", [])
+
+def registrar_alteracoes(db: Session, tabela: str, ids, operacao: TipoAlteracao) -> None:
+    # Para escritas feitas com UPDATE/DELETE em massa, que não passam pelo flush
+    linhas = [{"tabela": tabela, "registro_id": registro_id, "operacao": operacao} for registro_id in ids]
+    if linhas:
+        _pendentes(db).extend(linhas)
+        registrar_contagem(db, tabela, delta_da_operacao(operacao, len(linhas)))
+
+@event.listens_for(SessionLocal, "after_flush")
+def _registrar_flush(session: Session, flush_context) -> None:
+    linhas = []
+    for obj in session.new:
+        if isinstance(obj, MODELOS_RASTREADOS):
+            linhas.append((obj, TipoAlteracao.INSERCAO))
+    for obj in session.dirty:
+        if isinstance(obj, MODELOS_RASTREADOS) and session.is_modified(obj, include_collections=False):
+            linhas.append((obj, TipoAlteracao.ATUALIZACAO))
+    for obj in session.deleted:
+        if isinstance(obj, MODELOS_RASTREADOS):
+            linhas.append((obj, TipoAlteracao.EXCLUSAO))
+    _pendentes(session).extend(
+        {"tabela": obj.__tablename__, "registro_id": obj.id, "operacao": operacao}
+        for obj, operacao in linhas
+    )
+
+@event.listens_for(SessionLocal, "before_commit")
+def _gravar_no_commit(session: Session) -> None:
+    """Grava o log no fim da transação, na ordem dos commits.
+
+    O id é o cursor do feed: se fosse gerado no flush, uma transação longa
+    confirmaria ids menores que outros já entregues, e quem lê por cursor os
+    perderia. Aqui, o UPDATE na linha de marcas_processamento prende essa
+    linha até o commit: as transações com alterações gravam o log uma de
+    cada vez, logo antes de confirmar, e os ids ficam na ordem dos commits.
+    A gravação ainda é na mesma transação da escrita: se ela for desfeita,
+    o log também é.
+    """
+    # O commit só faz o último flush depois deste evento
+    session.flush()
+    linhas = session.info.pop("alteracoes_pendentes", None)
+    if not linhas:
+        return
+    agora = datetime.utcnow()
+    conexao = session.connection()
+    resultado = conexao.execute(
+        update(MarcaProcessamento).where(MarcaProcessamento.nome == NOME_MARCA).values(marca=agora)
+    )
+    if resultado.rowcount == 0:
+        conexao.execute(insert(MarcaProcessamento).values(nome=NOME_MARCA, marca=agora))
+    conexao.execute(insert(Alteracao.__table__), [{**linha, "data_alteracao": agora} for linha in linhas])
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_pendentes(session: Session) -> None:
+    session.info.pop("alteracoes_pendentes", None)
+
+def ultima_alteracao(db: Session) -> int:
+    """Id da alteração mais recente já confirmada (0 com o log vazio).
+
+    Lido na mesma transação que uma carga completa, marca exatamente o que a
+    carga viu: as alterações de id maior são as que ela não viu.
+    """
+    return db.scalar(select(Alteracao.id).order_by(Alteracao.id.desc()).limit(1)) or 0
+
+def alteracoes_desde(db: Session, cursor: int, tabelas: tuple[str, ...], limite: int = 5000) -> list:
+    """(id, tabela, registro_id, operacao) das alterações depois do cursor nas tabelas dadas.
+
+    É como os índices em memória de cada processo acompanham as escritas de
+    todos os workers e jobs, e não só as do próprio processo.
+    """
+    return db.execute(
+        select(Alteracao.id, Alteracao.tabela, Alteracao.registro_id, Alteracao.operacao)
+        .where(Alteracao.id > cursor, Alteracao.tabela.in_(tabelas))
+        .order_by(Alteracao.id)
+        .limit(limite)
+    ).all()
+
+def listar_alteracoes(db: Session, cursor: int, limite: int) -> list[Alteracao]:
+    # Os ids saem na ordem dos commits: nenhuma entrada nova aparece atrás do cursor
+    return db.scalars(
+        select(Alteracao)
+        .where(Alteracao.id > cursor)
+        .order_by(Alteracao.id)
+        .limit(limite)
+    ).all()
@@ -0,0 +1,291 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import Column, MetaData, Table, select, insert, delete, func, exists
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from app.models import (
+    Emprestimo, StatusEmprestimo, Multa, StatusMulta,
+    EmprestimoArquivo, MultaArquivo, TipoAlteracao
+)
+from app.services import particoes
+from app.services.alteracoes import registrar_alteracoes
+import settings
+
+COLUNAS_EMPRESTIMO = [
+    'id', 'usuario_id', 'livro_id', 'funcionario_id', 'data_emprestimo',
+    'data_devolucao_prevista', 'data_devolucao_real', 'status',
+    'observacoes', 'dias_emprestimo'
+]
+
+COLUNAS_MULTA = [
+    'id', 'emprestimo_id', 'valor', 'data_geracao', 'data_pagamento',
+    'status', 'motivo', 'dias_atraso', 'valor_por_dia'
+]
+
+def _abaixo_do_maior_id(tabela: Table, quente: Table):
+    # O arquivo guarda o id original. A linha de maior id nunca sai da tabela quente:
+    # o autoincremento do SQLite, e o do MySQL antes do 8.0 depois de reiniciar,
+    # recomeça em MAX(id) + 1 e reutilizaria ids que já estão no arquivo
+    maior = quente.alias("maior")
+    return tabela.c.id < select(func.max(maior.c.id)).scalar_subquery()
+
+def _filtro_multas(corte: datetime, tabela: Table = Multa.__table__):
+    # Usa o índice idx_multa_status (status, data_geracao)
+    return (
+        tabela.c.status.in_([StatusMulta.PAGO, StatusMulta.CANCELADA]),
+        tabela.c.data_geracao < corte,
+        _abaixo_do_maior_id(tabela, Multa.__table__),
+    )
+
+def _filtro_emprestimos(corte: datetime, tabela: Table = Emprestimo.__table__):
+    # Empréstimos com multas ainda na tabela quente ficam para a próxima execução
+    return (
+        tabela.c.status == StatusEmprestimo.DEVOLVIDO,
+        tabela.c.data_devolucao_prevista < corte,
+        tabela.c.data_devolucao_real < corte,
+        ~exists().where(Multa.emprestimo_id == tabela.c.id),
+        _abaixo_do_maior_id(tabela, Emprestimo.__table__),
+    )
+
+def _mover_lote(db: Session, origem, destino, colunas, filtros, tamanho_lote: int) -> int:
+    ids = db.scalars(
+        select(origem.id).where(*filtros).order_by(origem.id).limit(tamanho_lote)
+    ).all()
+    if not ids:
+        return 0
+
+    db.execute(
+        insert(destino).from_select(
+            colunas,
+            select(*[getattr(origem, c) for c in colunas]).where(origem.id.in_(ids))
+        )
+    )
+    db.execute(delete(origem).where(origem.id.in_(ids)))
+    # Para o feed e os índices em memória, a linha arquivada saiu da tabela quente
+    registrar_alteracoes(db, origem.__tablename__, ids, TipoAlteracao.ARQUIVAMENTO)
+    # Cada lote é confirmado separadamente para não segurar locks por muito tempo
+    db.commit()
+    return len(ids)
+
+def _mover_tudo(
+    db: Session, origem, destino, colunas, filtros, tamanho_lote: int, max_lotes: int | None,
+    progresso: Callable | None = None, movidas_antes: int = 0
+) -> int:
+    total = 0
+    lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        movidas = _mover_lote(db, origem, destino, colunas, filtros, tamanho_lote)
+        total += movidas
+        lotes += 1
+        if progresso is not None:
+            # Chamado entre lotes já confirmados: um job cancelado aqui pode ser repetido
+            progresso(movidas_antes + total, mensagem=f"{origem.__tablename__}: {total} linhas")
+        if movidas < tamanho_lote:
+            break
+    return total
+
+def _contar(db: Session, tabela: Table, faixa: list, filtros) -> tuple[int, bool]:
+    # (linhas na faixa, se todas são arquiváveis); a faixa da partição limita a leitura a ela
+    total = db.scalar(select(func.count()).select_from(tabela).where(*faixa))
+    elegiveis = db.scalar(select(func.count()).select_from(tabela).where(*faixa, *filtros))
+    return total, total == elegiveis
+
+def _tabela_troca(tabela: Table, nome: str) -> Table:
+    return Table(nome, MetaData(), *[Column(coluna.name, coluna.type) for coluna in tabela.columns])
+
+def _copiar_particao(db: Session, tabela: Table, destino, colunas, faixa: list, filtros, tamanho_lote: int) -> None:
+    # Em lotes por id, com a mesma conferência de elegibilidade; as linhas continuam na tabela quente
+    ultimo = 0
+    while True:
+        ids = db.scalars(
+            select(tabela.c.id)
+            .where(*faixa, *filtros, tabela.c.id > ultimo)
+            .order_by(tabela.c.id)
+            .limit(tamanho_lote)
+        ).all()
+        if not ids:
+            return
+        db.execute(
+            insert(destino).from_select(
+                colunas,
+                select(*[tabela.c[c] for c in colunas])
+                .where(tabela.c.id.in_(ids), ~exists().where(destino.id == tabela.c.id))
+            )
+        )
+        db.commit()
+        ultimo = ids[-1]
+
+def _concluir_particao(
+    db: Session, tabela: Table, destino, colunas, filtro, corte: datetime, particao: str, tamanho_lote: int
+) -> int:
+    """Confere a partição já destacada contra o arquivo e a remove.
+
+    Devolve as linhas arquivadas, ou 0 quando a partição voltou para a
+    tabela quente porque alguma linha deixou de ser arquivável.
+    """
+    troca = _tabela_troca(tabela, particoes.nome_troca(tabela.name, particao))
+    total, todas = _contar(db, troca, [], filtro(corte, troca))
+    if not todas:
+        # Alguma linha mudou entre a cópia e a troca: tira as cópias e a partição volta inteira
+        db.execute(delete(destino).where(destino.id.in_(select(troca.c.id))))
+        db.commit()
+        particoes.reanexar(db.connection(), tabela.name, particao)
+        return 0
+    # Linhas gravadas ou alteradas depois da cópia: o arquivo fica igual à partição
+    # (lidos antes: o MySQL não aceita no DELETE uma subconsulta sobre a própria tabela)
+    diferentes = db.scalars(select(troca.c.id).where(~exists().where(
+        destino.id == troca.c.id,
+        *[getattr(destino, c).is_not_distinct_from(troca.c[c]) for c in colunas]
+    ))).all()
+    if diferentes:
+        db.execute(delete(destino).where(destino.id.in_(diferentes)))
+    db.execute(
+        insert(destino).from_select(
+            colunas,
+            select(*[troca.c[c] for c in colunas]).where(~exists().where(destino.id == troca.c.id))
+        )
+    )
+    db.commit()
+    # Arquivamentos no log antes do DROP, em lotes; repetir após uma interrupção só duplica entradas
+    ultimo = 0
+    while True:
+        ids = db.scalars(
+            select(troca.c.id).where(troca.c.id > ultimo).order_by(troca.c.id).limit(tamanho_lote)
+        ).all()
+        if not ids:
+            break
+        registrar_alteracoes(db, tabela.name, ids, TipoAlteracao.ARQUIVAMENTO)
+        db.commit()
+        ultimo = ids[-1]
+    particoes.descartar(db.connection(), tabela.name, particao)
+    return total
+
+def _arquivar_particoes(
+    db: Session, origem, destino, colunas, filtro, corte: datetime, tamanho_lote: int,
+    max_lotes: int | None, progresso: Callable | None = None, movidas_antes: int = 0
+) -> tuple[int, int]:
+    """Arquiva meses inteiros removendo a partição, sem DELETE.
+
+    Vale para as partições que terminam antes do corte e só têm linhas
+    arquiváveis; as demais ficam para os lotes de _mover_tudo. As linhas são
+    copiadas para o arquivo enquanto continuam na tabela quente; só depois a
+    partição é trocada por uma tabela vazia (particoes.destacar), conferida
+    de novo contra o arquivo e removida. Em nenhum momento uma linha deixa de
+    estar na tabela quente ou no arquivo. Cada partição conta como um lote
+    de max_lotes. Uma execução interrompida deixa a tabela de troca, retomada
+    na próxima. Devolve (linhas, partições); (0, 0) fora do MySQL particionado.
+    """
+    tabela = origem.__table__
+    if not particoes.particionada(db.connection(), tabela.name):
+        return 0, 0
+    coluna = tabela.c[particoes.TABELAS[tabela.name]]
+
+    linhas = 0
+    arquivadas = 0
+
+    def concluir(particao: str) -> None:
+        nonlocal linhas, arquivadas
+        movidas = _concluir_particao(db, tabela, destino, colunas, filtro, corte, particao, tamanho_lote)
+        if movidas:
+            linhas += movidas
+            arquivadas += 1
+            if progresso is not None:
+                progresso(movidas_antes + linhas, mensagem=f"{tabela.name}: partição {particao} arquivada")
+
+    # Trocas deixadas por uma execução interrompida: a cópia já foi feita antes da troca
+    destacadas = [particao for _, particao in particoes.tabelas_de_troca(db.connection(), tabela.name)]
+    for particao in destacadas:
+        concluir(particao)
+
+    for particao in particoes.listar(db.connection(), tabela.name):
+        if max_lotes is not None and arquivadas >= max_lotes:
+            break
+        if particao.limite is None or datetime.combine(particao.limite, datetime.min.time()) > corte:
+            continue
+        if particao.nome in destacadas:
+            continue
+        faixa = [coluna < particao.limite]
+        if particao.inicio is not None:
+            faixa.append(coluna >= particao.inicio)
+        filtros = filtro(corte, tabela)
+        total, todas = _contar(db, tabela, faixa, filtros)
+        if total == 0:
+            particoes.descartar(db.connection(), tabela.name, particao.nome)
+        elif todas:
+            _copiar_particao(db, tabela, destino, colunas, faixa, filtros, tamanho_lote)
+            particoes.destacar(db.connection(), tabela.name, particao.nome)
+            concluir(particao.nome)
+    return linhas, arquivadas
+
+def _atraso(db: Session, coluna, filtros, corte: datetime) -> float:
+    # Atraso = idade, além do corte, da linha elegível mais antiga que ainda não foi arquivada
+    mais_antiga = db.scalar(select(func.min(coluna)).where(*filtros))
+    if mais_antiga is None:
+        return 0.0
+    return (corte - mais_antiga).total_seconds()
+
+def _lotes_restantes(max_lotes: int | None, usados: int) -> int | None:
+    # As partições arquivadas contam no mesmo limite dos lotes
+    return None if max_lotes is None else max(0, max_lotes - usados)
+
+def arquivar(
+    db: Session,
+    idade_dias: int = settings.ARQUIVAMENTO_IDADE_DIAS,
+    tamanho_lote: int = settings.ARQUIVAMENTO_TAMANHO_LOTE,
+    max_lotes: int | None = None,
+    progresso: Callable | None = None
+) -> dict:
+    corte = datetime.utcnow() - timedelta(days=idade_dias)
+    inicio = time.perf_counter()
+
+    # Multas primeiro: a FK de multas impede mover o empréstimo antes delas.
+    # No MySQL particionado, meses inteiros saem primeiro sem DELETE
+    multas, particoes_multas = _arquivar_particoes(
+        db, Multa, MultaArquivo, COLUNAS_MULTA, _filtro_multas, corte, tamanho_lote, max_lotes, progresso
+    )
+    multas += _mover_tudo(
+        db, Multa, MultaArquivo, COLUNAS_MULTA, _filtro_multas(corte), tamanho_lote,
+        _lotes_restantes(max_lotes, particoes_multas), progresso, multas
+    )
+    emprestimos, particoes_emprestimos = _arquivar_particoes(
+        db, Emprestimo, EmprestimoArquivo, COLUNAS_EMPRESTIMO, _filtro_emprestimos, corte,
+        tamanho_lote, max_lotes, progresso, multas
+    )
+    emprestimos += _mover_tudo(
+        db, Emprestimo, EmprestimoArquivo, COLUNAS_EMPRESTIMO, _filtro_emprestimos(corte), tamanho_lote,
+        _lotes_restantes(max_lotes, particoes_emprestimos), progresso, multas + emprestimos
+    )
+
+    duracao = time.perf_counter() - inicio
+    return {
+        "corte": corte,
+        "multas_arquivadas": multas,
+        "emprestimos_arquivados": emprestimos,
+        "particoes_arquivadas": particoes_multas + particoes_emprestimos,
+        "duracao_segundos": duracao,
+        "linhas_por_segundo": (multas + emprestimos) / duracao if duracao > 0 else 0.0,
+        "atraso_multas_segundos": _atraso(db, Multa.data_geracao, _filtro_multas(corte), corte),
+        "atraso_emprestimos_segundos": _atraso(
+            db, Emprestimo.data_devolucao_real, _filtro_emprestimos(corte), corte
+        ),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arquiva empréstimos devolvidos e multas quitadas")
+    parser.add_argument("--idade-dias", type=int, default=settings.ARQUIVAMENTO_IDADE_DIAS)
+    parser.add_argument("--tamanho-lote", type=int, default=settings.ARQUIVAMENTO_TAMANHO_LOTE)
+    parser.add_argument("--max-lotes", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        relatorio = arquivar(db, args.idade_dias, args.tamanho_lote, args.max_lotes)
+    finally:
+        db.close()
+
+    for chave, valor in relatorio.items():
+        print(f"{chave}: {valor}")
@@ -0,0 +1,352 @@
+import enum
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextvars import ContextVar
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from app.models import Usuario, Emprestimo, Multa, Auditoria, TipoAlteracao
+import settings
+
+logger = logging.getLogger(__name__)
+
+MODELOS_AUDITADOS = (Usuario, Emprestimo, Multa)
+TABELAS_AUDITADAS = {modelo.__tablename__ for modelo in MODELOS_AUDITADOS}
+# Mudam em toda escrita e não dizem nada sobre ela
+CAMPOS_IGNORADOS = {"data_atualizacao"}
+
+# Quem fez a requisição (cabeçalho X-Operador), preenchido por um middleware em main.py
+autor_atual: ContextVar[str | None] = ContextVar("autor_atual", default=None)
+
+_FIM = object()
+
+def _valor(valor):
+    # Só tipos que o JSON aceita
+    if isinstance(valor, enum.Enum):
+        return valor.value
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+def _serializar(registro: dict) -> str:
+    return json.dumps({campo: _valor(valor) for campo, valor in registro.items()}, ensure_ascii=False)
+
+def _desserializar(linha: str) -> dict:
+    registro = json.loads(linha)
+    registro["operacao"] = TipoAlteracao(registro["operacao"])
+    registro["data_alteracao"] = datetime.fromisoformat(registro["data_alteracao"])
+    return registro
+
+def _processo_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class GravadorAuditoria:
+    """Grava a auditoria fora do caminho da requisição (write-behind).
+
+    Os registros de uma transação entram numa fila limitada após o commit e
+    uma thread os grava em INSERTs de várias linhas, quando o lote enche ou o
+    intervalo vence. Com a fila cheia, quem faz o commit espera até
+    AUDITORIA_ESPERA_SEGUNDOS e, se ainda não houver espaço, grava o próprio
+    lote: a requisição fica mais lenta, mas não perde registros.
+    No encerramento, a fila é esvaziada antes de a thread terminar.
+
+    Quando o banco recusa um lote que não pode mais esperar (gravado pela
+    requisição, ou no encerramento), ele vai para um arquivo do próprio
+    processo ao lado de AUDITORIA_ARQUIVO_PENDENTE (auditoria_pendente.<pid>.jsonl),
+    uma linha JSON por registro, e a thread o regrava quando o banco volta.
+    Nenhum processo escreve no arquivo de outro; os de processos que
+    terminaram são adotados por rename, então o diretório precisa ser local
+    à máquina. A entrega é pelo menos uma vez: se o processo cair entre o
+    INSERT e a remoção do arquivo, o lote pode ser gravado duas vezes. Só se
+    perde o que nem o arquivo aceita (disco cheio, por exemplo), e o log de
+    erros traz esses registros por inteiro.
+    """
+
+    def __init__(
+        self, tamanho_fila: int, tamanho_lote: int, intervalo: float, espera: float,
+        arquivo_pendente: str = settings.AUDITORIA_ARQUIVO_PENDENTE
+    ):
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.espera = espera
+        self.arquivo_pendente = arquivo_pendente
+        # Requisições e a thread escrevem no mesmo arquivo do processo
+        self._lock_arquivo = threading.Lock()
+        self._fila: queue.Queue = queue.Queue(maxsize=tamanho_fila)
+        self._session_factory = SessionLocal
+        self._thread: threading.Thread | None = None
+        self.gravados = 0
+        self.gravados_na_requisicao = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self._thread is not None
+
+    def iniciar(self, session_factory=SessionLocal) -> None:
+        if self._thread is not None:
+            return
+        self._session_factory = session_factory
+        self._thread = threading.Thread(target=self._executar, name="auditoria", daemon=True)
+        self._thread.start()
+
+    def encerrar(self, tempo_limite: float = settings.AUDITORIA_ENCERRAMENTO_SEGUNDOS) -> None:
+        if self._thread is None:
+            return
+        # O marcador entra atrás de tudo que já está na fila
+        self._fila.put(_FIM)
+        self._thread.join(tempo_limite)
+        if self._thread.is_alive():
+            # A thread está presa no banco: o que ainda está na fila vai para o arquivo
+            restantes = []
+            while True:
+                try:
+                    registro = self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if registro is not _FIM:
+                    restantes.append(registro)
+            logger.error("Auditoria: %d registros não gravados no encerramento", len(restantes))
+            self._guardar_pendentes(restantes)
+        self._thread = None
+
+    def apos_fork(self) -> None:
+        # No processo filho a thread não existe: grava na hora, como fora da API
+        self._fila = queue.Queue(maxsize=self._fila.maxsize)
+        self._lock_arquivo = threading.Lock()
+        self._thread = None
+
+    def enfileirar(self, registros: list[dict]) -> None:
+        if self._thread is None:
+            # Fora da API (comandos, scripts) não há thread: grava na hora
+            self._gravar_na_requisicao(registros)
+            return
+        for posicao, registro in enumerate(registros):
+            try:
+                self._fila.put(registro, timeout=self.espera)
+            except queue.Full:
+                self._gravar_na_requisicao(registros[posicao:])
+                return
+
+    def _gravar_na_requisicao(self, registros: list[dict]) -> None:
+        try:
+            self._gravar(registros)
+            self.gravados_na_requisicao += len(registros)
+        except Exception:
+            # A escrita principal já foi confirmada: não há como desfazê-la aqui
+            logger.exception("Auditoria: falha ao gravar %d registros", len(registros))
+            self._guardar_pendentes(registros)
+
+    def _arquivo(self, pid: int, sufixo: str = "") -> str:
+        raiz, extensao = os.path.splitext(self.arquivo_pendente)
+        return f"{raiz}.{pid}{sufixo}{extensao}"
+
+    def _guardar_pendentes(self, registros: list[dict]) -> None:
+        if not registros:
+            return
+        try:
+            # Cada processo só escreve no próprio arquivo: o lock entre threads basta
+            with self._lock_arquivo, open(self._arquivo(os.getpid()), "a", encoding="utf-8") as arquivo:
+                arquivo.write("".join(_serializar(registro) + "\n" for registro in registros))
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+        except Exception:
+            logger.exception("Auditoria: registros perdidos: %r", registros)
+
+    def _arquivos_pendentes(self) -> list[tuple[int, str, str]]:
+        """(pid, sufixo, caminho) dos arquivos de pendentes de todos os processos."""
+        raiz, extensao = os.path.splitext(os.path.abspath(self.arquivo_pendente))
+        diretorio, nome = os.path.split(raiz)
+        padrao = re.compile(rf"{re.escape(nome)}\.(\d+)((?:\.[a-z0-9]+)*){re.escape(extensao)}")
+        arquivos = []
+        for outro in os.listdir(diretorio):
+            encontrado = padrao.fullmatch(outro)
+            if encontrado is not None:
+                arquivos.append((int(encontrado.group(1)), encontrado.group(2), os.path.join(diretorio, outro)))
+        return arquivos
+
+    def _regravar_pendentes(self) -> None:
+        """Regrava no banco os registros guardados por este processo e pelos que terminaram."""
+        eu = os.getpid()
+        for pid, sufixo, caminho in self._arquivos_pendentes():
+            if pid == eu and not sufixo:
+                # O arquivo em que este processo escreve é renomeado sob o lock:
+                # o que for guardado depois vai para um arquivo novo
+                regravando = self._arquivo(eu, ".regravando")
+                with self._lock_arquivo:
+                    if os.path.exists(regravando):
+                        # A regravação anterior ainda não terminou; ela vem neste mesmo laço
+                        continue
+                    os.replace(caminho, regravando)
+                caminho = regravando
+            elif pid != eu:
+                if _processo_vivo(pid):
+                    continue
+                # O rename é atômico: de dois processos que tentem adotar o mesmo
+                # arquivo, só um consegue
+                adotado = self._arquivo(eu, f".de{pid}{sufixo}")
+                try:
+                    os.replace(caminho, adotado)
+                except FileNotFoundError:
+                    continue
+                caminho = adotado
+            self._regravar_arquivo(caminho)
+
+    def _regravar_arquivo(self, caminho: str) -> None:
+        with open(caminho, encoding="utf-8") as arquivo:
+            registros = [_desserializar(linha) for linha in arquivo if linha.strip()]
+        gravados = 0
+        try:
+            while gravados < len(registros):
+                lote = registros[gravados:gravados + self.tamanho_lote]
+                self._gravar(lote)
+                gravados += len(lote)
+        except Exception:
+            logger.exception("Auditoria: banco ainda recusa os registros pendentes")
+            if gravados:
+                # Fica no arquivo só o que falta, para a próxima tentativa
+                temporario = f"{caminho}.tmp"
+                with open(temporario, "w", encoding="utf-8") as arquivo:
+                    arquivo.write("".join(_serializar(registro) + "\n" for registro in registros[gravados:]))
+                    arquivo.flush()
+                    os.fsync(arquivo.fileno())
+                os.replace(temporario, caminho)
+            return
+        os.remove(caminho)
+
+    def _gravar(self, registros: list[dict]) -> None:
+        db = self._session_factory()
+        try:
+            # Um único INSERT com várias linhas
+            db.execute(insert(Auditoria).values(registros))
+            db.commit()
+        finally:
+            db.close()
+        self.gravados += len(registros)
+
+    def _descarregar(self, lote: list[dict], encerrando: bool) -> None:
+        while True:
+            try:
+                self._gravar(lote)
+                return
+            except Exception:
+                logger.exception("Auditoria: falha ao gravar lote de %d registros", len(lote))
+                if encerrando:
+                    self._guardar_pendentes(lote)
+                    return
+            # Sem consumir a fila enquanto o banco falha: ela enche e as
+            # requisições passam a gravar por conta própria
+            time.sleep(self.intervalo)
+
+    def _executar(self) -> None:
+        lote: list[dict] = []
+        prazo = time.monotonic() + self.intervalo
+        encerrando = False
+        while not encerrando:
+            try:
+                registro = self._fila.get(timeout=max(0.0, prazo - time.monotonic()))
+                if registro is _FIM:
+                    encerrando = True
+                else:
+                    lote.append(registro)
+            except queue.Empty:
+                pass
+            vencido = time.monotonic() >= prazo
+            if lote and (encerrando or vencido or len(lote) >= self.tamanho_lote):
+                self._descarregar(lote, encerrando)
+                lote = []
+                vencido = True
+            if vencido:
+                try:
+                    self._regravar_pendentes()
+                except Exception:
+                    logger.exception("Auditoria: falha ao ler os registros pendentes")
+                prazo = time.monotonic() + self.intervalo
+
+gravador_auditoria = GravadorAuditoria(
+    settings.AUDITORIA_TAMANHO_FILA,
+    settings.AUDITORIA_TAMANHO_LOTE,
+    settings.AUDITORIA_INTERVALO_SEGUNDOS,
+    settings.AUDITORIA_ESPERA_SEGUNDOS,
+)
+
+def registrar_auditoria(
+    session: Session, tabela: str, registro_id: int, operacao: TipoAlteracao, alteracoes: dict | None
+) -> None:
+    # Para escritas em massa, que não passam pelo flush; gravado após o commit
+    if tabela not in TABELAS_AUDITADAS:
+        return
+    if alteracoes is not None:
+        alteracoes = {
+            campo: [_valor(antes), _valor(depois)]
+            for campo, (antes, depois) in alteracoes.items()
+            if campo not in CAMPOS_IGNORADOS
+        }
+    session.info.setdefault("auditoria_pendente", []).append({
+        "tabela": tabela,
+        "registro_id": registro_id,
+        "operacao": operacao,
+        "autor": autor_atual.get(),
+        "alteracoes": alteracoes,
+        "data_alteracao": datetime.utcnow(),
+    })
+
+def _diferencas(obj, operacao: TipoAlteracao) -> dict:
+    estado = inspect(obj)
+    alteracoes = {}
+    for atributo in estado.mapper.column_attrs:
+        campo = atributo.key
+        if campo in CAMPOS_IGNORADOS:
+            continue
+        if operacao == TipoAlteracao.INSERCAO:
+            alteracoes[campo] = (None, estado.dict.get(campo))
+        elif operacao == TipoAlteracao.EXCLUSAO:
+            alteracoes[campo] = (estado.dict.get(campo), None)
+        else:
+            historico = estado.attrs[campo].history
+            if historico.added:
+                antes = historico.deleted[0] if historico.deleted else None
+                alteracoes[campo] = (antes, historico.added[0])
+    return alteracoes
+
+@event.listens_for(SessionLocal, "after_flush")
+def _coletar_auditoria(session: Session, flush_context) -> None:
+    # O histórico dos atributos ainda está disponível aqui; depois do flush não
+    for colecao, operacao in (
+        (session.new, TipoAlteracao.INSERCAO),
+        (session.dirty, TipoAlteracao.ATUALIZACAO),
+        (session.deleted, TipoAlteracao.EXCLUSAO),
+    ):
+        for obj in colecao:
+            if not isinstance(obj, MODELOS_AUDITADOS):
+                continue
+            alteracoes = _diferencas(obj, operacao)
+            if operacao == TipoAlteracao.ATUALIZACAO and not alteracoes:
+                continue
+            registrar_auditoria(session, obj.__tablename__, obj.id, operacao, alteracoes)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _enviar_auditoria(session: Session) -> None:
+    registros = session.info.pop("auditoria_pendente", None)
+    if registros:
+        gravador_auditoria.enfileirar(registros)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_auditoria(session: Session) -> None:
+    session.info.pop("auditoria_pendente", None)
@@ -0,0 +1,283 @@
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import httpx
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+# Largura máxima de cada variante; a altura acompanha a proporção da imagem
+TAMANHOS = {"pequena": 96, "media": 240, "grande": 480}
+# Muda junto com TAMANHOS ou com a codificação, para não servir variantes antigas
+VERSAO_VARIANTES = "1"
+
+class CapaIndisponivel(Exception):
+    """A capa não pôde ser baixada do servidor de origem ou não é uma imagem."""
+
+class CacheDisco:
+    """Cache LRU de arquivos num diretório, limitado pelo total de bytes.
+
+    A ordem de uso fica num OrderedDict em memória, montado na inicialização
+    a partir do horário de acesso dos arquivos; cada leitura atualiza esse
+    horário com os.utime, então a ordem sobrevive a reinícios. Gravações vão
+    para um arquivo temporário e entram com os.replace: um leitor nunca vê
+    um arquivo pela metade. Com vários workers no mesmo diretório cada um
+    mantém sua ordem; um arquivo removido por outro processo é só um miss.
+    """
+
+    def __init__(self, diretorio: str, limite_bytes: int):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        self._arquivos: OrderedDict[str, int] = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._carregado = False
+
+    def _carregar(self) -> None:
+        os.makedirs(self.diretorio, exist_ok=True)
+        entradas = []
+        for entrada in os.scandir(self.diretorio):
+            if not entrada.is_file():
+                continue
+            if entrada.name.endswith(".tmp"):
+                # Sobra de uma gravação interrompida
+                os.remove(entrada.path)
+                continue
+            info = entrada.stat()
+            entradas.append((info.st_atime, entrada.name, info.st_size))
+        for _, nome, tamanho in sorted(entradas):
+            self._arquivos[nome] = tamanho
+            self._total += tamanho
+        self._carregado = True
+        self._despejar()
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, chave)
+
+    def _despejar(self) -> None:
+        while self._total > self.limite_bytes and self._arquivos:
+            nome, tamanho = self._arquivos.popitem(last=False)
+            self._total -= tamanho
+            try:
+                os.remove(self._caminho(nome))
+            except FileNotFoundError:
+                pass
+
+    def ler(self, chave: str) -> bytes | None:
+        with self._lock:
+            if not self._carregado:
+                self._carregar()
+            if chave not in self._arquivos:
+                return None
+            self._arquivos.move_to_end(chave)
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as arquivo:
+                conteudo = arquivo.read()
+            os.utime(caminho)
+        except FileNotFoundError:
+            with self._lock:
+                tamanho = self._arquivos.pop(chave, None)
+                if tamanho is not None:
+                    self._total -= tamanho
+            return None
+        return conteudo
+
+    def gravar(self, chave: str, conteudo: bytes) -> None:
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{threading.get_ident()}.tmp"
+        with self._lock:
+            if not self._carregado:
+                self._carregar()
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+        with self._lock:
+            self._total += len(conteudo) - self._arquivos.pop(chave, 0)
+            self._arquivos[chave] = len(conteudo)
+            self._despejar()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+def _chave(url: str, tamanho: str) -> str:
+    resumo = hashlib.sha256(f"{VERSAO_VARIANTES}:{url}".encode()).hexdigest()[:32]
+    return f"{resumo}-{tamanho}.jpg"
+
+def _endereco_permitido(url: httpx.URL) -> str:
+    """Confere esquema, host e endereços de destino; devolve o IP a conectar.
+
+    A capa_url vem do cadastro do livro: sem esta conferência, o servidor
+    buscaria qualquer endereço da rede interna em nome do cliente.
+    """
+    if url.scheme not in ("http", "https"):
+        raise CapaIndisponivel(f"Esquema não permitido: {url.scheme or 'nenhum'}")
+    if not url.host:
+        raise CapaIndisponivel("URL da capa sem host")
+    if settings.CAPAS_HOSTS_PERMITIDOS and url.host.lower() not in settings.CAPAS_HOSTS_PERMITIDOS:
+        raise CapaIndisponivel(f"Host não permitido: {url.host}")
+    porta = url.port or (443 if url.scheme == "https" else 80)
+    try:
+        enderecos = [info[4][0] for info in socket.getaddrinfo(url.host, porta, type=socket.SOCK_STREAM)]
+    except (socket.gaierror, UnicodeError) as e:
+        raise CapaIndisponivel(f"Host não encontrado: {url.host}") from e
+    for endereco in enderecos:
+        ip = ipaddress.ip_address(endereco.split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not settings.CAPAS_PERMITIR_REDE_PRIVADA and (not ip.is_global or ip.is_multicast):
+            raise CapaIndisponivel(f"Endereço não permitido: {endereco}")
+    return enderecos[0]
+
+def _baixar(cliente: httpx.Client, url: str) -> bytes:
+    """Baixa a original, seguindo redirecionamentos e conferindo cada destino.
+
+    A conexão vai ao IP já conferido, com Host e SNI do nome original: o DNS
+    não tem como devolver outro endereço entre a conferência e o download.
+    """
+    limite = settings.CAPAS_ORIGEM_MAXIMO_BYTES
+    try:
+        destino = httpx.URL(url)
+        for _ in range(settings.CAPAS_MAX_REDIRECIONAMENTOS + 1):
+            endereco = _endereco_permitido(destino)
+            pedido = cliente.build_request(
+                "GET", destino.copy_with(host=endereco),
+                headers={"Host": destino.netloc.decode("ascii")},
+                extensions={"sni_hostname": destino.host}
+            )
+            resposta = cliente.send(pedido, stream=True)
+            try:
+                if resposta.is_redirect:
+                    destino = destino.join(resposta.headers["Location"])
+                    continue
+                resposta.raise_for_status()
+                partes, recebidos = [], 0
+                for parte in resposta.iter_bytes():
+                    recebidos += len(parte)
+                    if recebidos > limite:
+                        raise CapaIndisponivel(f"Capa maior que {limite} bytes")
+                    partes.append(parte)
+                return b"".join(partes)
+            finally:
+                resposta.close()
+    except (httpx.HTTPError, httpx.InvalidURL, KeyError) as e:
+        raise CapaIndisponivel(f"Falha ao baixar a capa: {e}") from e
+    raise CapaIndisponivel(f"Mais de {settings.CAPAS_MAX_REDIRECIONAMENTOS} redirecionamentos")
+
+def _redimensionar(original: bytes) -> dict[str, bytes]:
+    """Gera todas as variantes de uma vez, decodificando a original uma só vez."""
+    try:
+        imagem = Image.open(io.BytesIO(original))
+        # No JPEG, o decodificador já reduz por 1/2, 1/4 ou 1/8 sem ler a imagem inteira
+        maior = max(TAMANHOS.values())
+        imagem.draft("RGB", (maior, maior))
+        imagem = ImageOps.exif_transpose(imagem).convert("RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise CapaIndisponivel(f"A capa não é uma imagem válida: {e}") from e
+
+    variantes = {}
+    for nome, largura in sorted(TAMANHOS.items(), key=lambda item: -item[1]):
+        if imagem.width > largura:
+            altura = max(1, round(imagem.height * largura / imagem.width))
+            # Cada variante parte da anterior, já menor: reduções sucessivas custam menos
+            imagem = imagem.resize((largura, altura), Image.LANCZOS, reducing_gap=3.0)
+        saida = io.BytesIO()
+        imagem.save(saida, "JPEG", quality=settings.CAPAS_QUALIDADE_JPEG, optimize=True, progressive=True)
+        variantes[nome] = saida.getvalue()
+    return variantes
+
+class ServicoCapas:
+    """Capas dos livros baixadas uma vez e servidas em tamanhos reduzidos.
+
+    No primeiro pedido de uma capa_url, a imagem é baixada e todas as
+    variantes de TAMANHOS são geradas juntas num pool de threads (o Pillow
+    libera o GIL ao decodificar e redimensionar) e gravadas no CacheDisco.
+    Pedidos simultâneos da mesma capa esperam o mesmo Future: a origem é
+    consultada uma vez, e uma falha na origem é lembrada por
+    CAPAS_FALHA_SEGUNDOS antes de tentar de novo. A imagem de uma URL é
+    tratada como imutável; para trocar a capa, troca-se a capa_url.
+    """
+
+    def __init__(self):
+        self.cache = CacheDisco(settings.CAPAS_DIRETORIO, settings.CAPAS_CACHE_MAXIMO_MB * 1024 * 1024)
+        self._executor: ThreadPoolExecutor | None = None
+        self._cliente: httpx.Client | None = None
+        self._em_andamento: dict[str, Future] = {}
+        self._falhas: dict[str, tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def _iniciar(self) -> None:
+        # Criados no primeiro uso: processos filhos do servidor não herdam threads nem conexões
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(settings.CAPAS_THREADS or None, thread_name_prefix="capas")
+            self._cliente = httpx.Client(
+                timeout=settings.CAPAS_TIMEOUT_SEGUNDOS, follow_redirects=False,
+                headers={"User-Agent": "biblioteca-capas/1.0"}
+            )
+
+    def _gerar(self, url: str) -> dict[str, bytes]:
+        try:
+            variantes = _redimensionar(_baixar(self._cliente, url))
+        except CapaIndisponivel as e:
+            with self._lock:
+                self._falhas[url] = (time.monotonic(), str(e))
+            raise
+        try:
+            for nome, conteudo in variantes.items():
+                self.cache.gravar(_chave(url, nome), conteudo)
+        except OSError as e:
+            # Sem espaço ou sem permissão no diretório: a resposta sai mesmo sem cache
+            logger.warning("Capa de %s não gravada no cache: %s", url, e)
+        return variantes
+
+    def obter(self, url: str, tamanho: str) -> tuple[bytes, str]:
+        """Devolve (JPEG, ETag) da capa no tamanho pedido."""
+        chave = _chave(url, tamanho)
+        etag = f'"{chave.removesuffix(".jpg")}"'
+        conteudo = self.cache.ler(chave)
+        if conteudo is not None:
+            return conteudo, etag
+
+        with self._lock:
+            falha = self._falhas.get(url)
+            if falha is not None:
+                if time.monotonic() - falha[0] < settings.CAPAS_FALHA_SEGUNDOS:
+                    raise CapaIndisponivel(falha[1])
+                del self._falhas[url]
+            self._iniciar()
+            futuro = self._em_andamento.get(url)
+            novo = futuro is None
+            if novo:
+                futuro = self._executor.submit(self._gerar, url)
+                self._em_andamento[url] = futuro
+        if novo:
+            # Fora do lock: num Future já terminado o callback roda aqui mesmo e toma o lock
+            futuro.add_done_callback(lambda _: self._descartar(url, futuro))
+        return futuro.result()[tamanho], etag
+
+    def _descartar(self, url: str, futuro: Future) -> None:
+        with self._lock:
+            if self._em_andamento.get(url) is futuro:
+                del self._em_andamento[url]
+
+    def encerrar(self) -> None:
+        with self._lock:
+            executor, cliente = self._executor, self._cliente
+            self._executor = self._cliente = None
+        # Fora do lock: as tarefas em andamento o tomam ao terminar
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+            cliente.close()
+
+servico_capas = ServicoCapas()
@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+from datetime import date, datetime, time, timedelta
+from typing import Callable
+
+from sqlalchemy import event, select, insert, delete, func, union_all
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from app.models import (
+    Emprestimo, EmprestimoArquivo, Livro,
+    CirculacaoLivroDiaria, CirculacaoCategoriaDiaria, CirculacaoDiaPendente, MarcaProcessamento
+)
+import settings
+
+NOME_MARCA = "circulacao"
+
+def _como_data(valor) -> date:
+    # MySQL devolve date; SQLite devolve o texto AAAA-MM-DD
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+def ler_marca(db: Session) -> datetime | None:
+    return db.scalar(select(MarcaProcessamento.marca).where(MarcaProcessamento.nome == NOME_MARCA))
+
+def _gravar_marca(db: Session, marca: datetime) -> None:
+    registro = db.get(MarcaProcessamento, NOME_MARCA)
+    if registro is None:
+        db.add(MarcaProcessamento(nome=NOME_MARCA, marca=marca))
+    else:
+        registro.marca = marca
+
+def _dias_do_emprestimo(data_emprestimo: datetime | None, data_devolucao_real: datetime | None) -> set[date]:
+    return {valor.date() for valor in (data_emprestimo, data_devolucao_real) if valor is not None}
+
+def registrar_exclusao(db: Session, emprestimo_ids) -> None:
+    """Marca para recálculo os dias dos empréstimos que o DELETE em massa vai apagar.
+
+    Chamado antes do DELETE, na mesma transação: depois dele, nem o
+    empréstimo nem data_atualizacao apontam mais esses dias.
+    """
+    dias = set()
+    for data_emprestimo, data_devolucao_real in db.execute(
+        select(Emprestimo.data_emprestimo, Emprestimo.data_devolucao_real)
+        .where(Emprestimo.id.in_(emprestimo_ids))
+    ):
+        dias |= _dias_do_emprestimo(data_emprestimo, data_devolucao_real)
+    if dias:
+        db.execute(insert(CirculacaoDiaPendente), [{"dia": dia} for dia in sorted(dias)])
+
+@event.listens_for(SessionLocal, "before_flush")
+def _registrar_exclusoes(session: Session, flush_context, instances) -> None:
+    # db.delete() de empréstimos: os dias entram no mesmo flush que o DELETE
+    dias = set()
+    for obj in session.deleted:
+        if isinstance(obj, Emprestimo):
+            dias |= _dias_do_emprestimo(obj.data_emprestimo, obj.data_devolucao_real)
+    for dia in sorted(dias):
+        session.add(CirculacaoDiaPendente(dia=dia))
+
+def _unir_faixas(faixas: list[tuple[date, date]]) -> list[tuple[date, date]]:
+    # Faixas que se sobrepõem ou são consecutivas viram uma só
+    unidas: list[tuple[date, date]] = []
+    for primeiro, ultimo in sorted(faixas):
+        if unidas and primeiro <= unidas[-1][1] + timedelta(days=1):
+            unidas[-1] = (unidas[-1][0], max(unidas[-1][1], ultimo))
+        else:
+            unidas.append((primeiro, ultimo))
+    return unidas
+
+def _dias_afetados(db: Session, desde: datetime | None, ate: datetime) -> tuple[date, date] | None:
+    # Dias de empréstimo e de devolução das linhas alteradas desde a marca
+    filtros = [Emprestimo.data_atualizacao <= ate]
+    if desde is not None:
+        filtros.append(Emprestimo.data_atualizacao > desde)
+    limites = db.execute(
+        select(
+            func.min(Emprestimo.data_emprestimo),
+            func.max(Emprestimo.data_emprestimo),
+            func.max(Emprestimo.data_devolucao_real),
+        ).where(*filtros)
+    ).one()
+    if limites[0] is None:
+        return None
+    primeiro = limites[0]
+    ultimo = max(valor for valor in limites[1:] if valor is not None)
+    if desde is None:
+        # Primeira execução: inclui o histórico que já foi para o arquivo
+        arquivado = db.scalar(select(func.min(EmprestimoArquivo.data_emprestimo)))
+        if arquivado is not None:
+            primeiro = min(primeiro, arquivado)
+    return primeiro.date(), ultimo.date()
+
+def _contar(db: Session, coluna: str, inicio: datetime, fim: datetime) -> list:
+    # Conta na tabela quente e no arquivo, para que arquivar não apague a história
+    eventos = union_all(
+        select(getattr(Emprestimo, coluna).label("data"), Emprestimo.livro_id)
+        .where(getattr(Emprestimo, coluna) >= inicio, getattr(Emprestimo, coluna) < fim),
+        select(getattr(EmprestimoArquivo, coluna).label("data"), EmprestimoArquivo.livro_id)
+        .where(getattr(EmprestimoArquivo, coluna) >= inicio, getattr(EmprestimoArquivo, coluna) < fim),
+    ).subquery()
+    dia = func.date(eventos.c.data)
+    return db.execute(
+        select(dia, eventos.c.livro_id, Livro.categoria_id, func.count())
+        .join(Livro, Livro.id == eventos.c.livro_id)
+        .group_by(dia, eventos.c.livro_id, Livro.categoria_id)
+    ).all()
+
+def recalcular(db: Session, primeiro: date, ultimo: date) -> int:
+    """Refaz os agregados dos dias entre primeiro e ultimo (inclusive).
+
+    Apaga e reinsere o intervalo inteiro, então rodar de novo é seguro.
+    """
+    inicio = datetime.combine(primeiro, time.min)
+    fim = datetime.combine(ultimo + timedelta(days=1), time.min)
+
+    por_livro: dict[tuple[date, int], list] = {}
+    for indice, coluna in ((0, "data_emprestimo"), (1, "data_devolucao_real")):
+        for dia, livro_id, categoria_id, quantidade in _contar(db, coluna, inicio, fim):
+            linha = por_livro.setdefault((_como_data(dia), livro_id), [categoria_id, 0, 0])
+            linha[1 + indice] += quantidade
+
+    por_categoria: dict[tuple[date, int], list] = {}
+    for (dia, _), (categoria_id, emprestimos, devolucoes) in por_livro.items():
+        linha = por_categoria.setdefault((dia, categoria_id), [0, 0])
+        linha[0] += emprestimos
+        linha[1] += devolucoes
+
+    db.execute(delete(CirculacaoLivroDiaria).where(
+        CirculacaoLivroDiaria.dia >= primeiro, CirculacaoLivroDiaria.dia <= ultimo
+    ))
+    db.execute(delete(CirculacaoCategoriaDiaria).where(
+        CirculacaoCategoriaDiaria.dia >= primeiro, CirculacaoCategoriaDiaria.dia <= ultimo
+    ))
+    if por_livro:
+        db.execute(insert(CirculacaoLivroDiaria), [
+            {"dia": dia, "livro_id": livro_id, "categoria_id": categoria_id,
+             "emprestimos": emprestimos, "devolucoes": devolucoes}
+            for (dia, livro_id), (categoria_id, emprestimos, devolucoes) in por_livro.items()
+        ])
+    if por_categoria:
+        db.execute(insert(CirculacaoCategoriaDiaria), [
+            {"dia": dia, "categoria_id": categoria_id, "emprestimos": emprestimos, "devolucoes": devolucoes}
+            for (dia, categoria_id), (emprestimos, devolucoes) in por_categoria.items()
+        ])
+    return len(por_livro)
+
+def atualizar(
+    db: Session, dias_por_lote: int = settings.CIRCULACAO_DIAS_POR_LOTE, progresso: Callable | None = None
+) -> dict:
+    # Só considera linhas mais antigas que a janela, como o feed de alterações:
+    # transações ainda abertas confirmam antes de a marca passar por elas
+    ate = datetime.utcnow() - timedelta(seconds=settings.ALTERACOES_JANELA_SEGUNDOS)
+    desde = ler_marca(db)
+    afetados = _dias_afetados(db, desde, ate)
+
+    # Exclusões: só os dias marcados, e não tudo entre eles e as alterações
+    ultimo_pendente = db.scalar(select(func.max(CirculacaoDiaPendente.id)))
+    faixas = [afetados] if afetados is not None else []
+    if ultimo_pendente is not None:
+        faixas += [
+            (_como_data(dia), _como_data(dia)) for dia in db.scalars(
+                select(CirculacaoDiaPendente.dia).where(CirculacaoDiaPendente.id <= ultimo_pendente).distinct()
+            )
+        ]
+    faixas = _unir_faixas(faixas)
+    total_dias = sum((ultimo - primeiro).days + 1 for primeiro, ultimo in faixas)
+
+    linhas = 0
+    lotes = 0
+    feitos = 0
+    for primeiro, ultimo in faixas:
+        while primeiro <= ultimo:
+            fim_lote = min(ultimo, primeiro + timedelta(days=dias_por_lote - 1))
+            linhas += recalcular(db, primeiro, fim_lote)
+            lotes += 1
+            feitos += (fim_lote - primeiro).days + 1
+            if feitos < total_dias:
+                # Cada lote confirmado separadamente; a marca só avança no último
+                db.commit()
+                if progresso is not None:
+                    progresso(feitos, total_dias)
+            primeiro = fim_lote + timedelta(days=1)
+
+    if ultimo_pendente is not None:
+        db.execute(delete(CirculacaoDiaPendente).where(CirculacaoDiaPendente.id <= ultimo_pendente))
+    _gravar_marca(db, ate)
+    db.commit()
+    return {
+        "marca_anterior": desde,
+        "marca": ate,
+        "dias": total_dias,
+        "lotes": lotes,
+        "linhas": linhas,
+    }
+
+def _atualizar_nova_sessao(session_factory) -> None:
+    db = session_factory()
+    try:
+        atualizar(db)
+    finally:
+        db.close()
+
+async def atualizar_periodicamente(session_factory, intervalo: float) -> None:
+    while True:
+        await asyncio.sleep(intervalo)
+        await asyncio.to_thread(_atualizar_nova_sessao, session_factory)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Atualiza os agregados diários de circulação")
+    parser.add_argument("--dias-por-lote", type=int, default=settings.CIRCULACAO_DIAS_POR_LOTE)
+    parser.add_argument("--refazer", action="store_true", help="ignora a marca e recalcula todo o histórico")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.refazer:
+            db.execute(delete(MarcaProcessamento).where(MarcaProcessamento.nome == NOME_MARCA))
+        relatorio = atualizar(db, args.dias_por_lote)
+    finally:
+        db.close()
+
+    for chave, valor in relatorio.items():
+        print(f"{chave}: {valor}")
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+
+from sqlalchemy import event, select, func, text
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from app.models import Livro, Usuario, Categoria, Emprestimo, Reserva, Multa, TipoAlteracao
+import settings
+
+MODELOS_CONTADOS = (Livro, Usuario, Categoria, Emprestimo, Reserva, Multa)
+
+def explicar(db: Session, consulta, comando: str = "EXPLAIN") -> list:
+    """Linhas do plano de execução da consulta (mappings)."""
+    dialeto = db.get_bind().dialect
+    compilada = consulta.compile(dialect=dialeto)
+    # Os parâmetros passam pelos tipos das colunas (Enum, DateTime...) como
+    # numa execução normal; exec_driver_sql os enviaria crus ao driver
+    parametros = []
+    for nome in compilada.positiontup:
+        valor = compilada.params[nome]
+        processador = compilada.binds[nome].type.bind_processor(dialeto)
+        parametros.append(processador(valor) if processador else valor)
+    resultado = db.connection().exec_driver_sql(f"{comando} {compilada}", tuple(parametros))
+    return [linha._mapping for linha in resultado]
+
+class CacheContagens:
+    """Totais para o cabeçalho X-Total-Count das listagens.
+
+    Sem filtros, o total vem de um contador por tabela: um COUNT(*) na
+    primeira vez e, depois, ajustado pelas escritas após o commit, com um
+    recálculo periódico que corrige divergências. Só é exato quando a API
+    roda num único processo (CONTAGEM_PROCESSO_UNICO); com vários workers,
+    cada um só vê as próprias escritas até o próximo recálculo, e o mesmo
+    vale para as escritas dos jobs, feitas em processos à parte.
+
+    Com filtros, o COUNT é guardado por CONTAGEM_TTL_SEGUNDOS. Cada tabela tem
+    uma geração que muda a cada escrita: um resultado em cache só é exato se
+    a tabela não mudou desde que foi calculado.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._totais: dict[str, int] = {}
+        self._geracoes: dict[str, int] = {}
+        self._filtradas: dict[tuple, tuple[float, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def _contar_banco(self, db: Session, modelo, condicoes: list) -> int:
+        return db.scalar(select(func.count()).select_from(modelo).where(*condicoes))
+
+    def _estimar(self, db: Session, modelo, condicoes: list) -> int | None:
+        # Estatísticas do InnoDB: sem varrer a tabela nem o índice
+        if db.get_bind().dialect.name != "mysql":
+            return None
+        if not condicoes:
+            return db.scalar(
+                text(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabela"
+                ),
+                {"tabela": modelo.__tablename__},
+            )
+        plano = explicar(db, select(modelo.id).where(*condicoes))
+        return sum(linha["rows"] or 0 for linha in plano)
+
+    def contar(
+        self, db: Session, modelo, filtros: dict, aproximado: bool = False, condicoes: list | None = None
+    ) -> tuple[int, bool]:
+        """Devolve (total, exato).
+
+        filtros identifica a contagem no cache; sem condicoes, cada filtro é
+        uma igualdade entre a coluna de mesmo nome e o valor.
+        """
+        tabela = modelo.__tablename__
+        filtros = {campo: valor for campo, valor in filtros.items() if valor is not None}
+        if condicoes is None:
+            condicoes = [getattr(modelo, campo) == valor for campo, valor in filtros.items()]
+        if aproximado:
+            estimativa = self._estimar(db, modelo, condicoes)
+            if estimativa is not None:
+                return estimativa, False
+
+        geracao = self._geracoes.get(tabela, 0)
+        if not filtros:
+            total = self._totais.get(tabela)
+            if total is None:
+                total = self._contar_banco(db, modelo, condicoes)
+                with self._lock:
+                    # Uma escrita confirmada durante o COUNT pode ou não ter entrado nele
+                    if self._geracoes.get(tabela, 0) != geracao:
+                        return total, False
+                    self._totais[tabela] = total
+            return total, settings.CONTAGEM_PROCESSO_UNICO
+
+        chave = (tabela, tuple(sorted(filtros.items())))
+        entrada = self._filtradas.get(chave)
+        if entrada is not None and entrada[0] > time.monotonic():
+            _, total, geracao_calculo = entrada
+            return total, settings.CONTAGEM_PROCESSO_UNICO and geracao_calculo == geracao
+        total = self._contar_banco(db, modelo, condicoes)
+        with self._lock:
+            self._filtradas[chave] = (time.monotonic() + self.ttl, total, geracao)
+        return total, True
+
+    def aplicar(self, deltas: dict[str, int]) -> None:
+        with self._lock:
+            for tabela, delta in deltas.items():
+                self._geracoes[tabela] = self._geracoes.get(tabela, 0) + 1
+                if tabela in self._totais:
+                    self._totais[tabela] += delta
+
+    def recalcular(self, db: Session) -> None:
+        for modelo in MODELOS_CONTADOS:
+            tabela = modelo.__tablename__
+            geracao = self._geracoes.get(tabela, 0)
+            total = self._contar_banco(db, modelo, [])
+            with self._lock:
+                if self._geracoes.get(tabela, 0) == geracao:
+                    self._totais[tabela] = total
+                else:
+                    # Mudou durante o COUNT: recarrega sob demanda na próxima listagem
+                    self._totais.pop(tabela, None)
+        # Descarta as contagens filtradas vencidas
+        agora = time.monotonic()
+        with self._lock:
+            self._filtradas = {chave: entrada for chave, entrada in self._filtradas.items() if entrada[0] > agora}
+
+    def _recalcular_nova_sessao(self, session_factory) -> None:
+        db = session_factory()
+        try:
+            self.recalcular(db)
+        finally:
+            db.close()
+
+    async def recalcular_periodicamente(self, session_factory, intervalo: float) -> None:
+        while True:
+            await asyncio.sleep(intervalo)
+            await asyncio.to_thread(self._recalcular_nova_sessao, session_factory)
+
+cache_contagens = CacheContagens(settings.CONTAGEM_TTL_SEGUNDOS)
+
+def registrar_contagem(session: Session, tabela: str, delta: int = 0) -> None:
+    # Para escritas em massa, que não passam pelo flush; aplicado após o commit.
+    # delta 0 só marca a tabela como alterada (UPDATE muda totais filtrados)
+    pendentes = session.info.setdefault("contagens_pendentes", {})
+    pendentes[tabela] = pendentes.get(tabela, 0) + delta
+
+def delta_da_operacao(operacao: TipoAlteracao, quantidade: int) -> int:
+    if operacao == TipoAlteracao.INSERCAO:
+        return quantidade
+    if operacao in (TipoAlteracao.EXCLUSAO, TipoAlteracao.ARQUIVAMENTO):
+        return -quantidade
+    return 0
+
+@event.listens_for(SessionLocal, "after_flush")
+def _coletar_contagens(session: Session, flush_context) -> None:
+    for colecao, operacao in (
+        (session.new, TipoAlteracao.INSERCAO),
+        (session.dirty, TipoAlteracao.ATUALIZACAO),
+        (session.deleted, TipoAlteracao.EXCLUSAO),
+    ):
+        for obj in colecao:
+            if isinstance(obj, MODELOS_CONTADOS):
+                registrar_contagem(session, obj.__tablename__, delta_da_operacao(operacao, 1))
+
+@event.listens_for(SessionLocal, "after_commit")
+def _aplicar_contagens(session: Session) -> None:
+    pendentes = session.info.pop("contagens_pendentes", None)
+    if pendentes:
+        cache_contagens.aplicar(pendentes)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_contagens(session: Session) -> None:
+    session.info.pop("contagens_pendentes", None)
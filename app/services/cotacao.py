@@ -0,0 +1,150 @@
+import heapq
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+from typing import NamedTuple
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from app.models import Emprestimo, StatusEmprestimo, Usuario, TipoUsuario
+import settings
+
+# Posição de cada tipo na coluna de códigos
+TIPOS = list(TipoUsuario)
+CODIGOS = {tipo: codigo for codigo, tipo in enumerate(TIPOS)}
+
+class Tarifa(NamedTuple):
+    valor_por_dia: Decimal
+    teto: Decimal | None = None
+    dias_carencia: int = 0
+
+class ColunasAtraso:
+    """Empréstimos em aberto e vencidos, agrupados e guardados por coluna.
+
+    Cada posição é um grupo (usuário, tipo, dias de atraso) com a quantidade
+    de empréstimos que caem nele. O agrupamento é feito no banco, então o
+    número de linhas carregadas cresce com usuários × dias distintos, não com
+    o total de empréstimos.
+    """
+
+    def __init__(self):
+        self.usuario_ids = array('i')
+        self.tipos = array('b')
+        self.dias = array('i')
+        self.quantidades = array('i')
+
+    def __len__(self) -> int:
+        return len(self.dias)
+
+    def adicionar(self, usuario_id: int, tipo: TipoUsuario, dias: int, quantidade: int) -> None:
+        self.usuario_ids.append(usuario_id)
+        self.tipos.append(CODIGOS[tipo])
+        self.dias.append(dias)
+        self.quantidades.append(quantidade)
+
+def carregar_atrasos(db: Session, referencia: datetime) -> ColunasAtraso:
+    vencimento = func.date(Emprestimo.data_devolucao_prevista)
+    consulta = (
+        select(Emprestimo.usuario_id, Usuario.tipo, vencimento, func.count())
+        .join(Usuario, Usuario.id == Emprestimo.usuario_id)
+        .where(
+            Emprestimo.status.in_([StatusEmprestimo.ATIVO, StatusEmprestimo.ATRASADO]),
+            Emprestimo.data_devolucao_prevista < referencia,
+        )
+        .group_by(Emprestimo.usuario_id, Usuario.tipo, vencimento)
+        .execution_options(yield_per=10000)
+    )
+
+    colunas = ColunasAtraso()
+    dia_referencia = referencia.date()
+    for usuario_id, tipo, dia_vencimento, quantidade in db.execute(consulta):
+        # MySQL devolve date; SQLite devolve o texto AAAA-MM-DD
+        if isinstance(dia_vencimento, str):
+            dia_vencimento = date.fromisoformat(dia_vencimento)
+        colunas.adicionar(usuario_id, tipo, (dia_referencia - dia_vencimento).days, quantidade)
+    return colunas
+
+def _centavos(valor: Decimal) -> int:
+    return int((valor * 100).to_integral_value())
+
+def _reais(centavos: int) -> Decimal:
+    return Decimal(centavos).scaleb(-2)
+
+def _tabela_valores(tarifa: Tarifa, max_dias: int) -> array:
+    # Valor em centavos para cada quantidade de dias de atraso possível
+    por_dia = _centavos(tarifa.valor_por_dia)
+    teto = _centavos(tarifa.teto) if tarifa.teto is not None else None
+    tabela = array('q', [0]) * (max_dias + 1)
+    for dias in range(tarifa.dias_carencia + 1, max_dias + 1):
+        valor = (dias - tarifa.dias_carencia) * por_dia
+        tabela[dias] = valor if teto is None else min(valor, teto)
+    return tabela
+
+def tarifa_vigente(tipo: TipoUsuario) -> Tarifa | None:
+    """Tarifa configurada em settings (MULTA_*) para o tipo; None para os isentos."""
+    if tipo.value in settings.MULTA_TIPOS_ISENTOS:
+        return None
+    return Tarifa(settings.MULTA_VALOR_POR_DIA, settings.MULTA_TETO, settings.MULTA_DIAS_CARENCIA)
+
+def dias_de_atraso(data_devolucao_prevista: datetime, referencia: datetime) -> int:
+    # Em dias de calendário, como carregar_atrasos
+    return max(0, (referencia.date() - data_devolucao_prevista.date()).days)
+
+def calcular_multa(tarifa: Tarifa, dias: int) -> Decimal:
+    """Valor da multa de um empréstimo, pela mesma tabela usada na simulação."""
+    return _reais(_tabela_valores(tarifa, dias)[dias])
+
+def simular(colunas: ColunasAtraso, tarifas: dict[TipoUsuario, Tarifa], limite_usuarios: int = 100) -> dict:
+    """Aplica a tarifa candidata a todos os grupos de atraso.
+
+    O cálculo por tipo é feito uma vez por quantidade de dias (tabela de
+    valores); cada grupo custa só uma consulta à tabela e uma multiplicação.
+    Tipos sem tarifa ficam isentos.
+    """
+    max_dias = max(colunas.dias, default=0)
+    tabelas = [
+        _tabela_valores(tarifas[tipo], max_dias) if tipo in tarifas else None
+        for tipo in TIPOS
+    ]
+
+    total_por_tipo = [0] * len(TIPOS)
+    emprestimos_por_tipo = [0] * len(TIPOS)
+    por_usuario: dict[int, list] = {}
+    for usuario_id, codigo, dias, quantidade in zip(
+        colunas.usuario_ids, colunas.tipos, colunas.dias, colunas.quantidades
+    ):
+        tabela = tabelas[codigo]
+        valor = tabela[dias] * quantidade if tabela is not None else 0
+        total_por_tipo[codigo] += valor
+        emprestimos_por_tipo[codigo] += quantidade
+        acumulado = por_usuario.get(usuario_id)
+        if acumulado is None:
+            por_usuario[usuario_id] = [valor, quantidade, codigo]
+        else:
+            acumulado[0] += valor
+            acumulado[1] += quantidade
+
+    maiores = heapq.nlargest(limite_usuarios, por_usuario.items(), key=lambda item: item[1][0])
+    return {
+        "total": _reais(sum(total_por_tipo)),
+        "quantidade_emprestimos": sum(emprestimos_por_tipo),
+        "quantidade_usuarios": len(por_usuario),
+        "por_tipo": {
+            tipo: {
+                "total": _reais(total_por_tipo[codigo]),
+                "quantidade_emprestimos": emprestimos_por_tipo[codigo],
+            }
+            for codigo, tipo in enumerate(TIPOS)
+            if emprestimos_por_tipo[codigo]
+        },
+        "usuarios": [
+            {
+                "usuario_id": usuario_id,
+                "tipo": TIPOS[codigo],
+                "quantidade_emprestimos": quantidade,
+                "valor": _reais(valor),
+            }
+            for usuario_id, (valor, quantidade, codigo) in maiores
+        ],
+    }
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import threading
+import time
+from array import array
+
+from sqlalchemy import select, or_
+from sqlalchemy.orm import Session
+
+from app.models import Livro
+from app.services.alteracoes import ultima_alteracao, alteracoes_desde
+
+logger = logging.getLogger(__name__)
+
+# Marca posições do vetor sem livro cadastrado
+AUSENTE = -1
+
+class IndiceDisponibilidade:
+    """Índice em memória de Livro.quantidade_disponivel.
+
+    Um vetor compacto de inteiros indexado pelo id do livro e um dicionário
+    ISBN -> id. A carga completa é a primeira rodada de
+    sincronizar_periodicamente, em segundo plano: o startup não espera por
+    ela e, até terminar, a rota consulta o banco (consultar_no_banco). Depois, o índice segue
+    o log de alterações (app.services.alteracoes) a partir do id marcado na
+    carga e relê as linhas de livros alteradas. Assim vê as escritas de todos
+    os workers e jobs, nunca aplica uma mesma alteração duas vezes e não perde
+    as que acontecem durante uma recarga. A recarga periódica fica só como
+    rede de segurança.
+    """
+
+    def __init__(self):
+        self._quantidades = array('i')
+        self._isbns: dict[str, int] = {}
+        # ISBN de cada id, para tirar o antigo de _isbns quando o ISBN muda
+        self._isbn_por_id: list[str | None] = []
+        self._lock = threading.Lock()
+        self.cursor = 0
+        self.carregado = False
+
+    def recarregar(self, db: Session) -> None:
+        # Marca e livros na mesma transação: a leitura vê exatamente as alterações até a marca
+        marca = ultima_alteracao(db)
+        quantidades = array('i')
+        isbns = {}
+        isbn_por_id: list[str | None] = []
+        for livro_id, isbn, quantidade in db.execute(
+            select(Livro.id, Livro.isbn, Livro.quantidade_disponivel)
+        ):
+            if livro_id >= len(quantidades):
+                quantidades.extend([AUSENTE] * (livro_id + 1 - len(quantidades)))
+                isbn_por_id.extend([None] * (livro_id + 1 - len(isbn_por_id)))
+            quantidades[livro_id] = quantidade
+            isbns[isbn] = livro_id
+            isbn_por_id[livro_id] = isbn
+        db.commit()
+
+        with self._lock:
+            self._quantidades = quantidades
+            self._isbns = isbns
+            self._isbn_por_id = isbn_por_id
+            self.cursor = marca
+            self.carregado = True
+
+    def sincronizar(self, db: Session) -> int:
+        """Aplica as alterações de livros confirmadas depois do cursor."""
+        aplicadas = 0
+        while True:
+            alteracoes = alteracoes_desde(db, self.cursor, (Livro.__tablename__,))
+            if not alteracoes:
+                break
+            ids = {registro_id for _, _, registro_id, _ in alteracoes}
+            # Valor atual de cada linha, e não um delta: reaplicar não muda nada
+            linhas = {
+                livro_id: (isbn, quantidade)
+                for livro_id, isbn, quantidade in db.execute(
+                    select(Livro.id, Livro.isbn, Livro.quantidade_disponivel).where(Livro.id.in_(ids))
+                )
+            }
+            with self._lock:
+                for livro_id in ids:
+                    if livro_id in linhas:
+                        self._definir(livro_id, *linhas[livro_id])
+                    else:
+                        self._remover(livro_id)
+                self.cursor = alteracoes[-1][0]
+            db.commit()
+            aplicadas += len(alteracoes)
+        return aplicadas
+
+    def _definir(self, livro_id: int, isbn: str, quantidade: int) -> None:
+        if livro_id >= len(self._quantidades):
+            self._quantidades.extend([AUSENTE] * (livro_id + 1 - len(self._quantidades)))
+            self._isbn_por_id.extend([None] * (livro_id + 1 - len(self._isbn_por_id)))
+        self._quantidades[livro_id] = quantidade
+        anterior = self._isbn_por_id[livro_id]
+        if anterior is not None and anterior != isbn and self._isbns.get(anterior) == livro_id:
+            del self._isbns[anterior]
+        self._isbns[isbn] = livro_id
+        self._isbn_por_id[livro_id] = isbn
+
+    def _remover(self, livro_id: int) -> None:
+        if livro_id >= len(self._quantidades):
+            return
+        self._quantidades[livro_id] = AUSENTE
+        isbn = self._isbn_por_id[livro_id]
+        if isbn is not None and self._isbns.get(isbn) == livro_id:
+            del self._isbns[isbn]
+        self._isbn_por_id[livro_id] = None
+
+    def por_id(self, livro_id: int) -> int | None:
+        quantidades = self._quantidades
+        if 0 <= livro_id < len(quantidades) and quantidades[livro_id] != AUSENTE:
+            return quantidades[livro_id]
+        return None
+
+    def id_por_isbn(self, isbn: str) -> int | None:
+        return self._isbns.get(isbn)
+
+    def carregar(self, session_factory) -> None:
+        """Carga completa numa sessão própria."""
+        self._executar_nova_sessao(self.recarregar, session_factory)
+
+    def _executar_nova_sessao(self, metodo, session_factory) -> None:
+        db = session_factory()
+        try:
+            metodo(db)
+        finally:
+            db.close()
+
+    async def sincronizar_periodicamente(self, session_factory, intervalo: float, recarga: float) -> None:
+        # A primeira rodada faz a carga completa; uma carga que falhou é repetida na seguinte
+        proxima_recarga = 0.0
+        while True:
+            try:
+                if not self.carregado or (recarga and time.monotonic() >= proxima_recarga):
+                    await asyncio.to_thread(self.carregar, session_factory)
+                    proxima_recarga = time.monotonic() + recarga
+                await asyncio.to_thread(self._executar_nova_sessao, self.sincronizar, session_factory)
+            except Exception:
+                # Banco fora do ar, por exemplo: tenta de novo no próximo intervalo
+                logger.exception("Disponibilidade: falha ao sincronizar o índice")
+            await asyncio.sleep(intervalo)
+
+indice_disponibilidade = IndiceDisponibilidade()
+
+def consultar_no_banco(db: Session, ids: list[int], isbns: list[str]) -> tuple[dict[int, int], dict[str, int]]:
+    """(quantidade por id, id por ISBN) lidos do banco, para quando o índice ainda carrega."""
+    quantidades: dict[int, int] = {}
+    ids_por_isbn: dict[str, int] = {}
+    if ids or isbns:
+        for livro_id, isbn, quantidade in db.execute(
+            select(Livro.id, Livro.isbn, Livro.quantidade_disponivel)
+            .where(or_(Livro.id.in_(ids), Livro.isbn.in_(isbns)))
+        ):
+            quantidades[livro_id] = quantidade
+            ids_por_isbn[isbn] = livro_id
+    return quantidades, ids_por_isbn
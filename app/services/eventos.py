@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Livro, Emprestimo, Reserva, TipoAlteracao
+from app.services.alteracoes import ultima_alteracao, alteracoes_desde
+import settings
+
+logger = logging.getLogger(__name__)
+
+class Assinante:
+    def __init__(self, livro_id: int | None, usuario_id: int | None, tamanho_fila: int):
+        self.livro_id = livro_id
+        self.usuario_id = usuario_id
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=tamanho_fila)
+        self.perdidos = 0
+
+    def aceita(self, evento: dict) -> bool:
+        if self.livro_id is not None and evento.get("livro_id") != self.livro_id:
+            return False
+        if self.usuario_id is not None and evento.get("usuario_id") != self.usuario_id:
+            return False
+        return True
+
+    def entregar(self, evento: dict) -> None:
+        # Fila cheia: descarta o evento mais antigo em vez de bloquear quem publica
+        if self.fila.full():
+            self.fila.get_nowait()
+            self.perdidos += 1
+        self.fila.put_nowait(evento)
+
+class HubEventos:
+    """Distribui eventos de circulação para os assinantes do processo.
+
+    Os eventos vêm do log de alterações (app.services.alteracoes), lido por
+    cada worker a partir do id marcado no startup: assim todo worker emite
+    as escritas de todos os outros, e não só as que ele mesmo confirmou. Para
+    cada livro, empréstimo ou reserva alterado o hub relê o estado atual e só
+    publica quando ele difere do último publicado para aquele registro
+    (guardados até EVENTOS_MEMORIA registros); várias mudanças do mesmo
+    registro num intervalo saem como um evento só, com o estado final. A
+    entrega é agendada no event loop com call_soon_threadsafe, e cada
+    assinante tem uma fila limitada.
+    """
+
+    def __init__(self):
+        self._assinantes: set[Assinante] = set()
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._ultimos: OrderedDict[tuple[str, int], tuple] = OrderedDict()
+        self.cursor: int | None = None
+
+    def assinar(self, livro_id: int | None = None, usuario_id: int | None = None) -> Assinante:
+        self._loop = asyncio.get_running_loop()
+        assinante = Assinante(livro_id, usuario_id, settings.EVENTOS_TAMANHO_FILA)
+        with self._lock:
+            self._assinantes.add(assinante)
+        return assinante
+
+    def cancelar(self, assinante: Assinante) -> None:
+        with self._lock:
+            self._assinantes.discard(assinante)
+
+    def publicar(self, eventos: list[dict]) -> None:
+        if self._loop is None or not eventos:
+            return
+        with self._lock:
+            assinantes = list(self._assinantes)
+        for assinante in assinantes:
+            for evento in eventos:
+                if assinante.aceita(evento):
+                    self._loop.call_soon_threadsafe(assinante.entregar, evento)
+
+    def _mudou(self, chave: tuple[str, int], estado: tuple) -> bool:
+        if self._ultimos.get(chave) == estado:
+            return False
+        self._ultimos[chave] = estado
+        self._ultimos.move_to_end(chave)
+        while len(self._ultimos) > settings.EVENTOS_MEMORIA:
+            self._ultimos.popitem(last=False)
+        return True
+
+    def _montar_eventos(self, db: Session, alteracoes) -> list[dict]:
+        # Posição da última alteração de cada registro, para publicar na ordem do log
+        posicoes: dict[tuple[str, int], int] = {}
+        for alteracao_id, tabela, registro_id, operacao in alteracoes:
+            # Exclusões e arquivamentos nunca geraram evento; a linha também já não existe para ser lida
+            if operacao not in (TipoAlteracao.EXCLUSAO, TipoAlteracao.ARQUIVAMENTO):
+                posicoes[(tabela, registro_id)] = alteracao_id
+        ids: dict[str, list[int]] = {}
+        for tabela, registro_id in posicoes:
+            ids.setdefault(tabela, []).append(registro_id)
+
+        eventos = []
+        if ids.get(Livro.__tablename__):
+            for livro_id, quantidade in db.execute(
+                select(Livro.id, Livro.quantidade_disponivel).where(Livro.id.in_(ids[Livro.__tablename__]))
+            ):
+                if self._mudou(("livro", livro_id), (quantidade,)):
+                    eventos.append((posicoes[(Livro.__tablename__, livro_id)], {
+                        "tipo": "livro.disponibilidade",
+                        "livro_id": livro_id,
+                        "quantidade_disponivel": quantidade,
+                    }))
+        for modelo, tipo, campo_id in (
+            (Emprestimo, "emprestimo.status", "emprestimo_id"),
+            (Reserva, "reserva.status", "reserva_id"),
+        ):
+            if not ids.get(modelo.__tablename__):
+                continue
+            for registro_id, livro_id, usuario_id, situacao in db.execute(
+                select(modelo.id, modelo.livro_id, modelo.usuario_id, modelo.status)
+                .where(modelo.id.in_(ids[modelo.__tablename__]))
+            ):
+                if self._mudou((tipo, registro_id), (situacao,)):
+                    eventos.append((posicoes[(modelo.__tablename__, registro_id)], {
+                        "tipo": tipo,
+                        campo_id: registro_id,
+                        "livro_id": livro_id,
+                        "usuario_id": usuario_id,
+                        "status": situacao.value,
+                    }))
+        eventos.sort(key=lambda item: item[0])
+        return [evento for _, evento in eventos]
+
+    def acompanhar(self, db: Session) -> int:
+        """Publica o que foi confirmado depois do cursor, por qualquer processo."""
+        publicadas = 0
+        tabelas = (Livro.__tablename__, Emprestimo.__tablename__, Reserva.__tablename__)
+        while True:
+            if self.cursor is None or not self._assinantes:
+                # Sem assinantes não há para quem publicar: só acompanha o fim do log
+                self.cursor = ultima_alteracao(db)
+                db.commit()
+                break
+            alteracoes = alteracoes_desde(db, self.cursor, tabelas)
+            if not alteracoes:
+                break
+            self.publicar(self._montar_eventos(db, alteracoes))
+            self.cursor = alteracoes[-1][0]
+            db.commit()
+            publicadas += len(alteracoes)
+        return publicadas
+
+    def _acompanhar_nova_sessao(self, session_factory) -> None:
+        db = session_factory()
+        try:
+            self.acompanhar(db)
+        finally:
+            db.close()
+
+    async def acompanhar_periodicamente(self, session_factory, intervalo: float) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self._acompanhar_nova_sessao, session_factory)
+            except Exception:
+                # Banco fora do ar, por exemplo: tenta de novo no próximo intervalo
+                logger.exception("Eventos: falha ao ler o log de alterações")
+            await asyncio.sleep(intervalo)
+
+hub_eventos = HubEventos()
@@ -0,0 +1,92 @@
+from typing import Callable
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+
+from app.models import Categoria, Livro, Emprestimo, Reserva, Multa, TipoAlteracao
+from app.services.alteracoes import registrar_alteracoes
+from app.services.auditoria import registrar_auditoria
+from app.services.circulacao import registrar_exclusao
+from app.services.resumos import invalidar_resumo
+import settings
+
+def _dependentes(livro_ids: list[int]):
+    # (modelo, consulta de (id, usuario_id) das linhas que referenciam os livros),
+    # na ordem em que as chaves estrangeiras permitem apagar
+    return [
+        (Multa, select(Multa.id, Emprestimo.usuario_id)
+            .join(Emprestimo, Emprestimo.id == Multa.emprestimo_id)
+            .where(Emprestimo.livro_id.in_(livro_ids))),
+        (Emprestimo, select(Emprestimo.id, Emprestimo.usuario_id)
+            .where(Emprestimo.livro_id.in_(livro_ids))),
+        (Reserva, select(Reserva.id, Reserva.usuario_id)
+            .where(Reserva.livro_id.in_(livro_ids))),
+    ]
+
+def contar_categoria(db: Session, categoria_id: int) -> dict:
+    """Quantas linhas de cada tabela excluir_categoria apagaria, só com COUNT."""
+    livros = select(Livro.id).where(Livro.categoria_id == categoria_id)
+    emprestimos = select(Emprestimo.id).where(Emprestimo.livro_id.in_(livros))
+    return {
+        "categorias": db.scalar(select(func.count()).where(Categoria.id == categoria_id)),
+        "livros": db.scalar(select(func.count()).select_from(Livro).where(Livro.categoria_id == categoria_id)),
+        "emprestimos": db.scalar(select(func.count()).select_from(Emprestimo).where(Emprestimo.livro_id.in_(livros))),
+        "reservas": db.scalar(select(func.count()).select_from(Reserva).where(Reserva.livro_id.in_(livros))),
+        "multas": db.scalar(select(func.count()).select_from(Multa).where(Multa.emprestimo_id.in_(emprestimos))),
+    }
+
+def _excluir_em_lotes(db: Session, modelo, consulta, tamanho_lote: int) -> int:
+    total = 0
+    while True:
+        linhas = db.execute(consulta.order_by(modelo.id).limit(tamanho_lote)).all()
+        if not linhas:
+            return total
+        ids = [linha[0] for linha in linhas]
+        if modelo is Emprestimo:
+            # Os agregados de circulação desses dias precisam ser refeitos sem eles
+            registrar_exclusao(db, ids)
+        db.execute(delete(modelo).where(modelo.id.in_(ids)))
+        registrar_alteracoes(db, modelo.__tablename__, ids, TipoAlteracao.EXCLUSAO)
+        for registro_id in ids:
+            registrar_auditoria(db, modelo.__tablename__, registro_id, TipoAlteracao.EXCLUSAO, None)
+        invalidar_resumo(db, {linha[1] for linha in linhas})
+        # Cada lote confirmado separadamente, como no arquivamento
+        db.commit()
+        total += len(ids)
+
+def excluir_categoria(
+    db: Session, categoria_id: int, tamanho_lote: int = settings.EXCLUSAO_TAMANHO_LOTE,
+    progresso: Callable | None = None
+) -> dict:
+    """Apaga a categoria e tudo que depende dela com DELETEs por conjunto.
+
+    Substitui a cascata do ORM, que carregava cada livro, empréstimo, reserva e
+    multa na sessão e apagava uma linha por vez. Os lotes são confirmados um a
+    um: se a execução for interrompida, chamar de novo continua de onde parou.
+    """
+    apagadas = {"multas": 0, "emprestimos": 0, "reservas": 0, "livros": 0, "categorias": 0}
+    total = sum(contar_categoria(db, categoria_id).values()) if progresso is not None else None
+    while True:
+        livro_ids = db.scalars(
+            select(Livro.id)
+            .where(Livro.categoria_id == categoria_id)
+            .order_by(Livro.id)
+            .limit(tamanho_lote)
+        ).all()
+        if not livro_ids:
+            break
+        for modelo, consulta in _dependentes(livro_ids):
+            apagadas[modelo.__tablename__] += _excluir_em_lotes(db, modelo, consulta, tamanho_lote)
+
+        db.execute(delete(Livro).where(Livro.id.in_(livro_ids)))
+        registrar_alteracoes(db, Livro.__tablename__, livro_ids, TipoAlteracao.EXCLUSAO)
+        db.commit()
+        apagadas["livros"] += len(livro_ids)
+        if progresso is not None:
+            progresso(sum(apagadas.values()), total)
+
+    resultado = db.execute(delete(Categoria).where(Categoria.id == categoria_id))
+    registrar_alteracoes(db, Categoria.__tablename__, [categoria_id], TipoAlteracao.EXCLUSAO)
+    db.commit()
+    apagadas["categorias"] = resultado.rowcount
+    return apagadas
@@ -0,0 +1,44 @@
+import re
+from pathlib import Path
+
+from sqlalchemy import text
+
+from database import engine, Base, criar_banco_se_necessario
+
+DIRETORIO_ALEMBIC = Path(__file__).resolve().parents[2] / "alembic"
+
+def revisao_head() -> str:
+    # Lê só os cabeçalhos das migrações: importar o Alembic custaria mais que a consulta
+    revisoes = set()
+    anteriores = set()
+    for arquivo in (DIRETORIO_ALEMBIC / "versions").glob("*.py"):
+        conteudo = arquivo.read_text(encoding="utf-8")
+        revisao = re.search(r"^revision: str = '(\w+)'", conteudo, re.M)
+        anterior = re.search(r"^down_revision: .*= '(\w+)'", conteudo, re.M)
+        if revisao:
+            revisoes.add(revisao.group(1))
+        if anterior:
+            anteriores.add(anterior.group(1))
+
+    heads = revisoes - anteriores
+    if len(heads) != 1:
+        raise RuntimeError(f"Esperada uma única revisão head, encontradas: {sorted(heads)}")
+    return heads.pop()
+
+def verificar_revisao() -> None:
+    esperada = revisao_head()
+    with engine.connect() as conexao:
+        atual = conexao.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    if atual != esperada:
+        raise RuntimeError(
+            f"Banco na revisão {atual}, esperada {esperada}; rode 'alembic upgrade head'"
+        )
+
+def preparar_banco(modo: str) -> None:
+    if modo == "criar_tabelas":
+        criar_banco_se_necessario()
+        Base.metadata.create_all(bind=engine)
+    elif modo == "verificar_revisao":
+        verificar_revisao()
+    elif modo != "nenhum":
+        raise ValueError(f"MODO_STARTUP inválido: {modo}")
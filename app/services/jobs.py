@@ -0,0 +1,412 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable
+
+from pydantic import BaseModel, Field
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, limitar_pool
+from app.models import Job, StatusJob
+from app.services import arquivamento, circulacao, lembretes, particoes, recomendacoes
+from app.services.auditoria import gravador_auditoria
+import settings
+
+logger = logging.getLogger(__name__)
+
+class JobCancelado(Exception):
+    """Levantada pelo progresso quando o cancelamento do job foi pedido."""
+
+class TipoJob:
+    def __init__(self, funcao: Callable, parametros: type[BaseModel]):
+        self.funcao = funcao
+        self.parametros = parametros
+
+TIPOS_JOB: dict[str, TipoJob] = {}
+
+def tipo_job(nome: str, parametros: type[BaseModel]):
+    """Registra uma operação como tipo de job.
+
+    A função recebe (db, parametros, progresso) e devolve o resultado, gravado
+    como JSON no job. progresso(feitos, total=None, mensagem=None) deve ser
+    chamado entre lotes já confirmados: é ali que o cancelamento interrompe
+    a execução.
+    """
+    def registrar(funcao):
+        TIPOS_JOB[nome] = TipoJob(funcao, parametros)
+        return funcao
+    return registrar
+
+class Progresso:
+    def __init__(self, session_factory, job_id: int, intervalo: float):
+        self._session_factory = session_factory
+        self.job_id = job_id
+        self.intervalo = intervalo
+        self._proxima = 0.0
+
+    def __call__(self, feitos: int, total: int | None = None, mensagem: str | None = None) -> None:
+        # Limitado a uma escrita por intervalo; o mesmo UPDATE confere o cancelamento
+        agora = time.monotonic()
+        if agora < self._proxima:
+            return
+        self._proxima = agora + self.intervalo
+        valores = {"progresso": feitos, "data_atualizacao": datetime.utcnow()}
+        if total is not None:
+            valores["total"] = total
+        if mensagem is not None:
+            valores["mensagem"] = mensagem[:255]
+        # Sessão própria: o progresso não entra na transação do job
+        db = self._session_factory()
+        try:
+            resultado = db.execute(
+                update(Job)
+                .where(Job.id == self.job_id, Job.cancelamento_solicitado.is_(False))
+                .values(**valores)
+            )
+            db.commit()
+        finally:
+            db.close()
+        if resultado.rowcount == 0:
+            raise JobCancelado()
+
+def _como_json(resultado):
+    # datas e Decimal viram texto
+    return json.loads(json.dumps(resultado, default=str))
+
+def _finalizar(db: Session, job_id: int, status_final: StatusJob, **valores) -> None:
+    agora = datetime.utcnow()
+    db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == StatusJob.EXECUTANDO)
+        .values(status=status_final, data_fim=agora, data_atualizacao=agora, **valores)
+    )
+    db.commit()
+
+def _inicializar_processo() -> None:
+    # Conexões e a thread da auditoria herdadas no fork não servem no filho;
+    # o pool fixo é o que servidor.py desconta do limite do MySQL
+    limitar_pool(settings.JOBS_CONEXOES_POR_PROCESSO)
+    gravador_auditoria.apos_fork()
+
+def _executar_job(job_id: int) -> None:
+    # Roda num processo do pool
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        tipo = TIPOS_JOB[job.tipo]
+        parametros = tipo.parametros(**job.parametros)
+        progresso = Progresso(SessionLocal, job_id, settings.JOBS_PROGRESSO_INTERVALO_SEGUNDOS)
+        db.commit()
+        try:
+            resultado = tipo.funcao(db, parametros, progresso)
+        except JobCancelado:
+            db.rollback()
+            _finalizar(db, job_id, StatusJob.CANCELADO)
+            return
+        except Exception:
+            db.rollback()
+            logger.exception("Job %d (%s) falhou", job_id, job.tipo)
+            _finalizar(db, job_id, StatusJob.FALHOU, erro=traceback.format_exc())
+            return
+        _finalizar(db, job_id, StatusJob.CONCLUIDO, resultado=_como_json(resultado))
+    finally:
+        db.close()
+
+class ExecutorJobs:
+    """Executa os jobs pendentes num pool de processos próprio.
+
+    Um despachante (thread) reivindica os jobs PENDENTE com um UPDATE
+    condicional no status e os entrega ao pool, até `processos` ao mesmo
+    tempo. Os processos do pool não atendem requisições: um job pesado não
+    segura um worker do uvicorn nem disputa o GIL com ele.
+
+    Vários executores podem dividir o mesmo banco (um por worker, com
+    JOBS_NA_API): cada job reivindicado guarda o executor dono (host:pid), e
+    o despachante renova data_batimento dos seus jobs a cada intervalo. Um
+    job EXECUTANDO só passa a FALHOU quando o batimento dele tem mais de
+    JOBS_BATIMENTO_LIMITE_SEGUNDOS, ou seja, quando o dono parou; jobs de
+    outro executor vivo seguem rodando.
+    """
+
+    def __init__(self, processos: int, intervalo: float):
+        self.processos = processos
+        self.intervalo = intervalo
+        self._session_factory = SessionLocal
+        self._pool: ProcessPoolExecutor | None = None
+        self._thread: threading.Thread | None = None
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._em_execucao: dict[int, Future] = {}
+        self.identificador = ""
+
+    @property
+    def ativo(self) -> bool:
+        return self._thread is not None
+
+    def iniciar(self, session_factory=SessionLocal) -> None:
+        if self._thread is not None:
+            return
+        self._session_factory = session_factory
+        # Depois do fork: cada processo executor tem o próprio pid
+        self.identificador = f"{socket.gethostname()}:{os.getpid()}"[:100]
+        self._recuperar_interrompidos(inicio=True)
+        self._pool = self._criar_pool()
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name="jobs", daemon=True)
+        self._thread.start()
+
+    def encerrar(self, tempo_limite: float = settings.JOBS_ENCERRAMENTO_SEGUNDOS) -> None:
+        if self._thread is None:
+            return
+        self._parar.set()
+        self._acordar.set()
+        self._thread.join(tempo_limite)
+        self._thread = None
+        with self._lock:
+            em_execucao = list(self._em_execucao)
+        if em_execucao:
+            # Param no próximo progresso, entre lotes já confirmados
+            db = self._session_factory()
+            try:
+                db.execute(update(Job).where(Job.id.in_(em_execucao)).values(cancelamento_solicitado=True))
+                db.commit()
+            finally:
+                db.close()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+
+    def notificar(self) -> None:
+        # Chamado ao criar um job: despacha sem esperar o intervalo
+        self._acordar.set()
+
+    def _criar_pool(self) -> ProcessPoolExecutor:
+        metodos = multiprocessing.get_all_start_methods()
+        contexto = multiprocessing.get_context("fork" if "fork" in metodos else None)
+        return ProcessPoolExecutor(self.processos, mp_context=contexto, initializer=_inicializar_processo)
+
+    def _recuperar_interrompidos(self, inicio: bool = False) -> None:
+        """Marca FALHOU os jobs em execução cujo executor parou de dar sinal.
+
+        No início, os jobs com o identificador deste executor também contam:
+        são de um processo anterior que tinha o mesmo pid.
+        """
+        limite = datetime.utcnow() - timedelta(seconds=settings.JOBS_BATIMENTO_LIMITE_SEGUNDOS)
+        # Jobs reivindicados antes do batimento existir só têm data_atualizacao
+        abandonado = func.coalesce(Job.data_batimento, Job.data_atualizacao) < limite
+        if inicio:
+            abandonado = or_(abandonado, Job.executor == self.identificador)
+        db = self._session_factory()
+        try:
+            agora = datetime.utcnow()
+            resultado = db.execute(
+                update(Job)
+                .where(Job.status == StatusJob.EXECUTANDO, abandonado)
+                .values(
+                    status=StatusJob.FALHOU, data_fim=agora, data_atualizacao=agora,
+                    erro="Interrompido: o executor parou durante a execução"
+                )
+            )
+            db.commit()
+            if resultado.rowcount:
+                logger.warning("Jobs: %d jobs de executores parados marcados como falha", resultado.rowcount)
+        finally:
+            db.close()
+
+    def _bater(self) -> None:
+        with self._lock:
+            em_execucao = list(self._em_execucao)
+        if not em_execucao:
+            return
+        db = self._session_factory()
+        try:
+            db.execute(
+                update(Job)
+                .where(Job.id.in_(em_execucao), Job.executor == self.identificador)
+                .values(data_batimento=datetime.utcnow())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _executar(self) -> None:
+        proximo_batimento = 0.0
+        while not self._parar.is_set():
+            try:
+                if time.monotonic() >= proximo_batimento:
+                    # Notificações acordam o laço a toda hora; o batimento segue o intervalo
+                    proximo_batimento = time.monotonic() + self.intervalo
+                    self._bater()
+                    self._recuperar_interrompidos()
+                self._despachar()
+            except Exception:
+                # Banco fora do ar, por exemplo: tenta de novo no próximo intervalo
+                logger.exception("Jobs: falha ao despachar")
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+
+    def _despachar(self) -> None:
+        with self._lock:
+            livres = self.processos - len(self._em_execucao)
+        if livres <= 0:
+            return
+        db = self._session_factory()
+        try:
+            candidatos = db.scalars(
+                select(Job.id).where(Job.status == StatusJob.PENDENTE).order_by(Job.id).limit(livres)
+            ).all()
+            for job_id in candidatos:
+                agora = datetime.utcnow()
+                resultado = db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == StatusJob.PENDENTE)
+                    .values(
+                        status=StatusJob.EXECUTANDO, data_inicio=agora, data_atualizacao=agora,
+                        executor=self.identificador, data_batimento=agora
+                    )
+                )
+                db.commit()
+                if resultado.rowcount == 0:
+                    # Cancelado entre o SELECT e o UPDATE
+                    continue
+                with self._lock:
+                    try:
+                        futuro = self._pool.submit(_executar_job, job_id)
+                    except BrokenProcessPool:
+                        # Um processo do pool morreu (OOM, sinal): o pool inteiro é descartado
+                        self._pool = self._criar_pool()
+                        futuro = self._pool.submit(_executar_job, job_id)
+                    self._em_execucao[job_id] = futuro
+                futuro.add_done_callback(partial(self._terminado, job_id))
+        finally:
+            db.close()
+
+    def _terminado(self, job_id: int, futuro: Future) -> None:
+        with self._lock:
+            self._em_execucao.pop(job_id, None)
+        if futuro.cancelled():
+            # Nem começou (encerramento): volta para a fila do próximo executor
+            self._atualizar(job_id, status=StatusJob.PENDENTE, data_inicio=None, executor=None, data_batimento=None)
+        elif futuro.exception() is not None:
+            # O processo morreu: o próprio job não registrou o fim
+            logger.error("Job %d: %r", job_id, futuro.exception())
+            self._atualizar(
+                job_id, status=StatusJob.FALHOU, data_fim=datetime.utcnow(), erro=repr(futuro.exception())
+            )
+        self._acordar.set()
+
+    def _atualizar(self, job_id: int, **valores) -> None:
+        db = self._session_factory()
+        try:
+            db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == StatusJob.EXECUTANDO)
+                .values(data_atualizacao=datetime.utcnow(), **valores)
+            )
+            db.commit()
+        except Exception:
+            logger.exception("Jobs: falha ao atualizar o job %d", job_id)
+        finally:
+            db.close()
+
+    def executar_ate_sinal(self) -> None:
+        # Para rodar fora da API (python -m app.services.jobs ou servidor.py)
+        parar = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: parar.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: parar.set())
+        self.iniciar()
+        parar.wait()
+        self.encerrar()
+
+executor_jobs = ExecutorJobs(settings.JOBS_PROCESSOS, settings.JOBS_INTERVALO_SEGUNDOS)
+
+def solicitar_cancelamento(db: Session, job: Job) -> bool:
+    """Cancela um job pendente ou pede o cancelamento de um em execução.
+
+    Devolve False quando o job já terminou.
+    """
+    agora = datetime.utcnow()
+    resultado = db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status == StatusJob.PENDENTE)
+        .values(status=StatusJob.CANCELADO, data_fim=agora, data_atualizacao=agora)
+    )
+    if resultado.rowcount == 0:
+        # Já em execução: o job para no próximo progresso
+        resultado = db.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status == StatusJob.EXECUTANDO)
+            .values(cancelamento_solicitado=True, data_atualizacao=agora)
+        )
+    db.commit()
+    db.refresh(job)
+    return resultado.rowcount > 0
+
+class ParametrosArquivamento(BaseModel):
+    idade_dias: int = Field(default=settings.ARQUIVAMENTO_IDADE_DIAS, gt=0)
+    tamanho_lote: int = Field(default=settings.ARQUIVAMENTO_TAMANHO_LOTE, gt=0)
+    max_lotes: int | None = Field(default=None, gt=0)
+
+@tipo_job("arquivamento", ParametrosArquivamento)
+def _arquivamento(db: Session, parametros: ParametrosArquivamento, progresso: Progresso) -> dict:
+    return arquivamento.arquivar(
+        db, parametros.idade_dias, parametros.tamanho_lote, parametros.max_lotes, progresso
+    )
+
+class ParametrosCirculacao(BaseModel):
+    dias_por_lote: int = Field(default=settings.CIRCULACAO_DIAS_POR_LOTE, gt=0)
+
+@tipo_job("circulacao", ParametrosCirculacao)
+def _circulacao(db: Session, parametros: ParametrosCirculacao, progresso: Progresso) -> dict:
+    return circulacao.atualizar(db, parametros.dias_por_lote, progresso)
+
+class ParametrosLembretes(BaseModel):
+    dias: int = Field(default=settings.LEMBRETES_DIAS_ANTECEDENCIA, gt=0)
+    concorrencia: int = Field(default=settings.LEMBRETES_CONCORRENCIA, gt=0)
+
+@tipo_job("lembretes", ParametrosLembretes)
+def _lembretes(db: Session, parametros: ParametrosLembretes, progresso: Progresso) -> dict:
+    return asyncio.run(lembretes.enviar_lembretes(
+        SessionLocal, parametros.dias, concorrencia=parametros.concorrencia, progresso=progresso
+    ))
+
+class ParametrosParticoes(BaseModel):
+    meses_futuros: int = Field(default=settings.PARTICOES_MESES_FUTUROS, ge=0)
+
+@tipo_job("particoes", ParametrosParticoes)
+def _particoes(db: Session, parametros: ParametrosParticoes, progresso: Progresso) -> dict:
+    # Cada REORGANIZE PARTITION é atômico: o cancelamento vale entre uma tabela e outra
+    criadas = {}
+    for feitas, tabela in enumerate(sorted(particoes.TABELAS)):
+        progresso(feitas, len(particoes.TABELAS), f"Rotacionando {tabela}")
+        criadas[tabela] = particoes.rotacionar(db.connection(), tabela, parametros.meses_futuros)
+    return criadas
+
+class ParametrosRecomendacoes(BaseModel):
+    processos: int = Field(default=settings.RECOMENDACOES_PROCESSOS, ge=0)
+
+@tipo_job("recomendacoes", ParametrosRecomendacoes)
+def _recomendacoes(db: Session, parametros: ParametrosRecomendacoes, progresso: Progresso) -> dict:
+    return recomendacoes.gerar_arquivo(db, settings.RECOMENDACOES_ARQUIVO, parametros.processos, progresso)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa os jobs pendentes fora da API")
+    parser.add_argument("--processos", type=int, default=settings.JOBS_PROCESSOS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    executor_jobs.processos = args.processos
+    executor_jobs.executar_ate_sinal()
@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import logging
+import smtplib
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Callable
+
+from sqlalchemy import select, insert, delete, exists, and_, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from app.models import Emprestimo, StatusEmprestimo, Usuario, Livro, LembreteEnviado
+import settings
+
+logger = logging.getLogger(__name__)
+
+ASSUNTO = 'Lembrete: devolução de "{titulo}" até {prazo}'
+
+CORPO = """Olá, {nome}.
+
+O livro "{titulo}", emprestado em {emprestimo}, deve ser devolvido até {prazo}.
+Devoluções em atraso geram multa por dia.
+
+Biblioteca
+"""
+
+def _consulta_lote(inicio: datetime, fim: datetime, depois: tuple | None, tamanho_lote: int):
+    # Keyset por (data_devolucao_prevista, id): o índice idx_emprestimo_status
+    # (status, data_devolucao_prevista) já entrega as linhas nessa ordem
+    consulta = (
+        select(
+            Emprestimo.id, Emprestimo.data_emprestimo, Emprestimo.data_devolucao_prevista,
+            Usuario.nome_completo, Usuario.email, Livro.titulo
+        )
+        .join(Usuario, Usuario.id == Emprestimo.usuario_id)
+        .join(Livro, Livro.id == Emprestimo.livro_id)
+        .where(
+            Emprestimo.status == StatusEmprestimo.ATIVO,
+            Emprestimo.data_devolucao_prevista >= inicio,
+            Emprestimo.data_devolucao_prevista < fim,
+            Usuario.ativo.is_(True),
+            ~exists().where(
+                LembreteEnviado.emprestimo_id == Emprestimo.id,
+                LembreteEnviado.data_devolucao_prevista == Emprestimo.data_devolucao_prevista,
+            ),
+        )
+    )
+    if depois is not None:
+        prevista, emprestimo_id = depois
+        consulta = consulta.where(or_(
+            Emprestimo.data_devolucao_prevista > prevista,
+            and_(Emprestimo.data_devolucao_prevista == prevista, Emprestimo.id > emprestimo_id),
+        ))
+    return consulta.order_by(Emprestimo.data_devolucao_prevista, Emprestimo.id).limit(tamanho_lote)
+
+def _reservar_lote(session_factory, inicio: datetime, fim: datetime, depois: tuple | None, tamanho_lote: int):
+    """Lê o próximo lote e grava os lembretes antes do envio.
+
+    A gravação prévia é o que impede mensagens duplicadas: a restrição única
+    (emprestimo_id, data_devolucao_prevista) barra outro envio simultâneo.
+    Devolve (chave do último empréstimo lido, linhas reservadas), ou
+    (None, []) quando acabou.
+    """
+    db = session_factory()
+    try:
+        linhas = db.execute(_consulta_lote(inicio, fim, depois, tamanho_lote)).all()
+        if not linhas:
+            return None, []
+        agora = datetime.utcnow()
+        registros = [
+            {
+                "emprestimo_id": linha.id,
+                "data_devolucao_prevista": linha.data_devolucao_prevista,
+                "email": linha.email,
+                "data_envio": agora,
+            }
+            for linha in linhas
+        ]
+        ultima = (linhas[-1].data_devolucao_prevista, linhas[-1].id)
+        try:
+            db.execute(insert(LembreteEnviado), registros)
+            db.commit()
+            return ultima, linhas
+        except IntegrityError:
+            # Outro envio reservou parte do lote ao mesmo tempo: reserva um a um
+            db.rollback()
+        reservadas = []
+        for linha, registro in zip(linhas, registros):
+            try:
+                db.execute(insert(LembreteEnviado).values(**registro))
+                db.commit()
+                reservadas.append(linha)
+            except IntegrityError:
+                db.rollback()
+        return ultima, reservadas
+    finally:
+        db.close()
+
+def _liberar(session_factory, linhas: list) -> None:
+    # Envios que falharam voltam a ser elegíveis na próxima execução
+    db = session_factory()
+    try:
+        db.execute(delete(LembreteEnviado).where(
+            tuple_(LembreteEnviado.emprestimo_id, LembreteEnviado.data_devolucao_prevista).in_(
+                [(linha.id, linha.data_devolucao_prevista) for linha in linhas]
+            )
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+def montar_mensagem(linha, remetente: str = settings.SMTP_REMETENTE) -> EmailMessage:
+    campos = {
+        "nome": linha.nome_completo,
+        "titulo": linha.titulo,
+        "emprestimo": linha.data_emprestimo.strftime("%d/%m/%Y"),
+        "prazo": linha.data_devolucao_prevista.strftime("%d/%m/%Y"),
+    }
+    mensagem = EmailMessage()
+    mensagem["From"] = remetente
+    mensagem["To"] = linha.email
+    mensagem["Subject"] = ASSUNTO.format(**campos)
+    mensagem.set_content(CORPO.format(**campos))
+    return mensagem
+
+class EnviadorSMTP:
+    """Uma conexão SMTP reaproveitada entre as mensagens de uma tarefa de envio."""
+
+    def __init__(self, host: str, porta: int):
+        self.host = host
+        self.porta = porta
+        self._conexao: smtplib.SMTP | None = None
+
+    def _conectar(self) -> smtplib.SMTP:
+        conexao = smtplib.SMTP(self.host, self.porta, timeout=settings.SMTP_TIMEOUT_SEGUNDOS)
+        if settings.SMTP_STARTTLS:
+            conexao.starttls()
+        if settings.SMTP_USUARIO:
+            conexao.login(settings.SMTP_USUARIO, settings.SMTP_SENHA)
+        return conexao
+
+    def enviar(self, mensagem: EmailMessage) -> None:
+        if self._conexao is None:
+            self._conexao = self._conectar()
+        try:
+            self._conexao.send_message(mensagem)
+        except smtplib.SMTPServerDisconnected:
+            # O servidor fechou a conexão ociosa: reconecta uma vez
+            self._conexao = self._conectar()
+            self._conexao.send_message(mensagem)
+
+    def fechar(self) -> None:
+        if self._conexao is None:
+            return
+        try:
+            self._conexao.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._conexao = None
+
+async def enviar_lembretes(
+    session_factory=SessionLocal,
+    dias: int = settings.LEMBRETES_DIAS_ANTECEDENCIA,
+    tamanho_lote: int = settings.LEMBRETES_TAMANHO_LOTE,
+    concorrencia: int = settings.LEMBRETES_CONCORRENCIA,
+    host: str = settings.SMTP_HOST,
+    porta: int = settings.SMTP_PORTA,
+    progresso: Callable | None = None
+) -> dict:
+    """Envia um lembrete para cada empréstimo ativo que vence nos próximos dias.
+
+    Os lotes são lidos e reservados enquanto `concorrencia` tarefas enviam o
+    lote anterior, cada uma com sua conexão SMTP. A fila entre as duas partes
+    guarda no máximo um lote: com o SMTP lento, a leitura espera.
+    """
+    loop = asyncio.get_running_loop()
+    agora = datetime.utcnow()
+    fim = agora + timedelta(days=dias)
+    fila: asyncio.Queue = asyncio.Queue(maxsize=tamanho_lote)
+    # smtplib é bloqueante: um thread por conexão limita os envios simultâneos
+    executor = ThreadPoolExecutor(concorrencia, thread_name_prefix="smtp")
+    enviadores = [EnviadorSMTP(host, porta) for _ in range(concorrencia)]
+    falhas: list = []
+    contagem = {"reservados": 0, "enviados": 0}
+
+    async def enviar(enviador: EnviadorSMTP) -> None:
+        while True:
+            linha = await fila.get()
+            if linha is None:
+                return
+            try:
+                await loop.run_in_executor(executor, enviador.enviar, montar_mensagem(linha))
+                contagem["enviados"] += 1
+            except Exception as e:
+                logger.warning("Lembrete do empréstimo %d para %s não enviado: %s", linha.id, linha.email, e)
+                falhas.append(linha)
+
+    inicio = time.perf_counter()
+    tarefas = [asyncio.create_task(enviar(enviador)) for enviador in enviadores]
+    # Reservados que ainda não entraram na fila: se a execução parar, são liberados
+    nao_enfileirados: deque = deque()
+    reserva: asyncio.Future | None = None
+    try:
+        depois = None
+        while True:
+            # A thread da reserva não para com o cancelamento da tarefa: o shield
+            # mantém o resultado dela ao alcance do finally
+            reserva = asyncio.ensure_future(asyncio.to_thread(
+                _reservar_lote, session_factory, agora, fim, depois, tamanho_lote
+            ))
+            depois, lote = await asyncio.shield(reserva)
+            reserva = None
+            if depois is None:
+                break
+            contagem["reservados"] += len(lote)
+            nao_enfileirados.extend(lote)
+            while nao_enfileirados:
+                await fila.put(nao_enfileirados[0])
+                nao_enfileirados.popleft()
+            if progresso is not None:
+                await asyncio.to_thread(
+                    progresso, contagem["enviados"], None, f"{contagem['reservados']} lembretes reservados"
+                )
+    finally:
+        if reserva is not None:
+            # Cancelado durante a reserva: espera o commit dela para liberar o lote
+            try:
+                _, lote = await reserva
+                nao_enfileirados.extend(lote)
+            except Exception:
+                logger.exception("Lembretes: falha na reserva interrompida")
+        # O que já está na fila é enviado mesmo se a leitura parar (cancelamento, erro)
+        for _ in tarefas:
+            await fila.put(None)
+        await asyncio.gather(*tarefas)
+        for enviador in enviadores:
+            await loop.run_in_executor(executor, enviador.fechar)
+        executor.shutdown()
+        # Falhas de envio e reservas que não chegaram à fila voltam a ser elegíveis
+        liberar = falhas + list(nao_enfileirados)
+        if liberar:
+            await asyncio.to_thread(_liberar, session_factory, liberar)
+
+    duracao = time.perf_counter() - inicio
+    return {
+        "prazo_ate": fim,
+        "reservados": contagem["reservados"],
+        "enviados": contagem["enviados"],
+        "falhas": len(falhas),
+        "duracao_segundos": duracao,
+        "mensagens_por_segundo": contagem["enviados"] / duracao if duracao > 0 else 0.0,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Envia lembretes de devolução por e-mail")
+    parser.add_argument("--dias", type=int, default=settings.LEMBRETES_DIAS_ANTECEDENCIA)
+    parser.add_argument("--tamanho-lote", type=int, default=settings.LEMBRETES_TAMANHO_LOTE)
+    parser.add_argument("--concorrencia", type=int, default=settings.LEMBRETES_CONCORRENCIA)
+    parser.add_argument("--host", default=settings.SMTP_HOST)
+    parser.add_argument("--porta", type=int, default=settings.SMTP_PORTA)
+    args = parser.parse_args()
+
+    relatorio = asyncio.run(enviar_lembretes(
+        SessionLocal, args.dias, args.tamanho_lote, args.concorrencia, args.host, args.porta
+    ))
+    for chave, valor in relatorio.items():
+        print(f"{chave}: {valor}")
@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import logging
+from datetime import date, datetime
+from typing import NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from database import SessionLocal
+import settings
+
+logger = logging.getLogger(__name__)
+
+# Tabela -> coluna de particionamento (uma partição por mês)
+TABELAS = {
+    "emprestimos": "data_emprestimo",
+    "multas": "data_geracao",
+}
+
+# O InnoDB não aceita chave estrangeira em tabela particionada, nem apontando
+# para ela: ao particionar, estas saem do banco e ficam só no ORM, que já
+# confere as referências nas rotas e apaga os dependentes em cascata
+CHAVES_ESTRANGEIRAS = {
+    "emprestimos": [("usuario_id", "usuarios"), ("livro_id", "livros"), ("funcionario_id", "usuarios")],
+    "multas": [("emprestimo_id", "emprestimos")],
+}
+
+PARTICAO_FUTURO = "p_futuro"
+
+class Particao(NamedTuple):
+    nome: str
+    inicio: date | None
+    limite: date | None  # VALUES LESS THAN; None na partição MAXVALUE
+    linhas: int  # estimativa do information_schema
+
+def mes(dia: date) -> date:
+    return date(dia.year, dia.month, 1)
+
+def proximo_mes(dia: date) -> date:
+    return date(dia.year + dia.month // 12, dia.month % 12 + 1, 1)
+
+def nome_particao(inicio: date) -> str:
+    return f"p{inicio:%Y%m}"
+
+def _definicao(inicio: date) -> str:
+    return f"PARTITION {nome_particao(inicio)} VALUES LESS THAN ('{proximo_mes(inicio):%Y-%m-%d}')"
+
+def definicao_particoes(coluna: str, primeiro: date, ultimo: date) -> str:
+    """Cláusula PARTITION BY com um mês por partição, de primeiro a ultimo.
+
+    A primeira partição recebe também tudo que for anterior a ela, e
+    p_futuro (MAXVALUE) o que passar da última, para nenhum INSERT falhar
+    se a rotação atrasar.
+    """
+    definicoes = []
+    atual = mes(primeiro)
+    while atual <= ultimo:
+        definicoes.append(_definicao(atual))
+        atual = proximo_mes(atual)
+    definicoes.append(f"PARTITION {PARTICAO_FUTURO} VALUES LESS THAN (MAXVALUE)")
+    return f"PARTITION BY RANGE COLUMNS({coluna}) (\n    " + ",\n    ".join(definicoes) + "\n)"
+
+def _limite(descricao: str | None) -> date | None:
+    # RANGE COLUMNS guarda o limite como literal: '2026-11-01 00:00:00' ou MAXVALUE
+    if descricao is None or descricao == "MAXVALUE":
+        return None
+    return datetime.fromisoformat(descricao.strip("'")).date()
+
+def listar(conexao: Connection, tabela: str) -> list[Particao]:
+    """Partições da tabela em ordem; vazia quando a tabela não é particionada."""
+    if conexao.dialect.name != "mysql":
+        return []
+    linhas = conexao.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS"
+        " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabela AND PARTITION_NAME IS NOT NULL"
+        " ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"tabela": tabela}).all()
+    particoes = []
+    inicio = None
+    for nome, descricao, estimativa in linhas:
+        limite = _limite(descricao)
+        particoes.append(Particao(nome, inicio, limite, estimativa or 0))
+        inicio = limite
+    return particoes
+
+def particionada(conexao: Connection, tabela: str) -> bool:
+    return bool(listar(conexao, tabela))
+
+def _chaves_estrangeiras(conexao: Connection, tabela: str) -> list[tuple[str, str]]:
+    # (tabela dona, nome da restrição) das FKs da tabela e das que apontam para ela
+    return [tuple(linha) for linha in conexao.execute(text(
+        "SELECT DISTINCT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE"
+        " WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL"
+        " AND (TABLE_NAME = :tabela OR REFERENCED_TABLE_NAME = :tabela)"
+    ), {"tabela": tabela})]
+
+def particionar(conexao: Connection, tabela: str, meses_futuros: int = settings.PARTICOES_MESES_FUTUROS) -> int:
+    """Particiona a tabela por mês, do dado mais antigo até meses_futuros à frente.
+
+    Remove as FKs da tabela e as que apontam para ela e troca a chave
+    primária por (id, coluna): toda chave única de uma tabela particionada
+    precisa conter a coluna de particionamento. O id continua AUTO_INCREMENT
+    e único na prática; a busca só por id passa por todas as partições, pelo
+    prefixo da chave primária de cada uma. Reescreve a tabela inteira: rode
+    numa janela de manutenção. Devolve o número de partições mensais.
+    """
+    coluna = TABELAS[tabela]
+    for dona, restricao in _chaves_estrangeiras(conexao, tabela):
+        conexao.exec_driver_sql(f"ALTER TABLE {dona} DROP FOREIGN KEY {restricao}")
+
+    hoje = date.today()
+    mais_antiga = conexao.execute(text(f"SELECT MIN({coluna}) FROM {tabela}")).scalar()
+    primeiro = mes(mais_antiga.date() if mais_antiga else hoje)
+    ultimo = mes(hoje)
+    for _ in range(meses_futuros):
+        ultimo = proximo_mes(ultimo)
+    conexao.exec_driver_sql(
+        f"ALTER TABLE {tabela} DROP PRIMARY KEY, ADD PRIMARY KEY (id, {coluna})\n"
+        + definicao_particoes(coluna, primeiro, ultimo)
+    )
+    return len(listar(conexao, tabela)) - 1
+
+def desfazer(conexao: Connection, tabela: str) -> None:
+    """Volta a tabela ao formato original: sem partições, chave id e as FKs."""
+    conexao.exec_driver_sql(f"ALTER TABLE {tabela} REMOVE PARTITIONING")
+    conexao.exec_driver_sql(f"ALTER TABLE {tabela} DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    # Cada FK volta quando nem a tabela dona nem a referida continuam particionadas
+    for dona, chaves in CHAVES_ESTRANGEIRAS.items():
+        for coluna, referida in chaves:
+            if tabela not in (dona, referida) or particionada(conexao, dona) or particionada(conexao, referida):
+                continue
+            conexao.exec_driver_sql(
+                f"ALTER TABLE {dona} ADD CONSTRAINT {dona}_{coluna}_fk"
+                f" FOREIGN KEY ({coluna}) REFERENCES {referida} (id)"
+            )
+
+def rotacionar(conexao: Connection, tabela: str, meses_futuros: int = settings.PARTICOES_MESES_FUTUROS) -> list[str]:
+    """Cria as partições mensais que faltam até meses_futuros à frente.
+
+    As novas saem de p_futuro com REORGANIZE PARTITION; como a rotação
+    mantém p_futuro vazia, a operação não copia linhas. Devolve os nomes
+    criados; nada acontece em tabela não particionada.
+    """
+    particoes = listar(conexao, tabela)
+    if not particoes:
+        return []
+    ultimo_limite = max((particao.limite for particao in particoes if particao.limite), default=None)
+    alvo = mes(date.today())
+    for _ in range(meses_futuros):
+        alvo = proximo_mes(alvo)
+    novos = []
+    inicio = ultimo_limite or mes(date.today())
+    while inicio <= alvo:
+        novos.append(inicio)
+        inicio = proximo_mes(inicio)
+    if not novos:
+        return []
+    definicoes = [_definicao(inicio) for inicio in novos]
+    definicoes.append(f"PARTITION {PARTICAO_FUTURO} VALUES LESS THAN (MAXVALUE)")
+    conexao.exec_driver_sql(
+        f"ALTER TABLE {tabela} REORGANIZE PARTITION {PARTICAO_FUTURO} INTO ({', '.join(definicoes)})"
+    )
+    return [nome_particao(inicio) for inicio in novos]
+
+def nome_troca(tabela: str, particao: str) -> str:
+    return f"{tabela}_troca_{particao}"
+
+def tabelas_de_troca(conexao: Connection, tabela: str) -> list[tuple[str, str]]:
+    """(tabela de troca, partição) deixadas por um arquivamento interrompido."""
+    prefixo = f"{tabela}_troca_"
+    nomes = conexao.execute(text(
+        "SELECT TABLE_NAME FROM information_schema.TABLES"
+        " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME LIKE :padrao"
+    ), {"padrao": prefixo.replace("_", "\\_") + "%"}).scalars()
+    return [(nome, nome.removeprefix(prefixo)) for nome in nomes]
+
+def destacar(conexao: Connection, tabela: str, particao: str) -> str:
+    """Tira as linhas da partição da tabela quente, sem DELETE.
+
+    Cria uma tabela vazia com a mesma estrutura e troca-a com a partição
+    (EXCHANGE PARTITION só mexe em metadados). As linhas passam a morar na
+    tabela de troca, cujo nome é devolvido; a partição fica vazia.
+    """
+    troca = nome_troca(tabela, particao)
+    conexao.exec_driver_sql(f"CREATE TABLE {troca} LIKE {tabela}")
+    conexao.exec_driver_sql(f"ALTER TABLE {troca} REMOVE PARTITIONING")
+    conexao.exec_driver_sql(f"ALTER TABLE {tabela} EXCHANGE PARTITION {particao} WITH TABLE {troca}")
+    return troca
+
+def reanexar(conexao: Connection, tabela: str, particao: str) -> None:
+    """Desfaz destacar: as linhas da tabela de troca voltam para a partição."""
+    troca = nome_troca(tabela, particao)
+    conexao.exec_driver_sql(f"ALTER TABLE {tabela} EXCHANGE PARTITION {particao} WITH TABLE {troca}")
+    # Linhas gravadas na partição enquanto estava destacada vieram para a troca
+    conexao.exec_driver_sql(f"INSERT INTO {tabela} SELECT * FROM {troca}")
+    conexao.exec_driver_sql(f"DROP TABLE {troca}")
+
+def descartar(conexao: Connection, tabela: str, particao: str) -> None:
+    """Remove a partição (já vazia ou já arquivada) e a tabela de troca, se houver."""
+    conexao.exec_driver_sql(f"DROP TABLE IF EXISTS {nome_troca(tabela, particao)}")
+    if any(existente.nome == particao for existente in listar(conexao, tabela)):
+        conexao.exec_driver_sql(f"ALTER TABLE {tabela} DROP PARTITION {particao}")
+
+def rotacionar_todas(conexao: Connection, meses_futuros: int = settings.PARTICOES_MESES_FUTUROS) -> dict:
+    return {tabela: rotacionar(conexao, tabela, meses_futuros) for tabela in TABELAS}
+
+def _rotacionar_nova_conexao(session_factory) -> None:
+    db = session_factory()
+    try:
+        criadas = rotacionar_todas(db.connection())
+        if any(criadas.values()):
+            logger.info("Partições criadas: %s", criadas)
+    except Exception:
+        # Outro worker pode ter rotacionado ao mesmo tempo; tenta de novo no próximo intervalo
+        logger.exception("Falha ao rotacionar as partições")
+    finally:
+        db.close()
+
+async def rotacionar_periodicamente(session_factory, intervalo: float) -> None:
+    while True:
+        await asyncio.to_thread(_rotacionar_nova_conexao, session_factory)
+        await asyncio.sleep(intervalo)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Particionamento mensal de emprestimos e multas (MySQL)")
+    parser.add_argument("comando", choices=["listar", "rotacionar", "particionar", "desfazer"])
+    parser.add_argument("--tabela", choices=sorted(TABELAS), action="append",
+                        help="repita para mais de uma; padrão: todas")
+    parser.add_argument("--meses-futuros", type=int, default=settings.PARTICOES_MESES_FUTUROS)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        conexao = db.connection()
+        if conexao.dialect.name != "mysql":
+            parser.error("o particionamento só existe no MySQL")
+        for tabela in args.tabela or TABELAS:
+            if args.comando == "listar":
+                for particao in listar(conexao, tabela):
+                    print(f"{tabela:<12}{particao.nome:<10}{str(particao.limite or 'MAXVALUE'):<12}~{particao.linhas} linhas")
+            elif args.comando == "rotacionar":
+                print(f"{tabela}: {', '.join(rotacionar(conexao, tabela, args.meses_futuros)) or 'nada a criar'}")
+            elif args.comando == "particionar":
+                if particionada(conexao, tabela):
+                    print(f"{tabela}: já particionada")
+                else:
+                    print(f"{tabela}: {particionar(conexao, tabela, args.meses_futuros)} partições mensais")
+            else:
+                desfazer(conexao, tabela)
+                print(f"{tabela}: particionamento removido")
+    finally:
+        db.close()
@@ -0,0 +1,349 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from operator import itemgetter
+
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+from app.models import Emprestimo, EmprestimoArquivo, Job, StatusJob
+import settings
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalho do arquivo do índice: assinatura, k, marca e linhas (livros)
+_CABECALHO = struct.Struct("<8sIqq")
+_ASSINATURA = b"RECOMEN1"
+
+# Cestas (livros distintos de cada usuário) e o índice invertido livro -> cestas,
+# em formato CSR. Ficam em variáveis globais para os processos filhos herdarem.
+_CESTAS: tuple[array, array, array, array] | None = None
+
+def _inicializar_processo(cestas: tuple[array, array, array, array]) -> None:
+    global _CESTAS
+    _CESTAS = cestas
+
+def _vizinhos_particao(livro_ids: list[int], k: int) -> list[tuple[int, list[tuple[int, int]]]]:
+    livros, inicios, cestas_do_livro, inicios_livro = _CESTAS
+    resultado = []
+    for livro_id in livro_ids:
+        # Uma linha da matriz de coocorrência por vez: a memória não cresce com o catálogo
+        cestas = cestas_do_livro[inicios_livro[livro_id]:inicios_livro[livro_id + 1]]
+        linha = Counter(chain.from_iterable([livros[inicios[c]:inicios[c + 1]] for c in cestas]))
+        del linha[livro_id]
+        # sorted com itemgetter roda todo em C; nlargest ou um filtro por limiar
+        # fariam uma passada em Python sobre linhas que chegam a ter o catálogo inteiro
+        candidatos = sorted(linha.items(), key=itemgetter(1), reverse=True)
+        resultado.append((livro_id, candidatos[:k]))
+    return resultado
+
+def montar_cestas(pares, max_cesta: int) -> tuple[array, array, array, array]:
+    """Agrupa pares (usuario_id, livro_id) ordenados por usuário em cestas.
+
+    Cestas maiores que max_cesta (contas de teste, usuários institucionais)
+    ficam de fora: custam quadraticamente e pouco dizem sobre afinidade.
+    """
+    livros = array('i')
+    inicios = array('i', [0])
+    usuario_atual = None
+    cesta: list[int] = []
+
+    def fechar():
+        if 1 < len(cesta) <= max_cesta:
+            livros.extend(cesta)
+            inicios.append(len(livros))
+
+    for usuario_id, livro_id in pares:
+        if usuario_id != usuario_atual:
+            fechar()
+            usuario_atual = usuario_id
+            cesta = []
+        cesta.append(livro_id)
+    fechar()
+
+    # Índice invertido por ordenação por contagem
+    maior = max(livros, default=0)
+    contagem = array('i', [0]) * (maior + 2)
+    for livro_id in livros:
+        contagem[livro_id + 1] += 1
+    for livro_id in range(1, len(contagem)):
+        contagem[livro_id] += contagem[livro_id - 1]
+    inicios_livro = array('i', contagem)
+    cestas_do_livro = array('i', [0]) * len(livros)
+    proxima = array('i', contagem)
+    for cesta_id in range(len(inicios) - 1):
+        for posicao in range(inicios[cesta_id], inicios[cesta_id + 1]):
+            livro_id = livros[posicao]
+            cestas_do_livro[proxima[livro_id]] = cesta_id
+            proxima[livro_id] += 1
+    return livros, inicios, cestas_do_livro, inicios_livro
+
+class IndiceRecomendacoes:
+    """Vizinhos mais frequentes de cada livro ("quem pegou este também pegou").
+
+    Cada livro tem uma linha de tamanho fixo k em dois arrays paralelos
+    (vizinho, contagem), ordenada por contagem. A reconstrução completa
+    calcula a coocorrência exata em vários processos; entre reconstruções,
+    novos empréstimos só incrementam as linhas em memória, o que é
+    aproximado para vizinhos que ainda não estão na lista.
+
+    Na API, a reconstrução não roda no worker: o job "recomendacoes" a faz
+    no executor de jobs e grava RECOMENDACOES_ARQUIVO, que cada worker
+    carrega ao iniciar e sempre que o arquivo muda. Até lá, carregado fica
+    False e a rota responde 503.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._vizinhos = array('i')
+        self._contagens = array('i')
+        self._lock = threading.Lock()
+        # Uma atualização por vez: a tarefa periódica não se sobrepõe a si mesma
+        self._lock_atualizacao = threading.Lock()
+        self._versao_arquivo: int | None = None
+        self.marca = 0
+        self.construido_em = 0.0
+        self.carregado = False
+
+    def _garantir_tamanho(self, vizinhos: array, contagens: array, livro_id: int) -> None:
+        faltam = (livro_id + 1) * self.k - len(vizinhos)
+        if faltam > 0:
+            vizinhos.extend([0] * faltam)
+            contagens.extend([0] * faltam)
+
+    def construir(
+        self, pares, processos: int = 1, max_cesta: int = settings.RECOMENDACOES_MAX_CESTA, progresso=None
+    ) -> None:
+        cestas = montar_cestas(pares, max_cesta)
+        if progresso is not None:
+            progresso(1, 3, "Cestas montadas; calculando os vizinhos")
+        inicios_livro = cestas[3]
+        livro_ids = [
+            livro_id for livro_id in range(len(inicios_livro) - 1)
+            if inicios_livro[livro_id + 1] > inicios_livro[livro_id]
+        ]
+
+        if processos > 1 and livro_ids:
+            # Fork quando possível: os filhos herdam as cestas sem copiá-las
+            metodos = multiprocessing.get_all_start_methods()
+            contexto = multiprocessing.get_context("fork" if "fork" in metodos else None)
+            particoes = [livro_ids[i::processos] for i in range(processos)]
+            with ProcessPoolExecutor(
+                processos, mp_context=contexto,
+                initializer=_inicializar_processo, initargs=(cestas,)
+            ) as executor:
+                partes = executor.map(_vizinhos_particao, particoes, [self.k] * processos)
+                linhas = [linha for parte in partes for linha in parte]
+        else:
+            _inicializar_processo(cestas)
+            linhas = _vizinhos_particao(livro_ids, self.k)
+        _inicializar_processo(None)
+        if progresso is not None:
+            progresso(2, 3, "Vizinhos calculados; montando o índice")
+
+        vizinhos = array('i')
+        contagens = array('i')
+        self._garantir_tamanho(vizinhos, contagens, len(inicios_livro) - 2)
+        for livro_id, melhores in linhas:
+            base = livro_id * self.k
+            for deslocamento, (vizinho, contagem) in enumerate(melhores):
+                vizinhos[base + deslocamento] = vizinho
+                contagens[base + deslocamento] = contagem
+
+        with self._lock:
+            self._vizinhos = vizinhos
+            self._contagens = contagens
+            self.construido_em = time.time()
+            self.carregado = True
+
+    @staticmethod
+    def _consulta_pares(marca: int, usuarios: set[int] | None = None):
+        # Pares distintos da tabela quente (até a marca) e do arquivo
+        quente = select(Emprestimo.usuario_id, Emprestimo.livro_id).where(Emprestimo.id <= marca)
+        arquivo = select(EmprestimoArquivo.usuario_id, EmprestimoArquivo.livro_id)
+        if usuarios is not None:
+            quente = quente.where(Emprestimo.usuario_id.in_(usuarios))
+            arquivo = arquivo.where(EmprestimoArquivo.usuario_id.in_(usuarios))
+        return union(quente, arquivo)
+
+    def reconstruir(self, db: Session, processos: int = settings.RECOMENDACOES_PROCESSOS, progresso=None) -> None:
+        marca = db.scalar(select(Emprestimo.id).order_by(Emprestimo.id.desc()).limit(1)) or 0
+        pares = db.execute(
+            self._consulta_pares(marca)
+            .order_by("usuario_id")
+            .execution_options(yield_per=10000)
+        )
+        self.construir(pares, processos or os.cpu_count() or 1, progresso=progresso)
+        self.marca = marca
+
+    def _incrementar(self, livro_id: int, vizinho: int) -> None:
+        if (livro_id + 1) * self.k > len(self._vizinhos):
+            self._garantir_tamanho(self._vizinhos, self._contagens, livro_id)
+        base = livro_id * self.k
+        vizinhos, contagens = self._vizinhos, self._contagens
+        posicao = None
+        for deslocamento in range(self.k):
+            atual = vizinhos[base + deslocamento]
+            if atual == vizinho or atual == 0:
+                posicao = base + deslocamento
+                break
+        if posicao is None:
+            # Lista cheia e vizinho fora dela: fica para a próxima reconstrução
+            return
+        vizinhos[posicao] = vizinho
+        contagens[posicao] += 1
+        # Mantém a linha ordenada por contagem
+        while posicao > base and contagens[posicao] > contagens[posicao - 1]:
+            vizinhos[posicao], vizinhos[posicao - 1] = vizinhos[posicao - 1], vizinhos[posicao]
+            contagens[posicao], contagens[posicao - 1] = contagens[posicao - 1], contagens[posicao]
+            posicao -= 1
+
+    def atualizar_incremental(self, db: Session) -> int:
+        # A marca é o maior id de empréstimo já considerado; empréstimos só são inseridos
+        novos = db.execute(
+            select(Emprestimo.id, Emprestimo.usuario_id, Emprestimo.livro_id)
+            .where(Emprestimo.id > self.marca)
+            .order_by(Emprestimo.id)
+        ).all()
+        if not novos:
+            return 0
+
+        usuarios = {usuario_id for _, usuario_id, _ in novos}
+        anteriores: dict[int, set[int]] = {}
+        for usuario_id, livro_id in db.execute(self._consulta_pares(self.marca, usuarios)):
+            anteriores.setdefault(usuario_id, set()).add(livro_id)
+
+        with self._lock:
+            for _, usuario_id, livro_id in novos:
+                cesta = anteriores.setdefault(usuario_id, set())
+                if livro_id in cesta or len(cesta) >= settings.RECOMENDACOES_MAX_CESTA:
+                    continue
+                for outro in cesta:
+                    self._incrementar(livro_id, outro)
+                    self._incrementar(outro, livro_id)
+                cesta.add(livro_id)
+        self.marca = novos[-1][0]
+        return len(novos)
+
+    def recomendar(self, livro_id: int, limite: int = 10) -> list[dict]:
+        with self._lock:
+            base = livro_id * self.k
+            if livro_id < 0 or base >= len(self._vizinhos):
+                return []
+            recomendacoes = []
+            for deslocamento in range(min(limite, self.k)):
+                vizinho = self._vizinhos[base + deslocamento]
+                if vizinho == 0:
+                    break
+                recomendacoes.append({
+                    "livro_id": vizinho,
+                    "emprestimos_em_comum": self._contagens[base + deslocamento],
+                })
+            return recomendacoes
+
+    def salvar(self, caminho: str) -> None:
+        """Grava o índice num arquivo; um leitor nunca vê o arquivo pela metade."""
+        with self._lock:
+            vizinhos, contagens, marca = self._vizinhos, self._contagens, self.marca
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(_CABECALHO.pack(_ASSINATURA, self.k, marca, len(vizinhos) // self.k))
+            vizinhos.tofile(arquivo)
+            contagens.tofile(arquivo)
+        os.replace(temporario, caminho)
+
+    def carregar(self, caminho: str) -> bool:
+        """Troca o índice pelo do arquivo, se ele mudou desde a última carga."""
+        try:
+            versao = os.stat(caminho).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if versao == self._versao_arquivo:
+            return False
+        with open(caminho, "rb") as arquivo:
+            assinatura, k, marca, linhas = _CABECALHO.unpack(arquivo.read(_CABECALHO.size))
+            if assinatura != _ASSINATURA or k != self.k:
+                logger.warning("Recomendações: %s é de outro formato ou k, ignorado", caminho)
+                return False
+            vizinhos, contagens = array('i'), array('i')
+            vizinhos.fromfile(arquivo, linhas * k)
+            contagens.fromfile(arquivo, linhas * k)
+        with self._lock:
+            self._vizinhos = vizinhos
+            self._contagens = contagens
+            self.marca = marca
+            self.construido_em = versao / 1e9
+            self.carregado = True
+        self._versao_arquivo = versao
+        return True
+
+    def _atualizar_nova_sessao(self, session_factory, reconstrucao: float) -> None:
+        if not self._lock_atualizacao.acquire(blocking=False):
+            return
+        db = session_factory()
+        try:
+            self.carregar(settings.RECOMENDACOES_ARQUIVO)
+            if self.carregado:
+                self.atualizar_incremental(db)
+            if not self.carregado or (reconstrucao and time.time() - self.construido_em > reconstrucao):
+                solicitar_reconstrucao(db)
+        finally:
+            db.close()
+            self._lock_atualizacao.release()
+
+    async def atualizar_periodicamente(self, session_factory, intervalo: float, reconstrucao: float) -> None:
+        # A primeira rodada é no startup: carrega o arquivo ou pede o job
+        while True:
+            try:
+                await asyncio.to_thread(self._atualizar_nova_sessao, session_factory, reconstrucao)
+            except Exception:
+                logger.exception("Recomendações: falha ao atualizar o índice")
+            await asyncio.sleep(intervalo)
+
+def solicitar_reconstrucao(db: Session) -> bool:
+    """Cria o job "recomendacoes", a menos que já haja um pendente ou em execução."""
+    em_andamento = db.scalar(
+        select(Job.id)
+        .where(Job.tipo == "recomendacoes", Job.status.in_([StatusJob.PENDENTE, StatusJob.EXECUTANDO]))
+        .limit(1)
+    )
+    if em_andamento is not None:
+        return False
+    db.add(Job(tipo="recomendacoes", parametros={}))
+    db.commit()
+    return True
+
+def gerar_arquivo(
+    db: Session, caminho: str = settings.RECOMENDACOES_ARQUIVO,
+    processos: int = settings.RECOMENDACOES_PROCESSOS, progresso=None
+) -> dict:
+    """Reconstrói o índice do zero e grava o arquivo que os workers carregam.
+
+    Roda no executor de jobs: os processos da construção saem de um processo
+    sem threads de requisição, e um só executor por banco faz o trabalho.
+    progresso é chamado entre as fases; um cancelamento ali interrompe a
+    construção sem gravar o arquivo.
+    """
+    inicio = time.monotonic()
+    indice = IndiceRecomendacoes(settings.RECOMENDACOES_VIZINHOS)
+    if progresso is not None:
+        progresso(0, 3, "Lendo os empréstimos")
+    indice.reconstruir(db, processos, progresso)
+    if progresso is not None:
+        progresso(3, 3, "Gravando o arquivo")
+    indice.salvar(caminho)
+    return {
+        "marca": indice.marca,
+        "livros": len(indice._vizinhos) // indice.k,
+        "duracao_segundos": round(time.monotonic() - inicio, 1),
+    }
+
+indice_recomendacoes = IndiceRecomendacoes(settings.RECOMENDACOES_VIZINHOS)
@@ -0,0 +1,65 @@
+from sqlalchemy import select, bindparam
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.orm.util import identity_key
+
+# Consultas montadas uma vez por modelo/coluna e reaproveitadas: o SQLAlchemy
+# encontra a forma compilada no cache sem reconstruir a expressão a cada chamada
+_CONSULTAS: dict[tuple, object] = {}
+
+def colunas_projetadas(modelo, campos: list[str]) -> list:
+    colunas = [getattr(modelo, campo) for campo in campos]
+    if hasattr(modelo, "versao"):
+        # Necessária para o ETag das rotas de detalhe
+        colunas.append(modelo.versao)
+    return colunas
+
+def obter(db: Session, modelo, registro_id: int, campos: list[str] | None = None, bloquear: bool = False):
+    """Busca pela chave primária com session.get.
+
+    Usa o identity map da sessão antes de ir ao banco; com campos, carrega só
+    essas colunas (como projetar). Com bloquear, sempre lê do banco com
+    SELECT ... FOR UPDATE: a linha fica presa até o commit.
+    """
+    if campos is None and not bloquear:
+        return db.get(modelo, registro_id)
+    opcoes = [load_only(*colunas_projetadas(modelo, campos))] if campos is not None else None
+    return db.get(modelo, registro_id, options=opcoes, with_for_update=bloquear or None)
+
+def obter_varios(db: Session, modelo, ids) -> dict:
+    """Vários registros pela chave primária em um único SELECT ... IN.
+
+    Devolve {id: objeto}; ids inexistentes ficam de fora.
+    """
+    encontrados = {}
+    faltam = []
+    for registro_id in set(ids):
+        obj = db.identity_map.get(identity_key(modelo, registro_id))
+        if obj is not None:
+            encontrados[registro_id] = obj
+        else:
+            faltam.append(registro_id)
+    if faltam:
+        chave = ("varios", modelo)
+        consulta = _CONSULTAS.get(chave)
+        if consulta is None:
+            consulta = _CONSULTAS[chave] = select(modelo).where(
+                modelo.id.in_(bindparam("ids", expanding=True))
+            )
+        for obj in db.scalars(consulta, {"ids": faltam}):
+            encontrados[obj.id] = obj
+    return encontrados
+
+def existe(db: Session, coluna, valor, exceto_id: int | None = None) -> bool:
+    # Checagem de unicidade (cpf, email, isbn...) sem carregar a linha
+    modelo = coluna.class_
+    chave = ("existe", modelo, coluna.key, exceto_id is not None)
+    consulta = _CONSULTAS.get(chave)
+    if consulta is None:
+        consulta = select(modelo.id).where(coluna == bindparam("valor"))
+        if exceto_id is not None:
+            consulta = consulta.where(modelo.id != bindparam("exceto_id"))
+        consulta = _CONSULTAS[chave] = consulta.limit(1)
+    parametros = {"valor": valor}
+    if exceto_id is not None:
+        parametros["exceto_id"] = exceto_id
+    return db.execute(consulta, parametros).first() is not None
@@ -0,0 +1,304 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, select, func, literal, null, union_all, case, and_, or_, Numeric
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.orm.util import identity_key
+
+from database import SessionLocal
+from app.models import (
+    Usuario, Livro, Emprestimo, StatusEmprestimo, Reserva, StatusReserva, Multa, StatusMulta,
+    TipoAlteracao
+)
+from app.services.alteracoes import ultima_alteracao, alteracoes_desde
+import settings
+
+logger = logging.getLogger(__name__)
+
+def _consulta_resumo(usuario_id: int):
+    # Uma linha por item do resumo, de quatro subconsultas unidas; colunas:
+    # (tipo, id, livro_id, titulo, data, numero, valor)
+    emprestimos = (
+        select(
+            literal("emprestimo").label("tipo"),
+            Emprestimo.id,
+            Emprestimo.livro_id,
+            Livro.titulo,
+            Emprestimo.data_devolucao_prevista.label("data"),
+            case((Emprestimo.status == StatusEmprestimo.ATRASADO, 1), else_=0).label("numero"),
+            literal(None, Numeric(10, 2)).label("valor"),
+        )
+        .join(Livro, Livro.id == Emprestimo.livro_id)
+        .where(
+            Emprestimo.usuario_id == usuario_id,
+            Emprestimo.status.in_([StatusEmprestimo.ATIVO, StatusEmprestimo.ATRASADO]),
+        )
+    )
+
+    # Posição na fila: reservas pendentes do mesmo livro que passam na frente
+    # (maior prioridade, depois a mais antiga)
+    outra = aliased(Reserva)
+    a_frente = (
+        select(func.count(outra.id))
+        .where(
+            outra.livro_id == Reserva.livro_id,
+            outra.status == StatusReserva.PENDENTE,
+            or_(
+                outra.prioridade > Reserva.prioridade,
+                and_(outra.prioridade == Reserva.prioridade, outra.data_reserva < Reserva.data_reserva),
+                and_(
+                    outra.prioridade == Reserva.prioridade,
+                    outra.data_reserva == Reserva.data_reserva,
+                    outra.id < Reserva.id,
+                ),
+            ),
+        )
+        .scalar_subquery()
+    )
+    reservas = (
+        select(
+            literal("reserva"),
+            Reserva.id,
+            Reserva.livro_id,
+            Livro.titulo,
+            Reserva.data_limite,
+            (a_frente + 1),
+            null(),
+        )
+        .join(Livro, Livro.id == Reserva.livro_id)
+        .where(Reserva.usuario_id == usuario_id, Reserva.status == StatusReserva.PENDENTE)
+    )
+
+    multas = (
+        select(
+            literal("multas"),
+            null(),
+            null(),
+            null(),
+            null(),
+            func.count(Multa.id),
+            func.sum(Multa.valor),
+        )
+        .join(Emprestimo, Emprestimo.id == Multa.emprestimo_id)
+        .where(Emprestimo.usuario_id == usuario_id, Multa.status == StatusMulta.PENDENTE)
+    )
+
+    usuario = select(
+        literal("usuario"),
+        Usuario.id,
+        null(),
+        null(),
+        null(),
+        Usuario.limite_emprestimos,
+        null(),
+    ).where(Usuario.id == usuario_id)
+
+    return union_all(emprestimos, reservas, multas, usuario)
+
+def montar_resumo(db: Session, usuario_id: int) -> dict | None:
+    agora = datetime.utcnow()
+    resumo = {
+        "usuario_id": usuario_id,
+        "emprestimos_ativos": [],
+        "reservas_pendentes": [],
+    }
+    encontrado = False
+    quantidade_multas = 0
+    total_multas = 0
+    limite = 0
+    for tipo, item_id, livro_id, titulo, data, numero, valor in db.execute(_consulta_resumo(usuario_id)):
+        if tipo == "emprestimo":
+            resumo["emprestimos_ativos"].append({
+                "id": item_id,
+                "livro_id": livro_id,
+                "titulo": titulo,
+                "data_devolucao_prevista": data,
+                "atrasado": bool(numero) or data < agora,
+            })
+        elif tipo == "reserva":
+            resumo["reservas_pendentes"].append({
+                "id": item_id,
+                "livro_id": livro_id,
+                "titulo": titulo,
+                "data_limite": data,
+                "posicao_fila": numero,
+            })
+        elif tipo == "multas":
+            quantidade_multas = numero or 0
+            total_multas = valor or 0
+        elif tipo == "usuario":
+            encontrado = True
+            limite = numero
+
+    if not encontrado:
+        return None
+
+    ativos = len(resumo["emprestimos_ativos"])
+    resumo["emprestimos_atrasados"] = sum(1 for e in resumo["emprestimos_ativos"] if e["atrasado"])
+    resumo["multas_pendentes"] = quantidade_multas
+    resumo["total_multas_pendentes"] = total_multas
+    resumo["limite_emprestimos"] = limite
+    resumo["emprestimos_restantes"] = max(0, limite - ativos)
+    return resumo
+
+class CacheResumos:
+    """Cache em memória, por processo, dos resumos de conta.
+
+    As entradas expiram após RESUMO_TTL_SEGUNDOS e são invalidadas após o
+    commit de qualquer escrita que afete o usuário. Mudanças numa fila de
+    reservas invalidam também os outros usuários que esperam o mesmo livro.
+    As escritas dos outros workers e dos jobs chegam pelo log de alterações,
+    lido a cada RESUMO_SINCRONIZACAO_SEGUNDOS.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entradas: dict[int, tuple[float, dict]] = {}
+        self._por_livro: dict[int, set[int]] = {}
+        self._geracao = 0
+        self._lock = threading.Lock()
+        self.cursor: int | None = None
+
+    def obter(self, usuario_id: int) -> dict | None:
+        entrada = self._entradas.get(usuario_id)
+        if entrada is None or entrada[0] < time.monotonic():
+            return None
+        return entrada[1]
+
+    def geracao(self) -> int:
+        return self._geracao
+
+    def guardar(self, usuario_id: int, resumo: dict, geracao: int) -> None:
+        with self._lock:
+            # Alguma invalidação aconteceu durante a consulta: o resultado pode estar velho
+            if geracao != self._geracao:
+                return
+            self._entradas[usuario_id] = (time.monotonic() + self.ttl, resumo)
+            for reserva in resumo["reservas_pendentes"]:
+                self._por_livro.setdefault(reserva["livro_id"], set()).add(usuario_id)
+
+    def invalidar(self, usuario_ids=(), livro_ids=()) -> None:
+        with self._lock:
+            self._geracao += 1
+            alvos = set(usuario_ids)
+            for livro_id in livro_ids:
+                alvos |= self._por_livro.pop(livro_id, set())
+            for usuario_id in alvos:
+                self._entradas.pop(usuario_id, None)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._geracao += 1
+            self._entradas.clear()
+            self._por_livro.clear()
+
+    def _invalidar_alteracoes(self, db: Session, alteracoes) -> None:
+        ids: dict[str, set[int]] = {}
+        for _, tabela, registro_id, operacao in alteracoes:
+            if operacao == TipoAlteracao.ARQUIVAMENTO:
+                # Só saem empréstimos devolvidos e multas quitadas, que o resumo não mostra
+                continue
+            if operacao == TipoAlteracao.EXCLUSAO and tabela != Usuario.__tablename__:
+                # A linha apagada não diz mais de qual usuário era
+                self.limpar()
+                return
+            ids.setdefault(tabela, set()).add(registro_id)
+
+        usuarios = set(ids.get(Usuario.__tablename__, ()))
+        livros = set()
+        if ids.get(Emprestimo.__tablename__):
+            usuarios.update(db.scalars(
+                select(Emprestimo.usuario_id).where(Emprestimo.id.in_(ids[Emprestimo.__tablename__]))
+            ))
+        if ids.get(Reserva.__tablename__):
+            for usuario_id, livro_id in db.execute(
+                select(Reserva.usuario_id, Reserva.livro_id).where(Reserva.id.in_(ids[Reserva.__tablename__]))
+            ):
+                usuarios.add(usuario_id)
+                livros.add(livro_id)
+        if ids.get(Multa.__tablename__):
+            usuarios.update(db.scalars(
+                select(Emprestimo.usuario_id)
+                .join(Multa, Multa.emprestimo_id == Emprestimo.id)
+                .where(Multa.id.in_(ids[Multa.__tablename__]))
+            ))
+        self.invalidar(usuarios, livros)
+
+    def sincronizar(self, db: Session) -> int:
+        """Invalida os resumos afetados por escritas confirmadas depois do cursor."""
+        aplicadas = 0
+        tabelas = (Usuario.__tablename__, Emprestimo.__tablename__, Reserva.__tablename__, Multa.__tablename__)
+        while True:
+            if self.cursor is None or not self._entradas:
+                # Cache vazio não tem o que invalidar: só acompanha o fim do log
+                self.cursor = ultima_alteracao(db)
+                db.commit()
+                break
+            alteracoes = alteracoes_desde(db, self.cursor, tabelas)
+            if not alteracoes:
+                break
+            self._invalidar_alteracoes(db, alteracoes)
+            self.cursor = alteracoes[-1][0]
+            db.commit()
+            aplicadas += len(alteracoes)
+        return aplicadas
+
+    def _sincronizar_nova_sessao(self, session_factory) -> None:
+        db = session_factory()
+        try:
+            self.sincronizar(db)
+        finally:
+            db.close()
+
+    async def sincronizar_periodicamente(self, session_factory, intervalo: float) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self._sincronizar_nova_sessao, session_factory)
+            except Exception:
+                # Sem o log, o TTL ainda limita quanto tempo uma entrada fica velha
+                logger.exception("Resumos: falha ao ler o log de alterações")
+            await asyncio.sleep(intervalo)
+
+cache_resumos = CacheResumos(settings.RESUMO_TTL_SEGUNDOS)
+
+def invalidar_resumo(session: Session, usuario_ids) -> None:
+    # Para escritas em massa, que não passam pelo flush; aplicado após o commit
+    session.info.setdefault("resumos_invalidados", set()).update(usuario_ids)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _coletar_invalidacoes(session: Session, flush_context) -> None:
+    usuarios = session.info.setdefault("resumos_invalidados", set())
+    livros = session.info.setdefault("filas_invalidadas", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Emprestimo):
+            usuarios.add(obj.usuario_id)
+        elif isinstance(obj, Reserva):
+            usuarios.add(obj.usuario_id)
+            livros.add(obj.livro_id)
+        elif isinstance(obj, Usuario):
+            usuarios.add(obj.id)
+        elif isinstance(obj, Multa):
+            # Sem consulta extra: usa o empréstimo já carregado ou limpa tudo
+            emprestimo = session.identity_map.get(identity_key(Emprestimo, obj.emprestimo_id))
+            if emprestimo is not None:
+                usuarios.add(emprestimo.usuario_id)
+            else:
+                session.info["resumos_limpar"] = True
+
+@event.listens_for(SessionLocal, "after_commit")
+def _aplicar_invalidacoes(session: Session) -> None:
+    usuarios = session.info.pop("resumos_invalidados", None)
+    livros = session.info.pop("filas_invalidadas", None)
+    if session.info.pop("resumos_limpar", False):
+        cache_resumos.limpar()
+    elif usuarios or livros:
+        cache_resumos.invalidar(usuarios or (), livros or ())
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_invalidacoes(session: Session) -> None:
+    session.info.pop("resumos_invalidados", None)
+    session.info.pop("filas_invalidadas", None)
+    session.info.pop("resumos_limpar", None)
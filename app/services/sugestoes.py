@@ -0,0 +1,375 @@
+import asyncio
+import heapq
+import logging
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right, insort
+
+from sqlalchemy import select, func, exists, union_all, or_
+from sqlalchemy.orm import Session
+
+from app.models import Livro, Emprestimo, EmprestimoArquivo, TipoAlteracao
+from app.services.alteracoes import ultima_alteracao, alteracoes_desde
+import settings
+
+logger = logging.getLogger(__name__)
+
+def normalizar(texto: str) -> str:
+    # Remove acentos e diferenças de caixa: "Érico" e "erico" viram a mesma chave
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+def _contar_emprestimos(db: Session, livro_ids=None) -> dict[int, int]:
+    # Tabela quente e arquivo, como em app.services.circulacao: arquivar não tira
+    # um título do ranking. No arquivamento por partição a linha passa um tempo
+    # nas duas tabelas; ali conta só a cópia quente
+    quente = select(Emprestimo.livro_id)
+    arquivo = select(EmprestimoArquivo.livro_id).where(~exists().where(Emprestimo.id == EmprestimoArquivo.id))
+    if livro_ids is not None:
+        quente = quente.where(Emprestimo.livro_id.in_(livro_ids))
+        arquivo = arquivo.where(EmprestimoArquivo.livro_id.in_(livro_ids))
+    eventos = union_all(quente, arquivo).subquery()
+    return dict(db.execute(
+        select(eventos.c.livro_id, func.count()).group_by(eventos.c.livro_id)
+    ).all())
+
+def _montar_topo(chaves: list[str], ids: array, pontuacao) -> dict[str, list[int]]:
+    """Os SUGESTOES_TOPO livros de maior pontuação de cada prefixo curto.
+
+    O nível mais longo sai direto das faixas de chaves; cada nível mais curto
+    combina as listas do anterior, já que os melhores de um prefixo estão
+    entre os melhores de algum dos prefixos que o estendem.
+    """
+    tamanho = settings.SUGESTOES_PREFIXO_TOPO
+    nivel: dict[str, list[int]] = {}
+    inicio = 0
+    while inicio < len(chaves):
+        prefixo = chaves[inicio][:tamanho]
+        if len(prefixo) < tamanho:
+            # Chave mais curta que o nível: o grupo é só ela
+            fim = bisect_right(chaves, prefixo, lo=inicio)
+        else:
+            fim = bisect_left(chaves, prefixo + "\U0010ffff", lo=inicio)
+        nivel[prefixo] = heapq.nlargest(settings.SUGESTOES_TOPO, set(ids[inicio:fim]), key=pontuacao)
+        inicio = fim
+
+    topo = dict(nivel)
+    for comprimento in range(tamanho - 1, 0, -1):
+        grupos: dict[str, set[int]] = {}
+        for prefixo, melhores in nivel.items():
+            grupos.setdefault(prefixo[:comprimento], set()).update(melhores)
+        nivel = {
+            prefixo: heapq.nlargest(settings.SUGESTOES_TOPO, candidatos, key=pontuacao)
+            for prefixo, candidatos in grupos.items()
+        }
+        topo.update(nivel)
+    return topo
+
+class IndiceSugestoes:
+    """Índice de prefixos em memória sobre Livro.titulo e Livro.autor.
+
+    As chaves normalizadas ficam em uma lista ordenada (busca com bisect) e o
+    id do livro em um array paralelo, montados só na carga completa. Chaves
+    novas entram num buffer ordenado pequeno e as antigas são marcadas como
+    removidas pela posição; quando os dois passam de SUGESTOES_BUFFER_MAXIMO,
+    a próxima rodada faz uma carga completa. Títulos e autores originais ficam
+    em listas indexadas pelo id, usadas na resposta e para achar as chaves
+    antigas quando um livro muda.
+
+    Prefixos de até SUGESTOES_PREFIXO_TOPO caracteres, que podem cobrir boa
+    parte do catálogo, guardam os SUGESTOES_TOPO livros mais emprestados já
+    ordenados; os mais longos ranqueiam a faixa inteira de chaves.
+
+    Como o de disponibilidade, o índice é carregado em segundo plano (até lá
+    a rota usa sugerir_no_banco) e segue o log de alterações a partir do
+    id marcado na carga (livros e empréstimos novos, de qualquer worker). A
+    carga completa periódica corrige as contagens de empréstimos apagados.
+    """
+
+    def __init__(self):
+        self._chaves: list[str] = []
+        self._ids = array('i')
+        self._removidas: set[int] = set()
+        self._novas: list[tuple[str, int]] = []
+        self._titulos: list[str | None] = []
+        self._autores: list[str | None] = []
+        self._emprestimos = array('i')
+        self._topo: dict[str, list[int]] = {}
+        self._topo_pendentes: set[str] = set()
+        self._lock = threading.Lock()
+        self.cursor = 0
+        self.carregado = False
+
+    @property
+    def precisa_recarga(self) -> bool:
+        return len(self._novas) + len(self._removidas) > settings.SUGESTOES_BUFFER_MAXIMO
+
+    def _pontuacao(self, livro_id: int) -> tuple[int, int]:
+        return (self._emprestimos[livro_id], -livro_id)
+
+    def _garantir_tamanho(self, livro_id: int) -> None:
+        faltam = livro_id + 1 - len(self._titulos)
+        if faltam > 0:
+            self._titulos.extend([None] * faltam)
+            self._autores.extend([None] * faltam)
+            self._emprestimos.extend([0] * faltam)
+
+    def _prefixos(self, chave: str):
+        for comprimento in range(1, min(len(chave), settings.SUGESTOES_PREFIXO_TOPO) + 1):
+            yield chave[:comprimento]
+
+    def _promover(self, prefixo: str, livro_id: int) -> None:
+        melhores = self._topo.setdefault(prefixo, [])
+        if livro_id not in melhores:
+            melhores.append(livro_id)
+        melhores.sort(key=self._pontuacao, reverse=True)
+        del melhores[settings.SUGESTOES_TOPO:]
+
+    def _candidatos(self, chave: str) -> set[int]:
+        inicio = bisect_left(self._chaves, chave)
+        fim = bisect_left(self._chaves, chave + "\U0010ffff", lo=inicio)
+        if self._removidas:
+            candidatos = {self._ids[posicao] for posicao in range(inicio, fim) if posicao not in self._removidas}
+        else:
+            candidatos = set(self._ids[inicio:fim])
+        inicio = bisect_left(self._novas, (chave,))
+        fim = bisect_left(self._novas, (chave + "\U0010ffff",), lo=inicio)
+        candidatos.update(livro_id for _, livro_id in self._novas[inicio:fim])
+        return candidatos
+
+    def _recalcular_pendentes(self) -> None:
+        for prefixo in self._topo_pendentes:
+            melhores = heapq.nlargest(settings.SUGESTOES_TOPO, self._candidatos(prefixo), key=self._pontuacao)
+            if melhores:
+                self._topo[prefixo] = melhores
+            else:
+                self._topo.pop(prefixo, None)
+        self._topo_pendentes.clear()
+
+    def _inserir_chave(self, chave: str, livro_id: int) -> None:
+        # O buffer é pequeno: inserir nele não desloca a lista principal
+        insort(self._novas, (chave, livro_id))
+        for prefixo in self._prefixos(chave):
+            self._promover(prefixo, livro_id)
+
+    def _remover_chave(self, chave: str, livro_id: int) -> None:
+        posicao = bisect_left(self._novas, (chave, livro_id))
+        if posicao < len(self._novas) and self._novas[posicao] == (chave, livro_id):
+            del self._novas[posicao]
+        else:
+            posicao = bisect_left(self._chaves, chave)
+            while posicao < len(self._chaves) and self._chaves[posicao] == chave:
+                if self._ids[posicao] == livro_id and posicao not in self._removidas:
+                    self._removidas.add(posicao)
+                    break
+                posicao += 1
+        for prefixo in self._prefixos(chave):
+            if livro_id in self._topo.get(prefixo, ()):
+                self._topo_pendentes.add(prefixo)
+
+    def montar(self, livros, emprestimos: dict[int, int], cursor: int = 0) -> None:
+        """Reconstrói o índice a partir de (id, titulo, autor) e do total de empréstimos por livro."""
+        entradas = []
+        titulos: list[str | None] = []
+        autores: list[str | None] = []
+        for livro_id, titulo, autor in livros:
+            faltam = livro_id + 1 - len(titulos)
+            if faltam > 0:
+                titulos.extend([None] * faltam)
+                autores.extend([None] * faltam)
+            # Autores se repetem muito; intern faz todos apontarem para a mesma string
+            titulos[livro_id] = titulo
+            autores[livro_id] = sys.intern(autor)
+            entradas.append((normalizar(titulo), livro_id))
+            entradas.append((sys.intern(normalizar(autor)), livro_id))
+
+        entradas.sort()
+        contagem = array('i', [0] * len(titulos))
+        for livro_id, total in emprestimos.items():
+            if livro_id < len(contagem):
+                contagem[livro_id] = total
+        chaves = [chave for chave, _ in entradas]
+        ids = array('i', (livro_id for _, livro_id in entradas))
+        topo = _montar_topo(chaves, ids, lambda livro_id: (contagem[livro_id], -livro_id))
+
+        with self._lock:
+            self._chaves = chaves
+            self._ids = ids
+            self._removidas = set()
+            self._novas = []
+            self._titulos = titulos
+            self._autores = autores
+            self._emprestimos = contagem
+            self._topo = topo
+            self._topo_pendentes = set()
+            self.cursor = cursor
+            self.carregado = True
+
+    def recarregar(self, db: Session) -> None:
+        # Marca, livros e contagens na mesma transação, como na disponibilidade
+        marca = ultima_alteracao(db)
+        livros = db.execute(
+            select(Livro.id, Livro.titulo, Livro.autor).execution_options(yield_per=10000)
+        )
+        emprestimos = _contar_emprestimos(db)
+        self.montar(livros, emprestimos, marca)
+        db.commit()
+
+    def _definir(self, livro_id: int, titulo: str, autor: str) -> None:
+        self._garantir_tamanho(livro_id)
+        if self._titulos[livro_id] == titulo and self._autores[livro_id] == autor:
+            # Empréstimos e devoluções também alteram a linha do livro
+            return
+        self._remover_livro(livro_id)
+        self._titulos[livro_id] = titulo
+        self._autores[livro_id] = sys.intern(autor)
+        self._inserir_chave(normalizar(titulo), livro_id)
+        self._inserir_chave(sys.intern(normalizar(autor)), livro_id)
+
+    def _remover_livro(self, livro_id: int) -> None:
+        if livro_id < len(self._titulos) and self._titulos[livro_id] is not None:
+            self._remover_chave(normalizar(self._titulos[livro_id]), livro_id)
+            self._remover_chave(normalizar(self._autores[livro_id]), livro_id)
+            self._titulos[livro_id] = None
+            self._autores[livro_id] = None
+
+    def _definir_contagem(self, livro_id: int, total: int) -> None:
+        self._garantir_tamanho(livro_id)
+        anterior = self._emprestimos[livro_id]
+        self._emprestimos[livro_id] = total
+        if self._titulos[livro_id] is None or total == anterior:
+            return
+        for chave in (normalizar(self._titulos[livro_id]), normalizar(self._autores[livro_id])):
+            for prefixo in self._prefixos(chave):
+                if total > anterior:
+                    self._promover(prefixo, livro_id)
+                elif livro_id in self._topo.get(prefixo, ()):
+                    # Caiu: outro livro fora da lista pode ter passado à frente
+                    self._topo_pendentes.add(prefixo)
+
+    def definir(self, livro_id: int, titulo: str, autor: str) -> None:
+        with self._lock:
+            self._definir(livro_id, titulo, autor)
+            self._recalcular_pendentes()
+
+    def remover(self, livro_id: int) -> None:
+        with self._lock:
+            self._remover_livro(livro_id)
+            self._recalcular_pendentes()
+
+    def sincronizar(self, db: Session) -> int:
+        """Aplica as alterações de livros e os empréstimos novos confirmados depois do cursor."""
+        aplicadas = 0
+        while True:
+            alteracoes = alteracoes_desde(db, self.cursor, (Livro.__tablename__, Emprestimo.__tablename__))
+            if not alteracoes:
+                break
+            livro_ids = {
+                registro_id for _, tabela, registro_id, _ in alteracoes if tabela == Livro.__tablename__
+            }
+            emprestimo_ids = {
+                registro_id for _, tabela, registro_id, operacao in alteracoes
+                if tabela == Emprestimo.__tablename__ and operacao == TipoAlteracao.INSERCAO
+            }
+            linhas = {
+                livro_id: (titulo, autor)
+                for livro_id, titulo, autor in db.execute(
+                    select(Livro.id, Livro.titulo, Livro.autor).where(Livro.id.in_(livro_ids))
+                )
+            } if livro_ids else {}
+            contagens = {}
+            if emprestimo_ids:
+                # Total atual e não um incremento: reaplicar não conta o empréstimo duas vezes
+                emprestados = set(db.scalars(
+                    select(Emprestimo.livro_id).where(Emprestimo.id.in_(emprestimo_ids))
+                ))
+                contagens = dict.fromkeys(emprestados, 0)
+                contagens.update(_contar_emprestimos(db, emprestados))
+            with self._lock:
+                for livro_id in livro_ids:
+                    if livro_id in linhas:
+                        self._definir(livro_id, *linhas[livro_id])
+                    else:
+                        self._remover_livro(livro_id)
+                for livro_id, total in contagens.items():
+                    self._definir_contagem(livro_id, total)
+                self._recalcular_pendentes()
+                self.cursor = alteracoes[-1][0]
+            db.commit()
+            aplicadas += len(alteracoes)
+        return aplicadas
+
+    def sugerir(self, prefixo: str, limite: int = 10) -> list[dict]:
+        chave = normalizar(prefixo)
+        if not chave:
+            return []
+
+        with self._lock:
+            if len(chave) <= settings.SUGESTOES_PREFIXO_TOPO:
+                melhores = self._topo.get(chave, [])[:limite]
+            else:
+                melhores = heapq.nlargest(limite, self._candidatos(chave), key=self._pontuacao)
+            return [
+                {
+                    "id": livro_id,
+                    "titulo": self._titulos[livro_id],
+                    "autor": self._autores[livro_id],
+                    "emprestimos": self._emprestimos[livro_id],
+                }
+                for livro_id in melhores
+            ]
+
+    def carregar(self, session_factory) -> None:
+        """Carga completa numa sessão própria."""
+        self._executar_nova_sessao(self.recarregar, session_factory)
+
+    def _executar_nova_sessao(self, metodo, session_factory) -> None:
+        db = session_factory()
+        try:
+            metodo(db)
+        finally:
+            db.close()
+
+    async def sincronizar_periodicamente(self, session_factory, intervalo: float, recarga: float) -> None:
+        # A primeira rodada faz a carga completa; uma carga que falhou é repetida na seguinte
+        proxima_recarga = 0.0
+        while True:
+            try:
+                if (
+                    not self.carregado or self.precisa_recarga
+                    or (recarga and time.monotonic() >= proxima_recarga)
+                ):
+                    await asyncio.to_thread(self.carregar, session_factory)
+                    proxima_recarga = time.monotonic() + recarga
+                await asyncio.to_thread(self._executar_nova_sessao, self.sincronizar, session_factory)
+            except Exception:
+                # Banco fora do ar, por exemplo: tenta de novo no próximo intervalo
+                logger.exception("Sugestões: falha ao sincronizar o índice")
+            await asyncio.sleep(intervalo)
+
+indice_sugestoes = IndiceSugestoes()
+
+def sugerir_no_banco(db: Session, prefixo: str, limite: int = 10) -> list[dict]:
+    """Sugestões lidas do banco, para quando o índice ainda carrega.
+
+    LIKE pelos índices de titulo e autor, com a collation do banco no lugar
+    de normalizar(); ranqueia só os SUGESTOES_TOPO primeiros livros achados.
+    """
+    # Padrão montado aqui, como em app.routes.listagem, para o banco usar os índices
+    padrao = prefixo.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+    livros = db.execute(
+        select(Livro.id, Livro.titulo, Livro.autor)
+        .where(or_(Livro.titulo.like(padrao, escape="/"), Livro.autor.like(padrao, escape="/")))
+        .limit(max(limite, settings.SUGESTOES_TOPO))
+    ).all()
+    if not livros:
+        return []
+    emprestimos = _contar_emprestimos(db, [livro_id for livro_id, _, _ in livros])
+    melhores = heapq.nlargest(limite, livros, key=lambda livro: (emprestimos.get(livro[0], 0), -livro[0]))
+    return [
+        {"id": livro_id, "titulo": titulo, "autor": autor, "emprestimos": emprestimos.get(livro_id, 0)}
+        for livro_id, titulo, autor in melhores
+    ]
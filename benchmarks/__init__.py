@@ -0,0 +1 @@
+# Este arquivo é necessário para que o Python reconheça o diretório como um pacote 
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""Servidor SMTP mínimo que só guarda as mensagens, para testar os envios.
+
+Atende EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP e QUIT, sem autenticação nem
+TLS, e pode simular um servidor lento com um atraso por mensagem. Roda em
+primeiro plano ou num thread, dentro de outro programa:
+
+    python -m benchmarks.caixa_smtp --porta 8025
+
+    caixa = CaixaSMTP(atraso=0.01)
+    porta = caixa.iniciar_em_thread()
+    ...
+    caixa.encerrar()
+"""
+import argparse
+import asyncio
+import sys
+import threading
+from email import message_from_bytes, policy
+
+class CaixaSMTP:
+    def __init__(self, host: str = "127.0.0.1", porta: int = 0, atraso: float = 0.0):
+        self.host = host
+        self.porta = porta
+        self.atraso = atraso
+        self.mensagens: list = []
+        self.conexoes = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._servidor: asyncio.AbstractServer | None = None
+        self._thread: threading.Thread | None = None
+
+    async def _atender(self, leitor: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+        self.conexoes += 1
+
+        def responder(linha: str) -> None:
+            escritor.write(linha.encode() + b"\r\n")
+
+        remetente, destinatarios = None, []
+        responder("220 caixa ESMTP")
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha:
+                    return
+                comando = linha.decode("utf-8", "replace").strip()
+                verbo = comando[:4].upper()
+                if verbo == "EHLO":
+                    responder("250-caixa")
+                    responder("250-8BITMIME")
+                    responder("250 SMTPUTF8")
+                elif verbo == "HELO":
+                    responder("250 caixa")
+                elif verbo == "MAIL":
+                    remetente, destinatarios = comando[10:].split()[0], []
+                    responder("250 OK")
+                elif verbo == "RCPT":
+                    destinatarios.append(comando[8:].split()[0])
+                    responder("250 OK")
+                elif verbo == "DATA":
+                    responder("354 Fim com <CRLF>.<CRLF>")
+                    await escritor.drain()
+                    linhas = []
+                    while True:
+                        linha = await leitor.readline()
+                        if not linha or linha == b".\r\n":
+                            break
+                        # Desfaz o ponto duplicado no início das linhas (RFC 5321, 4.5.2)
+                        linhas.append(linha[1:] if linha.startswith(b".") else linha)
+                    if self.atraso:
+                        await asyncio.sleep(self.atraso)
+                    self.mensagens.append({
+                        "remetente": remetente,
+                        "destinatarios": destinatarios,
+                        "mensagem": message_from_bytes(b"".join(linhas), policy=policy.default),
+                    })
+                    remetente, destinatarios = None, []
+                    responder("250 OK")
+                elif verbo == "RSET":
+                    remetente, destinatarios = None, []
+                    responder("250 OK")
+                elif verbo == "NOOP":
+                    responder("250 OK")
+                elif verbo == "QUIT":
+                    responder("221 Tchau")
+                    await escritor.drain()
+                    return
+                else:
+                    responder("502 Comando não implementado")
+                await escritor.drain()
+        except ConnectionError:
+            pass
+        finally:
+            escritor.close()
+
+    async def iniciar(self) -> int:
+        self._servidor = await asyncio.start_server(self._atender, self.host, self.porta)
+        self.porta = self._servidor.sockets[0].getsockname()[1]
+        return self.porta
+
+    def iniciar_em_thread(self) -> int:
+        """Inicia o servidor num loop próprio, em outro thread; devolve a porta."""
+        pronto = threading.Event()
+
+        def rodar():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.iniciar())
+            pronto.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=rodar, name="caixa-smtp", daemon=True)
+        self._thread.start()
+        pronto.wait()
+        return self.porta
+
+    def encerrar(self) -> None:
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._servidor.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8025)
+    parser.add_argument("--atraso", type=float, default=0.0, help="segundos por mensagem")
+    args = parser.parse_args()
+
+    caixa = CaixaSMTP(args.host, args.porta, args.atraso)
+
+    async def servir():
+        porta = await caixa.iniciar()
+        print(f"Caixa SMTP em {args.host}:{porta}")
+        async with caixa._servidor:
+            await caixa._servidor.serve_forever()
+
+    try:
+        asyncio.run(servir())
+    except KeyboardInterrupt:
+        print(f"{len(caixa.mensagens)} mensagens recebidas")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
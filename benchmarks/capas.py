@@ -0,0 +1,151 @@
+"""Latência de GET /livros/{id}/capa com o cache de capas frio e quente.
+
+Sobe um servidor HTTP local no lugar do site das capas, com um atraso por
+resposta e JPEGs grandes gerados na hora, e cadastra um livro por capa num
+SQLite em memória. Mede o primeiro pedido de cada capa (download e
+redimensionamento), os pedidos seguintes (leitura do disco), a revalidação
+com If-None-Match e quantas vezes a origem foi consultada com vários
+clientes pedindo a mesma capa ao mesmo tempo.
+
+    python -m benchmarks.capas --capas 20 --atraso 0.05
+"""
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SQL_ECHO", "false")
+os.environ.setdefault("MODO_STARTUP", "nenhum")
+os.environ.setdefault("CAPAS_DIRETORIO", tempfile.mkdtemp(prefix="capas-"))
+# A origem de mentira roda em 127.0.0.1
+os.environ.setdefault("CAPAS_PERMITIR_REDE_PRIVADA", "true")
+
+import argparse
+import io
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+import database
+from main import app
+from app.models import Categoria, Livro
+
+class Origem(ThreadingHTTPServer):
+    """Site de capas de mentira: /N.jpg devolve um JPEG de 1600x2400."""
+
+    daemon_threads = True
+
+    def __init__(self, atraso: float):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.atraso = atraso
+        self.pedidos = 0
+        self._imagens: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def imagem(self, caminho: str) -> bytes:
+        with self._lock:
+            self.pedidos += 1
+            if caminho not in self._imagens:
+                semente = sum(caminho.encode())
+                imagem = Image.radial_gradient("L").resize((1600, 2400)).convert("RGB")
+                imagem = Image.merge("RGB", [canal.point(lambda v, s=semente: (v + s) % 256) for canal in imagem.split()])
+                saida = io.BytesIO()
+                imagem.save(saida, "JPEG", quality=92)
+                self._imagens[caminho] = saida.getvalue()
+            return self._imagens[caminho]
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(self.server.atraso)
+        conteudo = self.server.imagem(self.path)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(conteudo)))
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def log_message(self, *args):
+        pass
+
+def _preparar_banco(capas: int, origem: str) -> None:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA ignore_check_constraints = ON")
+
+    database.Base.metadata.create_all(bind=engine)
+    database.SessionLocal.configure(bind=engine)
+
+    db = database.SessionLocal()
+    db.add(Categoria(nome="Romance", descricao="Prosa"))
+    db.flush()
+    db.add_all(
+        Livro(
+            titulo=f"Livro {i}", autor="Autor", isbn=f"{i:013d}", editora="Editora",
+            ano_publicacao=2000, categoria_id=1, localizacao="A1", capa_url=f"{origem}/{i}.jpg"
+        )
+        for i in range(1, capas + 1)
+    )
+    db.commit()
+    db.close()
+
+def _ms(tempos: list[float]) -> str:
+    return f"mediana {statistics.median(tempos) * 1000:8.2f} ms   máx {max(tempos) * 1000:8.2f} ms"
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--capas", type=int, default=20)
+    parser.add_argument("--atraso", type=float, default=0.05, help="segundos por resposta da origem")
+    parser.add_argument("--clientes", type=int, default=8)
+    args = parser.parse_args()
+
+    origem = Origem(args.atraso)
+    threading.Thread(target=origem.serve_forever, daemon=True).start()
+    _preparar_banco(args.capas + 1, f"http://127.0.0.1:{origem.server_address[1]}")
+
+    def pedir(livro_id: int, tamanho: str = "media", etag: str | None = None):
+        cabecalhos = {"If-None-Match": etag} if etag else {}
+        inicio = time.perf_counter()
+        resposta = cliente.get(f"/livros/{livro_id}/capa?tamanho={tamanho}", headers=cabecalhos)
+        return time.perf_counter() - inicio, resposta
+
+    with TestClient(app) as cliente:
+        frios, quentes, revalidacoes = [], [], []
+        tamanhos = {}
+        for livro_id in range(1, args.capas + 1):
+            tempo, resposta = pedir(livro_id)
+            frios.append(tempo)
+            etag = resposta.headers["ETag"]
+            for tamanho in ("pequena", "media", "grande"):
+                tempo, resposta = pedir(livro_id, tamanho)
+                quentes.append(tempo)
+                tamanhos.setdefault(tamanho, len(resposta.content))
+            tempo, resposta = pedir(livro_id, etag=etag)
+            revalidacoes.append(tempo)
+            assert resposta.status_code == 304, resposta.status_code
+
+        pedidos_antes = origem.pedidos
+        with ThreadPoolExecutor(args.clientes) as executor:
+            respostas = list(executor.map(lambda _: pedir(args.capas + 1)[1], range(args.clientes)))
+        assert all(resposta.status_code == 200 for resposta in respostas)
+        pedidos_concorrentes = origem.pedidos - pedidos_antes
+
+    print(f"origem com {args.atraso * 1000:.0f} ms por resposta, original de {len(origem.imagem('/1.jpg')) // 1024} KiB")
+    print(f"primeiro pedido (download + variantes)  {_ms(frios)}")
+    print(f"pedidos seguintes (cache em disco)      {_ms(quentes)}")
+    print(f"revalidação com If-None-Match (304)     {_ms(revalidacoes)}")
+    print("bytes por variante: " + ", ".join(f"{nome} {tamanho}" for nome, tamanho in tamanhos.items()))
+    print(f"{args.clientes} clientes simultâneos na mesma capa: {pedidos_concorrentes} pedido(s) à origem")
+    origem.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""Benchmark de cold start da API.
+
+Cada medição roda num processo novo: tempo de import de main, tempo do
+startup (conforme MODO_STARTUP), latência da primeira requisição em /, em
+/livros/ e nas rotas dos índices em memória, e o tempo até os índices
+terminarem de carregar em segundo plano. O banco temporário recebe antes
+--livros livros e --emprestimos empréstimos, para a carga dos índices ter
+o que ler. Com --saida, acrescenta o resultado em um arquivo JSON Lines
+para acompanhar a evolução ao longo do tempo.
+
+    python -m benchmarks.cold_start --repeticoes 5 --livros 100000 --saida cold_start.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+MEDICAO = r"""
+import json, time
+inicio = time.perf_counter()
+import main
+importacao = time.perf_counter() - inicio
+
+from fastapi.testclient import TestClient
+from app.services.disponibilidade import indice_disponibilidade
+from app.services.sugestoes import indice_sugestoes
+inicio_startup = time.perf_counter()
+with TestClient(main.app) as cliente:
+    startup = time.perf_counter() - inicio_startup
+    inicio = time.perf_counter()
+    cliente.get("/")
+    primeira_raiz = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    cliente.get("/livros/")
+    primeira_livros = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    cliente.post("/livros/disponibilidade", json={"ids": [1, 2, 3]})
+    primeira_disponibilidade = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    cliente.get("/livros/sugestoes", params={"prefixo": "me"})
+    primeira_sugestoes = time.perf_counter() - inicio
+    while not (indice_disponibilidade.carregado and indice_sugestoes.carregado):
+        time.sleep(0.01)
+    indices = time.perf_counter() - inicio_startup
+print(json.dumps({
+    "importacao_ms": importacao * 1000,
+    "startup_ms": startup * 1000,
+    "primeira_raiz_ms": primeira_raiz * 1000,
+    "primeira_livros_ms": primeira_livros * 1000,
+    "primeira_disponibilidade_ms": primeira_disponibilidade * 1000,
+    "primeira_sugestoes_ms": primeira_sugestoes * 1000,
+    "indices_carregados_ms": indices * 1000,
+}))
+"""
+
+def medir_uma_vez(ambiente: dict) -> dict:
+    saida = subprocess.run(
+        [sys.executable, "-c", MEDICAO],
+        cwd=RAIZ, env=ambiente, capture_output=True, text=True, check=True
+    )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+def carimbar_revisao(url: str) -> None:
+    # Equivalente a "alembic stamp head" no banco criado com create_all
+    from sqlalchemy import create_engine, text
+    from app.services.inicializacao import revisao_head
+
+    engine = create_engine(url)
+    with engine.begin() as conexao:
+        conexao.execute(text("CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        conexao.execute(text("DELETE FROM alembic_version"))
+        conexao.execute(text("INSERT INTO alembic_version (version_num) VALUES (:v)"), {"v": revisao_head()})
+    engine.dispose()
+
+def popular(url: str, livros: int, emprestimos: int, lote: int = 10000) -> None:
+    """Catálogo sintético e empréstimos devolvidos, inseridos em lotes."""
+    from datetime import timedelta
+    from sqlalchemy import create_engine, event, insert
+    from app.models import Categoria, Usuario, TipoUsuario, Livro, Emprestimo, StatusEmprestimo
+    from benchmarks.sugestoes import gerar_catalogo
+
+    agora = datetime.utcnow()
+    engine = create_engine(url)
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_connection, connection_record):
+            # Como em verificar_orcamento_sql.py: os CHECKs de Enum não valem no SQLite
+            dbapi_connection.execute("PRAGMA ignore_check_constraints = ON")
+
+    with engine.begin() as conexao:
+        conexao.execute(insert(Categoria), [{"id": 1, "nome": "Geral"}])
+        conexao.execute(insert(Usuario), [{
+            "id": 1, "nome_completo": "Funcionário", "cpf": "000.000.000-00", "telefone": "(11) 90000-0000",
+            "endereco": "Rua B, 2", "email": "funcionario@email.com",
+            "tipo": TipoUsuario.FUNCIONARIO, "matricula": "F001",
+        }])
+        linhas = []
+        for livro_id, titulo, autor in gerar_catalogo(livros):
+            linhas.append({
+                "id": livro_id, "titulo": titulo[:200], "autor": autor, "isbn": f"{livro_id:013d}",
+                "editora": "Editora", "ano_publicacao": 2000, "quantidade_total": 3,
+                "quantidade_disponivel": 3, "categoria_id": 1, "localizacao": "A1",
+            })
+            if len(linhas) == lote:
+                conexao.execute(insert(Livro), linhas)
+                linhas = []
+        if linhas:
+            conexao.execute(insert(Livro), linhas)
+        for inicio in range(0, emprestimos, lote):
+            conexao.execute(insert(Emprestimo), [
+                {
+                    "usuario_id": 1, "livro_id": i % livros + 1, "funcionario_id": 1,
+                    "data_emprestimo": agora - timedelta(days=30),
+                    "data_devolucao_prevista": agora - timedelta(days=15),
+                    "data_devolucao_real": agora - timedelta(days=16),
+                    "status": StatusEmprestimo.DEVOLVIDO,
+                }
+                for i in range(inicio, min(inicio + lote, emprestimos))
+            ])
+    engine.dispose()
+
+def revisao_git() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--modo", default=os.getenv("MODO_STARTUP", "criar_tabelas"))
+    parser.add_argument("--saida", type=Path, default=None, help="arquivo JSON Lines para acumular resultados")
+    parser.add_argument("--livros", type=int, default=100_000, help="catálogo do banco temporário")
+    parser.add_argument("--emprestimos", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        temporario = "DATABASE_URL" not in os.environ
+        ambiente = {
+            **os.environ,
+            "DATABASE_URL": os.getenv("DATABASE_URL", f"sqlite:///{diretorio}/cold_start.db"),
+            "SQL_ECHO": "false",
+            "MODO_STARTUP": "criar_tabelas",
+        }
+        # Primeira execução cria o schema; as medidas usam o modo pedido
+        medir_uma_vez(ambiente)
+        if temporario and args.livros:
+            # Um banco informado em DATABASE_URL é medido como está
+            popular(ambiente["DATABASE_URL"], args.livros, args.emprestimos)
+        if args.modo == "verificar_revisao":
+            carimbar_revisao(ambiente["DATABASE_URL"])
+        ambiente["MODO_STARTUP"] = args.modo
+        medicoes = [medir_uma_vez(ambiente) for _ in range(args.repeticoes)]
+
+    resultado = {
+        "data": datetime.utcnow().isoformat(timespec="seconds"),
+        "revisao": revisao_git(),
+        "modo": args.modo,
+        "repeticoes": args.repeticoes,
+        "livros": args.livros if temporario else None,
+        "emprestimos": args.emprestimos if temporario else None,
+    }
+    for chave in medicoes[0]:
+        resultado[chave] = round(statistics.median(m[chave] for m in medicoes), 2)
+
+    for chave, valor in resultado.items():
+        print(f"{chave}: {valor}")
+    if args.saida:
+        with args.saida.open("a", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps(resultado) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
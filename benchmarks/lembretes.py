@@ -0,0 +1,113 @@
+"""Vazão do envio de lembretes de devolução contra uma caixa SMTP local.
+
+Cria empréstimos vencendo nos próximos dias num SQLite em memória, sobe a
+caixa de benchmarks.caixa_smtp com um atraso por mensagem (o servidor SMTP
+real raramente responde em menos de alguns milissegundos) e mede mensagens
+por segundo em cada concorrência. Os lembretes são apagados entre as
+rodadas; no fim, uma segunda execução confirma que ninguém recebe de novo.
+
+    python -m benchmarks.lembretes --emprestimos 2000 --atraso 0.005
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SQL_ECHO", "false")
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, delete, event
+from sqlalchemy.pool import StaticPool
+
+import database
+from app.models import Usuario, TipoUsuario, Categoria, Livro, Emprestimo, LembreteEnviado
+from app.services.lembretes import enviar_lembretes
+from benchmarks.caixa_smtp import CaixaSMTP
+
+def _preparar_banco(emprestimos: int) -> None:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA ignore_check_constraints = ON")
+
+    database.Base.metadata.create_all(bind=engine)
+    database.SessionLocal.configure(bind=engine)
+
+    db = database.SessionLocal()
+    agora = datetime.utcnow()
+    db.add(Categoria(nome="Romance", descricao="Prosa"))
+    db.add(Usuario(
+        nome_completo="Funcionário", cpf="000.000.000-00", telefone="(11) 90000-0000",
+        endereco="Rua B, 2", email="funcionario@email.com",
+        tipo=TipoUsuario.FUNCIONARIO, matricula="F001"
+    ))
+    db.flush()
+    db.add(Livro(
+        titulo="Dom Casmurro", autor="Machado de Assis", isbn="9788500000001", editora="Garnier",
+        ano_publicacao=1899, quantidade_total=emprestimos, quantidade_disponivel=0,
+        categoria_id=1, localizacao="A1"
+    ))
+    db.flush()
+    # Um leitor por empréstimo, com prazos espalhados pelos próximos dois dias
+    db.add_all(
+        Usuario(
+            nome_completo=f"Leitor {i}", cpf=f"{i:011d}", telefone="(11) 90000-0001",
+            endereco=f"Rua A, {i}", email=f"leitor{i}@email.com"
+        )
+        for i in range(1, emprestimos + 1)
+    )
+    db.flush()
+    db.add_all(
+        Emprestimo(
+            usuario_id=i + 1, livro_id=1, funcionario_id=1,
+            data_emprestimo=agora - timedelta(days=12),
+            data_devolucao_prevista=agora + timedelta(minutes=i * 2880 // emprestimos + 1)
+        )
+        for i in range(1, emprestimos + 1)
+    )
+    db.commit()
+    db.close()
+
+def _limpar_lembretes() -> None:
+    db = database.SessionLocal()
+    db.execute(delete(LembreteEnviado))
+    db.commit()
+    db.close()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emprestimos", type=int, default=2000)
+    parser.add_argument("--atraso", type=float, default=0.005, help="segundos por mensagem na caixa")
+    parser.add_argument("--concorrencias", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    _preparar_banco(args.emprestimos)
+    caixa = CaixaSMTP(atraso=args.atraso)
+    porta = caixa.iniciar_em_thread()
+
+    def enviar(concorrencia: int) -> dict:
+        return asyncio.run(enviar_lembretes(
+            database.SessionLocal, dias=3, concorrencia=concorrencia, host="127.0.0.1", porta=porta
+        ))
+
+    try:
+        print("concorrência   enviados   conexões   segundos   mensagens/s")
+        for concorrencia in args.concorrencias:
+            _limpar_lembretes()
+            caixa.conexoes = 0
+            relatorio = enviar(concorrencia)
+            print(
+                f"{concorrencia:>12}{relatorio['enviados']:>11}{caixa.conexoes:>11}"
+                f"{relatorio['duracao_segundos']:>11.2f}{relatorio['mensagens_por_segundo']:>14.1f}"
+            )
+        repeticao = enviar(args.concorrencias[-1])
+        print(f"\nSegunda execução: {repeticao['enviados']} enviados (esperado 0)")
+    finally:
+        caixa.encerrar()
+    return 0 if repeticao["enviados"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
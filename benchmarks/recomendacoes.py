@@ -0,0 +1,76 @@
+"""Benchmark do índice de recomendações ("quem pegou este também pegou").
+
+Gera um histórico sintético de empréstimos (popularidade concentrada em
+poucos livros, como num acervo real), constrói o índice e mede tempo,
+memória (tracemalloc) e latência das consultas.
+
+    python -m benchmarks.recomendacoes --emprestimos 10000000 --processos 4
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SQL_ECHO", "false")
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from app.services.recomendacoes import IndiceRecomendacoes
+import settings
+
+def gerar_pares(emprestimos: int, livros: int, media_cesta: int, semente: int = 42):
+    # Pares (usuario_id, livro_id) já ordenados por usuário, como vêm do banco
+    aleatorio = random.Random(semente)
+    gerados = 0
+    usuario_id = 0
+    while gerados < emprestimos:
+        usuario_id += 1
+        tamanho = min(emprestimos - gerados, 1 + int(aleatorio.expovariate(1 / media_cesta)))
+        cesta = {1 + int(livros * aleatorio.random() ** 3) for _ in range(tamanho)}
+        for livro_id in cesta:
+            yield usuario_id, livro_id
+        gerados += tamanho
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emprestimos", type=int, default=10_000_000)
+    parser.add_argument("--livros", type=int, default=200_000)
+    parser.add_argument("--media-cesta", type=int, default=10)
+    parser.add_argument("--processos", type=int, default=settings.RECOMENDACOES_PROCESSOS or os.cpu_count() or 1)
+    parser.add_argument("--consultas", type=int, default=10000)
+    parser.add_argument("--sem-memoria", action="store_true", help="não usa tracemalloc, que deixa a construção mais lenta")
+    args = parser.parse_args()
+
+    indice = IndiceRecomendacoes(settings.RECOMENDACOES_VIZINHOS)
+    if not args.sem_memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    indice.construir(gerar_pares(args.emprestimos, args.livros, args.media_cesta), args.processos)
+    construcao = time.perf_counter() - inicio
+    if not args.sem_memoria:
+        memoria_mb, pico_mb = (valor / 1024 / 1024 for valor in tracemalloc.get_traced_memory())
+        tracemalloc.stop()
+
+    aleatorio = random.Random(7)
+    latencias = []
+    for _ in range(args.consultas):
+        livro_id = aleatorio.randint(1, args.livros)
+        inicio = time.perf_counter()
+        indice.recomendar(livro_id, 10)
+        latencias.append(time.perf_counter() - inicio)
+    latencias.sort()
+
+    print(f"emprestimos: {args.emprestimos}")
+    print(f"processos: {args.processos}")
+    print(f"construcao_s: {construcao:.1f}")
+    if not args.sem_memoria:
+        print(f"indice_mb: {memoria_mb:.1f}")
+        print(f"pico_construcao_mb: {pico_mb:.1f}")
+    print(f"consulta_p50_us: {latencias[len(latencias) // 2] * 1e6:.1f}")
+    print(f"consulta_p99_us: {latencias[int(len(latencias) * 0.99)] * 1e6:.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""Benchmark da simulação de tarifas de multa.
+
+Gera colunas sintéticas de atraso (como as carregadas por carregar_atrasos)
+e mede o tempo de simular() sobre elas.
+
+    python -m benchmarks.simulacao_multas --emprestimos 2000000
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SQL_ECHO", "false")
+
+import argparse
+import random
+import sys
+import time
+from decimal import Decimal
+
+from app.models import TipoUsuario
+from app.services.cotacao import ColunasAtraso, Tarifa, simular
+
+TARIFAS = {
+    TipoUsuario.CLIENTE: Tarifa(Decimal("1.50"), Decimal("30.00"), 2),
+    TipoUsuario.FUNCIONARIO: Tarifa(Decimal("0.75"), Decimal("15.00"), 5),
+}
+
+def gerar_colunas(emprestimos: int, usuarios: int, semente: int = 42) -> ColunasAtraso:
+    # Um grupo por empréstimo: o pior caso, sem nenhum agrupamento no banco
+    aleatorio = random.Random(semente)
+    colunas = ColunasAtraso()
+    tipos = [TipoUsuario.CLIENTE] * 9 + [TipoUsuario.FUNCIONARIO]
+    tipo_por_usuario = [aleatorio.choice(tipos) for _ in range(usuarios + 1)]
+    for _ in range(emprestimos):
+        usuario_id = aleatorio.randint(1, usuarios)
+        colunas.adicionar(usuario_id, tipo_por_usuario[usuario_id], aleatorio.randint(1, 365), 1)
+    return colunas
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emprestimos", type=int, default=2_000_000)
+    parser.add_argument("--usuarios", type=int, default=200_000)
+    args = parser.parse_args()
+
+    colunas = gerar_colunas(args.emprestimos, args.usuarios)
+    inicio = time.perf_counter()
+    resultado = simular(colunas, TARIFAS)
+    duracao = time.perf_counter() - inicio
+
+    print(f"emprestimos: {resultado['quantidade_emprestimos']}")
+    print(f"usuarios: {resultado['quantidade_usuarios']}")
+    print(f"total: {resultado['total']}")
+    print(f"simulacao_s: {duracao:.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Benchmark do índice de sugestões de títulos e autores.
+
+Monta o índice com um catálogo sintético, mede memória (tracemalloc), a
+latência de consultas por prefixo e a de inclusão de livros novos. Termina
+com código 1 se a memória passar de SUGESTOES_ORCAMENTO_MB.
+
+    python -m benchmarks.sugestoes --livros 1000000
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SQL_ECHO", "false")
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from app.services.sugestoes import IndiceSugestoes
+import settings
+
+PALAVRAS = [
+    "amor", "ação", "história", "memórias", "noite", "céu", "coração", "cidade",
+    "guerra", "paz", "mar", "sertão", "vida", "tempo", "caminho", "estrela",
+    "jardim", "silêncio", "viagem", "segredo", "última", "primeira", "canção",
+]
+NOMES = ["José", "Maria", "João", "Ana", "Érico", "Cecília", "Graciliano", "Clarice", "Jorge", "Lygia"]
+SOBRENOMES = ["Amado", "Lispector", "Veríssimo", "Meireles", "Ramos", "Telles", "Assis", "Andrade"]
+
+def gerar_catalogo(quantidade: int, semente: int = 42):
+    aleatorio = random.Random(semente)
+    # Autores se repetem, como num catálogo real
+    autores = [
+        f"{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {i}"
+        for i in range(max(1, quantidade // 20))
+    ]
+    for livro_id in range(1, quantidade + 1):
+        titulo = " ".join(aleatorio.choices(PALAVRAS, k=aleatorio.randint(2, 6))) + f" {livro_id}"
+        yield livro_id, titulo, aleatorio.choice(autores)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--livros", type=int, default=1_000_000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--novos", type=int, default=5000)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(7)
+    emprestimos = {aleatorio.randint(1, args.livros): aleatorio.randint(1, 500) for _ in range(args.livros // 10)}
+
+    indice = IndiceSugestoes()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    indice.montar(gerar_catalogo(args.livros), emprestimos)
+    construcao = time.perf_counter() - inicio
+    memoria_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+
+    prefixos = [p[:n] for p in PALAVRAS + NOMES for n in (2, 3, 5)]
+    inicio = time.perf_counter()
+    for i in range(args.consultas):
+        indice.sugerir(prefixos[i % len(prefixos)], 10)
+    latencia_ms = (time.perf_counter() - inicio) / args.consultas * 1000
+
+    novos = list(gerar_catalogo(args.livros + args.novos, semente=11))[args.livros:]
+    inicio = time.perf_counter()
+    for livro_id, titulo, autor in novos:
+        indice.definir(livro_id, titulo, autor)
+    inclusao_ms = (time.perf_counter() - inicio) / max(1, args.novos) * 1000
+
+    print(f"livros: {args.livros}")
+    print(f"construcao_segundos: {construcao:.2f}")
+    print(f"memoria_mb: {memoria_mb:.1f} (orçamento {settings.SUGESTOES_ORCAMENTO_MB})")
+    print(f"latencia_media_ms: {latencia_ms:.3f}")
+    print(f"inclusao_media_ms: {inclusao_ms:.3f}")
+    return 0 if memoria_mb <= settings.SUGESTOES_ORCAMENTO_MB else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
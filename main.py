@@ -1,8 +1,23 @@
+import asyncio
 import uvicorn 
-from fastapi import FastAPI
-from database import engine, Base 
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm.exc import StaleDataError
+from database import SessionLocal, aquecer_pool
 from app.models import Usuario, Categoria, Livro, Emprestimo, Reserva, Multa
-from app.routes import usuarios, categorias, livros, emprestimos, reservas, multas
+from app.routes import usuarios, categorias, livros, emprestimos, reservas, multas, alteracoes, eventos, relatorios, jobs
+from app.services.disponibilidade import indice_disponibilidade
+from app.services.sugestoes import indice_sugestoes
+from app.services.recomendacoes import indice_recomendacoes
+from app.services.inicializacao import preparar_banco
+from app.services import circulacao, particoes
+from app.services.contagens import cache_contagens
+from app.services.auditoria import gravador_auditoria, autor_atual
+from app.services.jobs import executor_jobs
+from app.services.capas import servico_capas
+from app.services.eventos import hub_eventos
+from app.services.resumos import cache_resumos
+import settings
 
 app = FastAPI(
     title="API de Biblioteca",
@@ -12,8 +27,74 @@ app = FastAPI(
 
 @app.on_event("startup")
 async def startup():
-    # Criar todas as tabelas
-    Base.metadata.create_all(bind=engine)
+    # Criar as tabelas ou só conferir a revisão do Alembic, conforme MODO_STARTUP
+    preparar_banco(settings.MODO_STARTUP)
+    gravador_auditoria.iniciar(SessionLocal)
+    if settings.JOBS_NA_API:
+        executor_jobs.iniciar(SessionLocal)
+    if settings.DB_PRE_CONEXOES:
+        asyncio.create_task(asyncio.to_thread(aquecer_pool, settings.DB_PRE_CONEXOES))
+    # Índices em memória: carga completa em segundo plano, depois seguem o log de
+    # alterações; até lá as rotas consultam o banco
+    asyncio.create_task(indice_disponibilidade.sincronizar_periodicamente(
+        SessionLocal, settings.DISPONIBILIDADE_SINCRONIZACAO_SEGUNDOS,
+        settings.DISPONIBILIDADE_RECARGA_SEGUNDOS
+    ))
+    asyncio.create_task(indice_sugestoes.sincronizar_periodicamente(
+        SessionLocal, settings.SUGESTOES_ATUALIZACAO_SEGUNDOS,
+        settings.SUGESTOES_RECARGA_SEGUNDOS
+    ))
+    # Eventos SSE de todos os workers, lidos do log de alterações
+    asyncio.create_task(hub_eventos.acompanhar_periodicamente(
+        SessionLocal, settings.EVENTOS_INTERVALO_SEGUNDOS
+    ))
+    # Recomendações: carrega o arquivo do job, incremental a cada intervalo e pede a reconstrução periódica
+    asyncio.create_task(indice_recomendacoes.atualizar_periodicamente(
+        SessionLocal, settings.RECOMENDACOES_ATUALIZACAO_SEGUNDOS,
+        settings.RECOMENDACOES_RECONSTRUCAO_SEGUNDOS
+    ))
+    # Invalidação dos resumos de conta pelas escritas dos outros workers
+    asyncio.create_task(cache_resumos.sincronizar_periodicamente(
+        SessionLocal, settings.RESUMO_SINCRONIZACAO_SEGUNDOS
+    ))
+    # Recálculo dos contadores de X-Total-Count
+    asyncio.create_task(cache_contagens.recalcular_periodicamente(
+        SessionLocal, settings.CONTAGEM_RECALCULO_SEGUNDOS
+    ))
+    # Agregados de circulação, quando não agendados fora da API
+    if settings.CIRCULACAO_INTERVALO_SEGUNDOS:
+        asyncio.create_task(circulacao.atualizar_periodicamente(
+            SessionLocal, settings.CIRCULACAO_INTERVALO_SEGUNDOS
+        ))
+    # Partições mensais à frente, quando a rotação não é agendada fora da API
+    if settings.PARTICOES_INTERVALO_SEGUNDOS:
+        asyncio.create_task(particoes.rotacionar_periodicamente(
+            SessionLocal, settings.PARTICOES_INTERVALO_SEGUNDOS
+        ))
+
+@app.on_event("shutdown")
+def shutdown():
+    # Grava o que ainda está na fila da auditoria antes de o processo sair
+    gravador_auditoria.encerrar()
+    executor_jobs.encerrar()
+    servico_capas.encerrar()
+
+@app.middleware("http")
+async def identificar_autor(request: Request, call_next):
+    token = autor_atual.set(request.headers.get("x-operador"))
+    try:
+        return await call_next(request)
+    finally:
+        autor_atual.reset(token)
+
+@app.exception_handler(StaleDataError)
+async def conflito_de_versao(request: Request, exc: StaleDataError):
+    # Outra requisição alterou a linha entre a leitura e o UPDATE/DELETE desta
+    codigo = status.HTTP_412_PRECONDITION_FAILED if "if-match" in request.headers else status.HTTP_409_CONFLICT
+    return JSONResponse(
+        status_code=codigo,
+        content={"detail": "O registro foi alterado por outra requisição"}
+    )
 
 @app.get("/")
 def check_api():
@@ -26,6 +107,10 @@ app.include_router(livros.router)
 app.include_router(emprestimos.router)
 app.include_router(reservas.router)
 app.include_router(multas.router)
+app.include_router(alteracoes.router)
+app.include_router(eventos.router)
+app.include_router(relatorios.router)
+app.include_router(jobs.router)
     
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=5000, reload=True)
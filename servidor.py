@@ -0,0 +1,225 @@
+"""Servidor de produção com vários workers.
+
+O processo principal carrega a aplicação uma vez (preload), abre o socket e
+faz fork de N workers uvicorn que compartilham esse socket. Workers são
+reciclados após um número de requisições ou ao passar do limite de memória.
+O orçamento de conexões do MySQL (DB_MAX_CONEXOES) conta todo processo que
+abre conexões: o executor de jobs e os processos do pool dele têm um pool
+fixo de JOBS_CONEXOES_POR_PROCESSO, e o restante é dividido entre os workers.
+
+Cada worker tem o próprio estado em memória: os índices de disponibilidade
+e de sugestões, o hub de eventos SSE e o cache de resumos. Nenhum deles
+depende das escritas do próprio processo: todos seguem o log de alterações
+(app.services.alteracoes), então um worker vê as escritas dos outros e dos
+jobs com o atraso do intervalo de leitura de cada um, de 0,5 a 1 s por
+padrão (DISPONIBILIDADE_SINCRONIZACAO_SEGUNDOS, SUGESTOES_ATUALIZACAO_SEGUNDOS,
+EVENTOS_INTERVALO_SEGUNDOS e RESUMO_SINCRONIZACAO_SEGUNDOS).
+A exceção é o contador sem filtros do X-Total-Count, que só é exato com
+um único worker (CONTAGEM_PROCESSO_UNICO); com vários, ele converge no
+recálculo periódico.
+
+    python servidor.py --workers 4 --porta 5000
+"""
+import argparse
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+import settings
+
+def rss_mb() -> float:
+    # Memória residente do processo atual (Linux)
+    try:
+        with open("/proc/self/statm") as statm:
+            paginas = int(statm.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def conexoes_jobs() -> int:
+    # O executor (despacho e encerramento) e cada processo do pool, todos com o
+    # pool fixo de database.limitar_pool. Os processos que o job recomendacoes
+    # cria só calculam e nunca abrem conexão
+    return (1 + settings.JOBS_PROCESSOS) * settings.JOBS_CONEXOES_POR_PROCESSO
+
+def dividir_pool(workers: int, com_jobs: bool) -> int:
+    # Sem overflow: cada worker nunca passa da sua fatia do que sobra para a web
+    disponiveis = settings.DB_MAX_CONEXOES - (conexoes_jobs() if com_jobs else 0)
+    if disponiveis < workers:
+        raise SystemExit(
+            f"DB_MAX_CONEXOES={settings.DB_MAX_CONEXOES} não comporta {workers} workers"
+            + (f" e {conexoes_jobs()} conexões dos jobs" if com_jobs else "")
+        )
+    return disponiveis // workers
+
+def _vigiar_memoria(servidor, limite_mb: int, intervalo: float = 5.0) -> None:
+    while not servidor.should_exit:
+        if rss_mb() > limite_mb:
+            print(f"[worker {os.getpid()}] RSS acima de {limite_mb} MB, reciclando", flush=True)
+            servidor.should_exit = True
+            return
+        time.sleep(intervalo)
+
+def _executar_worker(sock: socket.socket, args) -> None:
+    import uvicorn
+    from database import engine
+    from main import app
+
+    # Conexões herdadas do processo principal não podem ser usadas após o fork
+    engine.dispose(close=False)
+
+    # Variação no limite para os workers não reciclarem todos ao mesmo tempo
+    max_requisicoes = None
+    if args.max_requisicoes:
+        max_requisicoes = args.max_requisicoes + random.randint(0, args.max_requisicoes // 10)
+
+    config = uvicorn.Config(
+        app,
+        limit_max_requests=max_requisicoes,
+        timeout_graceful_shutdown=args.encerramento,
+        log_level="info",
+    )
+    servidor = uvicorn.Server(config)
+    if args.max_rss_mb:
+        threading.Thread(
+            target=_vigiar_memoria, args=(servidor, args.max_rss_mb), daemon=True
+        ).start()
+    servidor.run(sockets=[sock])
+
+def _iniciar_worker(sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            _executar_worker(sock, args)
+            os._exit(0)
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+    return pid
+
+def _iniciar_executor_jobs() -> int:
+    # Um único executor de jobs, fora dos workers: cada worker teria o próprio pool
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            from database import limitar_pool
+            from app.services.jobs import executor_jobs
+
+            # Pool fixo, descontado em dividir_pool; o pool de processos herda esta engine
+            limitar_pool(settings.JOBS_CONEXOES_POR_PROCESSO)
+            executor_jobs.executar_ate_sinal()
+            os._exit(0)
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+    return pid
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=settings.SERVIDOR_HOST)
+    parser.add_argument("--porta", type=int, default=settings.SERVIDOR_PORTA)
+    parser.add_argument("--workers", type=int, default=settings.SERVIDOR_WORKERS or os.cpu_count() or 1)
+    parser.add_argument("--max-requisicoes", type=int, default=settings.SERVIDOR_MAX_REQUISICOES)
+    parser.add_argument("--max-rss-mb", type=int, default=settings.SERVIDOR_MAX_RSS_MB)
+    parser.add_argument("--encerramento", type=float, default=settings.SERVIDOR_ENCERRAMENTO_SEGUNDOS)
+    args = parser.parse_args()
+
+    # Com JOBS_NA_API, o executor de jobs sobe junto e entra no orçamento
+    jobs_no_servidor = settings.JOBS_NA_API
+    settings.DB_POOL_SIZE = dividir_pool(args.workers, jobs_no_servidor)
+    settings.DB_MAX_OVERFLOW = 0
+    settings.CONTAGEM_PROCESSO_UNICO = args.workers == 1
+
+    if not hasattr(os, "fork"):
+        # Windows: sem fork, roda um único processo
+        import uvicorn
+        uvicorn.run("main:app", host=args.host, port=args.porta)
+        return 0
+
+    # O executor de jobs roda num processo próprio, não em cada worker
+    settings.JOBS_NA_API = False
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.porta))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Preload: importações e montagem das rotas acontecem uma vez, antes do fork
+    import main as _app  # noqa: F401
+    from database import engine
+    from app.services.inicializacao import preparar_banco
+
+    # Banco preparado uma vez aqui, para os workers não disputarem o create_all
+    preparar_banco(settings.MODO_STARTUP)
+    settings.MODO_STARTUP = "nenhum"
+    engine.dispose()
+
+    print(
+        f"[principal {os.getpid()}] {args.workers} workers em {args.host}:{args.porta}, "
+        f"pool de {settings.DB_POOL_SIZE} conexões por worker"
+        + (f", {conexoes_jobs()} para os jobs" if jobs_no_servidor else ""),
+        flush=True
+    )
+
+    workers = {_iniciar_worker(sock, args) for _ in range(args.workers)}
+    executor = _iniciar_executor_jobs() if jobs_no_servidor else None
+    if executor is not None:
+        workers.add(executor)
+    encerrando = False
+
+    def _encerrar(signum, frame):
+        nonlocal encerrando
+        encerrando = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _encerrar)
+    signal.signal(signal.SIGINT, _encerrar)
+
+    prazo = None
+    while workers:
+        if encerrando and prazo is None:
+            prazo = time.monotonic() + args.encerramento
+        if prazo is not None and time.monotonic() > prazo:
+            # Passou do tempo de drenagem: força a saída de quem restou
+            for pid in workers:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        workers.discard(pid)
+        if encerrando:
+            continue
+        if pid == executor:
+            executor = _iniciar_executor_jobs()
+            workers.add(executor)
+        else:
+            # Worker reciclado (limite de requisições/memória) ou que caiu: repõe
+            workers.add(_iniciar_worker(sock, args))
+
+    sock.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,2 +1,169 @@
-import uvicorn 
-from fastapi import FastAPI
+import os
+from decimal import Decimal
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Banco de dados
+DB_USER = os.getenv("DB_USER", "root")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "root")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", "3306"))
+DB_NAME = os.getenv("DB_NAME", "meu_projeto")
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+SQL_ECHO = os.getenv("SQL_ECHO", "true").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Limite de conexões que todos os workers juntos podem abrir no MySQL
+DB_MAX_CONEXOES = int(os.getenv("DB_MAX_CONEXOES", "100"))
+# Conexões abertas em segundo plano logo após o startup (0 desliga)
+DB_PRE_CONEXOES = int(os.getenv("DB_PRE_CONEXOES", "0"))
+
+# Preparação do banco no startup:
+#   criar_tabelas     - cria o banco e as tabelas que faltam (desenvolvimento)
+#   verificar_revisao - uma consulta confere se o banco está na revisão head do Alembic
+#   nenhum            - não faz nada
+MODO_STARTUP = os.getenv("MODO_STARTUP", "criar_tabelas")
+
+# Arquivamento de empréstimos devolvidos e multas quitadas
+ARQUIVAMENTO_IDADE_DIAS = int(os.getenv("ARQUIVAMENTO_IDADE_DIAS", "365"))
+ARQUIVAMENTO_TAMANHO_LOTE = int(os.getenv("ARQUIVAMENTO_TAMANHO_LOTE", "500"))
+
+# Particionamento mensal de emprestimos e multas no MySQL (app.services.particoes)
+PARTICOES_MESES_FUTUROS = int(os.getenv("PARTICOES_MESES_FUTUROS", "3"))
+# 0 desativa a rotação dentro da API; com vários workers, prefira agendar o comando
+PARTICOES_INTERVALO_SEGUNDOS = float(os.getenv("PARTICOES_INTERVALO_SEGUNDOS", "0"))
+
+# Exclusão em cascata por conjuntos (app.services.exclusao)
+EXCLUSAO_TAMANHO_LOTE = int(os.getenv("EXCLUSAO_TAMANHO_LOTE", "500"))
+
+# Auditoria gravada fora do caminho da requisição (app.services.auditoria)
+AUDITORIA_TAMANHO_FILA = int(os.getenv("AUDITORIA_TAMANHO_FILA", "10000"))
+AUDITORIA_TAMANHO_LOTE = int(os.getenv("AUDITORIA_TAMANHO_LOTE", "500"))
+AUDITORIA_INTERVALO_SEGUNDOS = float(os.getenv("AUDITORIA_INTERVALO_SEGUNDOS", "1"))
+# Quanto um commit espera por espaço na fila cheia antes de gravar ele mesmo
+AUDITORIA_ESPERA_SEGUNDOS = float(os.getenv("AUDITORIA_ESPERA_SEGUNDOS", "0.5"))
+AUDITORIA_ENCERRAMENTO_SEGUNDOS = float(os.getenv("AUDITORIA_ENCERRAMENTO_SEGUNDOS", "10"))
+# Registros que o banco recusou, um arquivo por processo (auditoria_pendente.<pid>.jsonl),
+# regravados pela thread da auditoria quando ele volta
+AUDITORIA_ARQUIVO_PENDENTE = os.getenv("AUDITORIA_ARQUIVO_PENDENTE", "auditoria_pendente.jsonl")
+
+# Índice em memória de disponibilidade de livros
+DISPONIBILIDADE_RECARGA_SEGUNDOS = float(os.getenv("DISPONIBILIDADE_RECARGA_SEGUNDOS", "300"))
+# Intervalo da leitura do log de alterações que mantém o índice em dia com todos os workers
+DISPONIBILIDADE_SINCRONIZACAO_SEGUNDOS = float(os.getenv("DISPONIBILIDADE_SINCRONIZACAO_SEGUNDOS", "1"))
+
+# Índice de prefixos para sugestões de títulos e autores
+# Leitura do log de alterações e carga completa, que corrige as contagens de empréstimos apagados
+SUGESTOES_ATUALIZACAO_SEGUNDOS = float(os.getenv("SUGESTOES_ATUALIZACAO_SEGUNDOS", "1"))
+SUGESTOES_RECARGA_SEGUNDOS = float(os.getenv("SUGESTOES_RECARGA_SEGUNDOS", "3600"))
+# Prefixos até este tamanho guardam os SUGESTOES_TOPO mais emprestados (o maior limite da rota)
+SUGESTOES_PREFIXO_TOPO = int(os.getenv("SUGESTOES_PREFIXO_TOPO", "3"))
+SUGESTOES_TOPO = int(os.getenv("SUGESTOES_TOPO", "50"))
+# Chaves novas e removidas acumuladas antes de forçar uma carga completa
+SUGESTOES_BUFFER_MAXIMO = int(os.getenv("SUGESTOES_BUFFER_MAXIMO", "10000"))
+SUGESTOES_ORCAMENTO_MB = int(os.getenv("SUGESTOES_ORCAMENTO_MB", "300"))
+
+# Feed de alterações
+ALTERACOES_JANELA_SEGUNDOS = float(os.getenv("ALTERACOES_JANELA_SEGUNDOS", "5"))
+
+# Stream de eventos de circulação (SSE)
+EVENTOS_TAMANHO_FILA = int(os.getenv("EVENTOS_TAMANHO_FILA", "100"))
+EVENTOS_KEEPALIVE_SEGUNDOS = float(os.getenv("EVENTOS_KEEPALIVE_SEGUNDOS", "15"))
+# Intervalo da leitura do log de alterações que alimenta o hub de cada worker
+EVENTOS_INTERVALO_SEGUNDOS = float(os.getenv("EVENTOS_INTERVALO_SEGUNDOS", "0.5"))
+# Registros cujo último estado publicado é lembrado, para não repetir eventos sem mudança
+EVENTOS_MEMORIA = int(os.getenv("EVENTOS_MEMORIA", "100000"))
+
+# Agregados diários de circulação (app.services.circulacao)
+CIRCULACAO_DIAS_POR_LOTE = int(os.getenv("CIRCULACAO_DIAS_POR_LOTE", "31"))
+# 0 desativa a atualização dentro da API; com vários workers, prefira agendar o comando
+CIRCULACAO_INTERVALO_SEGUNDOS = float(os.getenv("CIRCULACAO_INTERVALO_SEGUNDOS", "0"))
+
+# Recomendações "quem pegou este também pegou"
+RECOMENDACOES_VIZINHOS = int(os.getenv("RECOMENDACOES_VIZINHOS", "20"))
+RECOMENDACOES_MAX_CESTA = int(os.getenv("RECOMENDACOES_MAX_CESTA", "200"))
+RECOMENDACOES_PROCESSOS = int(os.getenv("RECOMENDACOES_PROCESSOS", "0"))  # 0 = número de CPUs
+RECOMENDACOES_ATUALIZACAO_SEGUNDOS = float(os.getenv("RECOMENDACOES_ATUALIZACAO_SEGUNDOS", "60"))
+RECOMENDACOES_RECONSTRUCAO_SEGUNDOS = float(os.getenv("RECOMENDACOES_RECONSTRUCAO_SEGUNDOS", "3600"))
+# Gravado pelo job "recomendacoes" e lido pelos workers; precisa estar visível a todos
+RECOMENDACOES_ARQUIVO = os.getenv("RECOMENDACOES_ARQUIVO", "indice_recomendacoes.bin")
+
+# X-Total-Count das listagens (app.services.contagens)
+CONTAGEM_TTL_SEGUNDOS = float(os.getenv("CONTAGEM_TTL_SEGUNDOS", "30"))
+CONTAGEM_RECALCULO_SEGUNDOS = float(os.getenv("CONTAGEM_RECALCULO_SEGUNDOS", "300"))
+# servidor.py desliga quando sobe mais de um worker: os contadores deixam de ser exatos
+CONTAGEM_PROCESSO_UNICO = os.getenv("CONTAGEM_PROCESSO_UNICO", "true").lower() == "true"
+
+# Jobs em segundo plano (app.services.jobs)
+JOBS_PROCESSOS = int(os.getenv("JOBS_PROCESSOS", "2"))
+JOBS_INTERVALO_SEGUNDOS = float(os.getenv("JOBS_INTERVALO_SEGUNDOS", "2"))
+JOBS_PROGRESSO_INTERVALO_SEGUNDOS = float(os.getenv("JOBS_PROGRESSO_INTERVALO_SEGUNDOS", "1"))
+JOBS_ENCERRAMENTO_SEGUNDOS = float(os.getenv("JOBS_ENCERRAMENTO_SEGUNDOS", "10"))
+# Sem batimento do executor por este tempo, um job em execução passa a FALHOU
+JOBS_BATIMENTO_LIMITE_SEGUNDOS = float(os.getenv("JOBS_BATIMENTO_LIMITE_SEGUNDOS", "60"))
+# Pool fixo do executor e de cada processo de jobs: a sessão do job, a do progresso
+# e a de quem abre sessões próprias (lembretes); descontado de DB_MAX_CONEXOES
+JOBS_CONEXOES_POR_PROCESSO = int(os.getenv("JOBS_CONEXOES_POR_PROCESSO", "3"))
+# Um único executor por banco: false quando roda à parte (python -m app.services.jobs);
+# servidor.py desliga nos workers e sobe o executor num processo próprio
+JOBS_NA_API = os.getenv("JOBS_NA_API", "true").lower() == "true"
+
+# Lembretes de devolução por e-mail (app.services.lembretes)
+LEMBRETES_DIAS_ANTECEDENCIA = int(os.getenv("LEMBRETES_DIAS_ANTECEDENCIA", "3"))
+LEMBRETES_TAMANHO_LOTE = int(os.getenv("LEMBRETES_TAMANHO_LOTE", "500"))
+# Envios simultâneos; cada um mantém a própria conexão SMTP aberta
+LEMBRETES_CONCORRENCIA = int(os.getenv("LEMBRETES_CONCORRENCIA", "8"))
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORTA = int(os.getenv("SMTP_PORTA", "25"))
+SMTP_USUARIO = os.getenv("SMTP_USUARIO", "")
+SMTP_SENHA = os.getenv("SMTP_SENHA", "")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+SMTP_REMETENTE = os.getenv("SMTP_REMETENTE", "biblioteca@localhost")
+SMTP_TIMEOUT_SEGUNDOS = float(os.getenv("SMTP_TIMEOUT_SEGUNDOS", "10"))
+
+# Capas dos livros servidas em tamanhos reduzidos (app.services.capas)
+CAPAS_DIRETORIO = os.getenv("CAPAS_DIRETORIO", "cache_capas")
+CAPAS_CACHE_MAXIMO_MB = int(os.getenv("CAPAS_CACHE_MAXIMO_MB", "512"))
+CAPAS_THREADS = int(os.getenv("CAPAS_THREADS", "0"))  # 0 = padrão do ThreadPoolExecutor
+CAPAS_TIMEOUT_SEGUNDOS = float(os.getenv("CAPAS_TIMEOUT_SEGUNDOS", "10"))
+CAPAS_ORIGEM_MAXIMO_BYTES = int(os.getenv("CAPAS_ORIGEM_MAXIMO_BYTES", str(10 * 1024 * 1024)))
+CAPAS_QUALIDADE_JPEG = int(os.getenv("CAPAS_QUALIDADE_JPEG", "85"))
+# Hosts de onde as capas podem vir, separados por vírgula (vazio = qualquer host público)
+CAPAS_HOSTS_PERMITIDOS = {host.strip().lower() for host in os.getenv("CAPAS_HOSTS_PERMITIDOS", "").split(",") if host.strip()}
+# Libera endereços privados, de loopback e de link local como origem (só para testes)
+CAPAS_PERMITIR_REDE_PRIVADA = os.getenv("CAPAS_PERMITIR_REDE_PRIVADA", "false").lower() == "true"
+CAPAS_MAX_REDIRECIONAMENTOS = int(os.getenv("CAPAS_MAX_REDIRECIONAMENTOS", "3"))
+# Por quanto tempo uma origem que falhou não é consultada de novo
+CAPAS_FALHA_SEGUNDOS = float(os.getenv("CAPAS_FALHA_SEGUNDOS", "60"))
+# Cache-Control das respostas; a revalidação depois disso usa o ETag
+CAPAS_MAX_AGE_SEGUNDOS = int(os.getenv("CAPAS_MAX_AGE_SEGUNDOS", "604800"))
+
+# Filtros e ordenação das listagens (app.routes.listagem)
+# Acima disso, ordenar por coluna sem índice vira filesort da tabela inteira: 400
+LISTAGEM_ORDENACAO_SEM_INDICE_MAXIMO = int(os.getenv("LISTAGEM_ORDENACAO_SEM_INDICE_MAXIMO", "10000"))
+
+# Resumo da conta do usuário (GET /usuarios/{id}/resumo)
+RESUMO_TTL_SEGUNDOS = float(os.getenv("RESUMO_TTL_SEGUNDOS", "10"))
+# Leitura do log de alterações que invalida os resumos alterados por outros workers
+RESUMO_SINCRONIZACAO_SEGUNDOS = float(os.getenv("RESUMO_SINCRONIZACAO_SEGUNDOS", "1"))
+
+# Tarifa das multas por atraso, com a regra de POST /multas/simulacao (app.services.cotacao)
+MULTA_VALOR_POR_DIA = Decimal(os.getenv("MULTA_VALOR_POR_DIA", "1.00"))
+# Vazio: sem teto
+MULTA_TETO = Decimal(os.getenv("MULTA_TETO")) if os.getenv("MULTA_TETO") else None
+MULTA_DIAS_CARENCIA = int(os.getenv("MULTA_DIAS_CARENCIA", "0"))
+# Tipos de usuário (valores de TipoUsuario, separados por vírgula) que não pagam multa
+MULTA_TIPOS_ISENTOS = {tipo.strip().lower() for tipo in os.getenv("MULTA_TIPOS_ISENTOS", "").split(",") if tipo.strip()}
+
+# Servidor de produção (servidor.py)
+SERVIDOR_HOST = os.getenv("SERVIDOR_HOST", "0.0.0.0")
+SERVIDOR_PORTA = int(os.getenv("SERVIDOR_PORTA", "5000"))
+SERVIDOR_WORKERS = int(os.getenv("SERVIDOR_WORKERS", "0"))
+SERVIDOR_MAX_REQUISICOES = int(os.getenv("SERVIDOR_MAX_REQUISICOES", "10000"))
+SERVIDOR_MAX_RSS_MB = int(os.getenv("SERVIDOR_MAX_RSS_MB", "512"))
+SERVIDOR_ENCERRAMENTO_SEGUNDOS = float(os.getenv("SERVIDOR_ENCERRAMENTO_SEGUNDOS", "30"))
@@ -0,0 +1,140 @@
+"""Confere que edições do catálogo não desfazem empréstimos concorrentes.
+
+Empréstimos e devoluções mudam quantidade_disponivel num UPDATE atômico que
+não incrementa a versão do livro. Este roteiro reproduz, contra um SQLite em
+memória, a intercalação em que um cliente lê o livro, um empréstimo acontece
+e o cliente grava a edição com o If-Match da leitura: o empréstimo tem que
+continuar descontado. Também confere que mudar quantidade_total leva o mesmo
+delta para quantidade_disponivel. Termina com código 1 quando alguma
+verificação falha.
+
+    python verificar_estoque_concorrente.py
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SQL_ECHO", "false")
+
+import sys
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+import database
+from main import app
+from app.services.auditoria import gravador_auditoria
+from app.models import Usuario, TipoUsuario, Categoria
+
+LIVRO = {
+    "titulo": "Dom Casmurro",
+    "autor": "Machado de Assis",
+    "isbn": "9788500000001",
+    "editora": "Garnier",
+    "ano_publicacao": 1899,
+    "quantidade_total": 5,
+    "quantidade_disponivel": 5,
+    "categoria_id": 1,
+    "localizacao": "A1",
+}
+
+def _criar_banco() -> None:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # Como em verificar_orcamento_sql.py: os CHECKs de Enum não valem no SQLite
+        dbapi_connection.execute("PRAGMA ignore_check_constraints = ON")
+
+    database.Base.metadata.create_all(bind=engine)
+    database.SessionLocal.configure(bind=engine)
+
+    db = database.SessionLocal()
+    db.add(Categoria(nome="Romance"))
+    db.add(Usuario(
+        nome_completo="Leitor", cpf="000.000.000-01", telefone="(11) 90000-0001",
+        endereco="Rua A, 1", email="leitor@email.com"
+    ))
+    db.add(Usuario(
+        nome_completo="Funcionário", cpf="000.000.000-02", telefone="(11) 90000-0002",
+        endereco="Rua B, 2", email="funcionario@email.com",
+        tipo=TipoUsuario.FUNCIONARIO, matricula="F001"
+    ))
+    db.commit()
+    db.close()
+
+def _emprestar(client: TestClient, livro_id: int) -> None:
+    resposta = client.post("/emprestimos/", json={
+        "usuario_id": 1, "livro_id": livro_id, "funcionario_id": 2,
+        "data_devolucao_prevista": (datetime.utcnow() + timedelta(days=15)).isoformat(),
+    })
+    assert resposta.status_code == 201, resposta.text
+
+def _disponivel(client: TestClient, livro_id: int) -> int:
+    return client.get(f"/livros/{livro_id}").json()["quantidade_disponivel"]
+
+def verificar(client: TestClient) -> list[str]:
+    falhas = []
+    livro_id = client.post("/livros/", json=LIVRO).json()["id"]
+
+    # PUT com o If-Match lido antes do empréstimo
+    lido = client.get(f"/livros/{livro_id}")
+    _emprestar(client, livro_id)
+    resposta = client.put(
+        f"/livros/{livro_id}", json={**lido.json(), "localizacao": "A2"},
+        headers={"If-Match": lido.headers["ETag"]}
+    )
+    if resposta.status_code != 200:
+        falhas.append(f"PUT após empréstimo: {resposta.status_code} {resposta.text}")
+    elif (disponivel := _disponivel(client, livro_id)) != 4:
+        falhas.append(f"PUT após empréstimo: quantidade_disponivel {disponivel}, esperado 4")
+
+    # PATCH com o If-Match lido antes do empréstimo, tentando gravar o estoque lido
+    lido = client.get(f"/livros/{livro_id}")
+    _emprestar(client, livro_id)
+    resposta = client.patch(
+        f"/livros/{livro_id}", json={"quantidade_disponivel": 4, "localizacao": "A3"},
+        headers={"If-Match": lido.headers["ETag"]}
+    )
+    if resposta.status_code != 200:
+        falhas.append(f"PATCH após empréstimo: {resposta.status_code} {resposta.text}")
+    elif (disponivel := _disponivel(client, livro_id)) != 3:
+        falhas.append(f"PATCH após empréstimo: quantidade_disponivel {disponivel}, esperado 3")
+
+    # Novos exemplares somam ao estoque do banco, mesmo com leitura anterior ao empréstimo
+    lido = client.get(f"/livros/{livro_id}")
+    _emprestar(client, livro_id)
+    resposta = client.patch(
+        f"/livros/{livro_id}", json={"quantidade_total": 7},
+        headers={"If-Match": lido.headers["ETag"]}
+    )
+    if resposta.status_code != 200:
+        falhas.append(f"PATCH quantidade_total: {resposta.status_code} {resposta.text}")
+    elif (disponivel := _disponivel(client, livro_id)) != 4:
+        falhas.append(f"PATCH quantidade_total: quantidade_disponivel {disponivel}, esperado 4")
+
+    # O total não pode ficar abaixo dos exemplares emprestados (3)
+    resposta = client.put(f"/livros/{livro_id}", json={**LIVRO, "quantidade_total": 2})
+    if resposta.status_code != 400:
+        falhas.append(f"PUT abaixo dos emprestados: {resposta.status_code}, esperado 400")
+    return falhas
+
+def main() -> int:
+    _criar_banco()
+    client = TestClient(app)
+    falhas = verificar(client)
+    gravador_auditoria.encerrar()
+    for falha in falhas:
+        print(f"FALHA  {falha}")
+    if falhas:
+        return 1
+    print("Edições do catálogo preservam os empréstimos concorrentes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
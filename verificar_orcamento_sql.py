@@ -0,0 +1,245 @@
+"""Verifica o orçamento de comandos SQL de cada endpoint.
+
+Executa cada endpoint contra um SQLite em memória, registra os comandos
+emitidos pela engine e compara com orcamento_sql.json. Termina com código 1
+quando algum endpoint passa do orçamento, mostrando o diff dos comandos.
+
+    python verificar_orcamento_sql.py              # verifica
+    python verificar_orcamento_sql.py --atualizar  # regrava o orçamento
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SQL_ECHO", "false")
+
+import argparse
+import difflib
+import json
+import re
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+import database
+from main import app
+from app.services.auditoria import gravador_auditoria
+from app.services.recomendacoes import indice_recomendacoes
+from app.services.disponibilidade import indice_disponibilidade
+from app.models import (
+    Usuario, TipoUsuario, Categoria, Livro, Emprestimo, StatusEmprestimo
+)
+
+ARQUIVO_ORCAMENTO = Path(__file__).with_name("orcamento_sql.json")
+
+FUTURO = "2099-01-01T00:00:00"
+
+USUARIO = {
+    "nome_completo": "Maria Souza",
+    "cpf": "111.222.333-44",
+    "telefone": "(11) 91234-5678",
+    "endereco": "Rua das Flores, 10",
+    "email": "maria@email.com",
+}
+
+LIVRO = {
+    "titulo": "Dom Casmurro",
+    "autor": "Machado de Assis",
+    "isbn": "9788500000002",
+    "editora": "Garnier",
+    "ano_publicacao": 1899,
+    "quantidade_total": 3,
+    "quantidade_disponivel": 3,
+    "categoria_id": 1,
+    "localizacao": "A1",
+}
+
+# (nome, método, caminho, corpo) executados em ordem sobre o mesmo banco
+CENARIOS = [
+    ("usuarios.criar", "POST", "/usuarios/", USUARIO),
+    ("usuarios.listar", "GET", "/usuarios/", None),
+    ("usuarios.buscar", "GET", "/usuarios/1", None),
+    ("usuarios.resumo", "GET", "/usuarios/1/resumo", None),
+    ("usuarios.atualizar", "PUT", "/usuarios/4", {**USUARIO, "endereco": "Rua das Flores, 20"}),
+    ("usuarios.atualizar_parcial", "PATCH", "/usuarios/4", {"telefone": "(11) 99999-0000"}),
+    ("usuarios.alterar_status", "PATCH", "/usuarios/4/status?ativo=true", None),
+    ("usuarios.deletar", "DELETE", "/usuarios/4", None),
+    ("categorias.criar", "POST", "/categorias/", {"nome": "Poesia"}),
+    ("categorias.listar", "GET", "/categorias/", None),
+    ("categorias.buscar", "GET", "/categorias/2", None),
+    ("categorias.atualizar", "PUT", "/categorias/2", {"nome": "Poesia", "descricao": "Versos"}),
+    ("categorias.atualizar_parcial", "PATCH", "/categorias/2", {"descricao": "Poemas"}),
+    ("categorias.simular_exclusao", "DELETE", "/categorias/2?simular=true", None),
+    ("categorias.deletar", "DELETE", "/categorias/2", None),
+    ("livros.criar", "POST", "/livros/", LIVRO),
+    ("livros.listar", "GET", "/livros/", None),
+    ("livros.buscar", "GET", "/livros/2", None),
+    ("livros.disponibilidade", "POST", "/livros/disponibilidade", {
+        "ids": [1, 2], "isbns": ["9788500000001"]
+    }),
+    ("livros.atualizar", "PUT", "/livros/2", {**LIVRO, "localizacao": "A2"}),
+    ("livros.atualizar_parcial", "PATCH", "/livros/2", {"localizacao": "A3"}),
+    ("livros.deletar", "DELETE", "/livros/2", None),
+    ("emprestimos.criar", "POST", "/emprestimos/", {
+        "usuario_id": 1, "livro_id": 1, "funcionario_id": 2, "data_devolucao_prevista": FUTURO
+    }),
+    ("livros.recomendacoes", "GET", "/livros/1/recomendacoes", None),
+    ("emprestimos.listar", "GET", "/emprestimos/", None),
+    ("emprestimos.buscar", "GET", "/emprestimos/2", None),
+    ("emprestimos.listar_contagem", "GET", "/emprestimos/?count=true&status=ativo", None),
+    ("emprestimos.devolver", "PUT", "/emprestimos/2/devolver", None),
+    ("emprestimos.deletar", "DELETE", "/emprestimos/2", None),
+    ("reservas.criar", "POST", "/reservas/", {
+        "usuario_id": 1, "livro_id": 1, "data_limite": FUTURO
+    }),
+    ("reservas.listar", "GET", "/reservas/", None),
+    ("reservas.buscar", "GET", "/reservas/1", None),
+    ("reservas.cancelar", "PUT", "/reservas/1/cancelar", None),
+    ("reservas.deletar", "DELETE", "/reservas/1", None),
+    ("multas.criar", "POST", "/multas/", {
+        "emprestimo_id": 1, "motivo": "Atraso"
+    }),
+    ("multas.simulacao", "POST", "/multas/simulacao", {
+        "tarifas": {"cliente": {"valor_por_dia": "1.50", "teto": "30.00", "dias_carencia": 2}},
+    }),
+    ("multas.listar", "GET", "/multas/", None),
+    ("multas.buscar", "GET", "/multas/1", None),
+    ("multas.pagar", "PUT", "/multas/1/pagar", None),
+    ("multas.criar_para_quitacao", "POST", "/multas/", {
+        "emprestimo_id": 1, "motivo": "Atraso"
+    }),
+    ("usuarios.quitar_multas", "POST", "/usuarios/1/multas/quitar", None),
+    ("multas.deletar", "DELETE", "/multas/1", None),
+    ("relatorios.circulacao", "GET", "/relatorios/circulacao?periodo=mes", None),
+    ("relatorios.circulacao_top", "GET", "/relatorios/circulacao/top", None),
+    ("alteracoes.feed", "GET", "/changes/?since=0", None),
+    ("jobs.criar", "POST", "/jobs/", {"tipo": "circulacao"}),
+    ("jobs.buscar", "GET", "/jobs/1", None),
+    ("jobs.cancelar", "PUT", "/jobs/1/cancelar", None),
+]
+
+def _normalizar(comando: str) -> str:
+    return re.sub(r"\s+", " ", comando).strip()
+
+def _criar_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # Os CHECKs do schema comparam o valor do Enum e não o nome armazenado;
+        # o MySQL aceita por ignorar maiúsculas, o SQLite não
+        dbapi_connection.execute("PRAGMA ignore_check_constraints = ON")
+
+    database.Base.metadata.create_all(bind=engine)
+    database.SessionLocal.configure(bind=engine)
+    return engine
+
+def _popular():
+    db = database.SessionLocal()
+    agora = datetime.utcnow()
+    db.add(Categoria(nome="Romance"))
+    db.add(Usuario(
+        nome_completo="Leitor", cpf="000.000.000-01", telefone="(11) 90000-0001",
+        endereco="Rua A, 1", email="leitor@email.com"
+    ))
+    db.add(Usuario(
+        nome_completo="Funcionário", cpf="000.000.000-02", telefone="(11) 90000-0002",
+        endereco="Rua B, 2", email="funcionario@email.com",
+        tipo=TipoUsuario.FUNCIONARIO, matricula="F001"
+    ))
+    db.add(Usuario(
+        nome_completo="Outro", cpf="000.000.000-03", telefone="(11) 90000-0003",
+        endereco="Rua C, 3", email="outro@email.com"
+    ))
+    db.flush()
+    db.add(Livro(**{**LIVRO, "isbn": "9788500000001"}))
+    db.flush()
+    db.add(Emprestimo(
+        usuario_id=1, livro_id=1, funcionario_id=2,
+        data_emprestimo=agora - timedelta(days=20),
+        data_devolucao_prevista=agora - timedelta(days=5),
+        status=StatusEmprestimo.ATRASADO
+    ))
+    db.commit()
+    db.close()
+
+def medir() -> dict:
+    engine = _criar_engine()
+    _popular()
+    client = TestClient(app)
+    # Como na API: a auditoria vai para a fila e é gravada fora das requisições
+    gravador_auditoria.intervalo = 3600
+    gravador_auditoria.iniciar(database.SessionLocal)
+    # Na API o índice vem do job "recomendacoes"; aqui basta um vazio carregado
+    indice_recomendacoes.construir([])
+    indice_disponibilidade.carregar(database.SessionLocal)
+
+    comandos: list[str] = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(_normalizar(statement))
+
+    resultado = {}
+    for nome, metodo, caminho, corpo in CENARIOS:
+        comandos.clear()
+        resposta = client.request(metodo, caminho, json=corpo)
+        if resposta.status_code >= 400:
+            raise RuntimeError(f"{nome}: {resposta.status_code} {resposta.text}")
+        resultado[nome] = list(comandos)
+    event.remove(engine, "before_cursor_execute", _registrar)
+    gravador_auditoria.encerrar()
+    return resultado
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--atualizar", action="store_true", help="regrava orcamento_sql.json")
+    args = parser.parse_args()
+
+    medido = medir()
+
+    if args.atualizar:
+        orcamento = {
+            nome: {"maximo": len(comandos), "comandos": comandos}
+            for nome, comandos in medido.items()
+        }
+        ARQUIVO_ORCAMENTO.write_text(json.dumps(orcamento, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"Orçamento gravado em {ARQUIVO_ORCAMENTO.name}")
+        return 0
+
+    orcamento = json.loads(ARQUIVO_ORCAMENTO.read_text(encoding="utf-8"))
+    falhas = 0
+    for nome, comandos in medido.items():
+        if nome not in orcamento:
+            print(f"FALTANDO  {nome}: {len(comandos)} comandos sem orçamento")
+            falhas += 1
+            continue
+
+        maximo = orcamento[nome]["maximo"]
+        if len(comandos) > maximo:
+            falhas += 1
+            print(f"ESTOURO   {nome}: {len(comandos)} comandos (orçamento {maximo})")
+            diff = difflib.unified_diff(
+                orcamento[nome]["comandos"], comandos,
+                fromfile="orcamento", tofile="medido", lineterm=""
+            )
+            for linha in diff:
+                print(f"    {linha}")
+        elif len(comandos) < maximo:
+            print(f"ABAIXO    {nome}: {len(comandos)} comandos (orçamento {maximo}); rode com --atualizar")
+
+    if falhas:
+        print(f"{falhas} endpoint(s) acima do orçamento")
+        return 1
+    print(f"{len(medido)} endpoints dentro do orçamento")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Confere, pelo EXPLAIN, que os filtros e ordenações das listagens usam índice.
+
+Para cada Listagem declarada nas rotas, monta a consulta de cada filtro e de
+cada ordenação atendida por índice (com as igualdades que ela exige) e
+examina o plano: o filtro não pode varrer a tabela e a ordenação não pode
+precisar de filesort. Termina com código 1 quando algum plano falha.
+
+Com DATABASE_URL apontando para o MySQL, usa o EXPLAIN do banco configurado;
+rode contra uma base com volume realista, porque em tabelas quase vazias o
+otimizador prefere varrer a tabela. Sem DATABASE_URL, cria o esquema num
+SQLite em memória e usa o EXPLAIN QUERY PLAN.
+
+    python verificar_planos_listagem.py
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SQL_ECHO", "false")
+
+import sys
+from datetime import datetime
+
+from sqlalchemy import DateTime, Enum, Integer, String, select
+
+import database
+from app.services.contagens import explicar
+from app.routes import livros, emprestimos, reservas, multas
+
+LISTAGENS = {
+    "livros": livros.LISTAGEM,
+    "emprestimos": emprestimos.LISTAGEM,
+    "reservas": reservas.LISTAGEM,
+    "multas": multas.LISTAGEM,
+}
+
+def _valor_exemplo(filtro):
+    if filtro.operador == "positivo":
+        return True
+    tipo = filtro.coluna.type
+    if isinstance(tipo, Enum):
+        return next(iter(tipo.enum_class)) if tipo.enum_class else tipo.enums[0]
+    if isinstance(tipo, DateTime):
+        return datetime(2026, 1, 1)
+    if isinstance(tipo, Integer):
+        return 1
+    if isinstance(tipo, String):
+        return "a"
+    raise TypeError(f"Sem valor de exemplo para {filtro.coluna}")
+
+def _plano(db, consulta, com_filtro: bool) -> tuple[bool, bool, str]:
+    """(usa índice, ordena sem filesort, plano em texto)."""
+    if db.get_bind().dialect.name == "mysql":
+        linhas = explicar(db, consulta)
+        # ALL varre a tabela e index varre o índice inteiro: só servem para ordenar
+        acessos = ("ALL", "index") if com_filtro else ("ALL",)
+        indice = all(linha["key"] is not None and linha["type"] not in acessos for linha in linhas)
+        sem_filesort = not any("filesort" in (linha["Extra"] or "") for linha in linhas)
+        texto = "; ".join(f"key={linha['key']} type={linha['type']} extra={linha['Extra']}" for linha in linhas)
+        return indice, sem_filesort, texto
+    detalhes = [linha["detail"] for linha in explicar(db, consulta, "EXPLAIN QUERY PLAN")]
+    if com_filtro:
+        indice = all(detalhe.startswith("SEARCH") for detalhe in detalhes if not detalhe.startswith("USE TEMP"))
+    else:
+        indice = not any(detalhe.startswith("SCAN") and "INDEX" not in detalhe for detalhe in detalhes)
+    sem_filesort = not any("TEMP B-TREE" in detalhe for detalhe in detalhes)
+    return indice, sem_filesort, "; ".join(detalhes)
+
+def _casos(listagem):
+    # (descrição, valores dos filtros, ordenação)
+    for nome, filtro in listagem.filtros.items():
+        yield f"filtro {nome}", {nome: _valor_exemplo(filtro)}, None
+    por_coluna = {
+        filtro.coluna.key: nome for nome, filtro in listagem.filtros.items() if filtro.operador == "igual"
+    }
+    for campo in listagem.ordenacoes:
+        faltam = listagem.colunas_necessarias(campo)
+        if faltam is None or any(coluna not in por_coluna for coluna in faltam):
+            continue
+        valores = {por_coluna[coluna]: _valor_exemplo(listagem.filtros[por_coluna[coluna]]) for coluna in faltam}
+        yield f"ordenação {campo}", valores, campo
+
+def verificar(db) -> int:
+    falhas = 0
+    for rota, listagem in LISTAGENS.items():
+        for descricao, valores, sort in _casos(listagem):
+            consulta = listagem.aplicar(db, select(listagem.modelo.id), valores, sort)
+            indice, sem_filesort, texto = _plano(db, consulta, bool(valores))
+            ok = indice and (sort is None or sem_filesort)
+            falhas += not ok
+            print(f"{'OK   ' if ok else 'FALHA'} {rota:<12}{descricao:<36}{texto}")
+        sem_indice = [campo for campo in listagem.ordenacoes if listagem.colunas_necessarias(campo) is None]
+        if sem_indice:
+            print(f"      {rota:<12}sem índice (só em tabelas pequenas): {', '.join(sem_indice)}")
+    return falhas
+
+def main() -> int:
+    db = database.SessionLocal()
+    if database.engine.dialect.name == "sqlite":
+        database.Base.metadata.create_all(bind=db.connection())
+        # O LIKE 'prefixo%' só usa o índice com comparação sensível a maiúsculas,
+        # como nas collations do MySQL para índices em VARCHAR
+        db.connection().exec_driver_sql("PRAGMA case_sensitive_like = ON")
+    try:
+        falhas = verificar(db)
+    finally:
+        db.close()
+    if falhas:
+        print(f"{falhas} plano(s) sem índice")
+        return 1
+    print("Todos os filtros e ordenações indexados usam índice")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())